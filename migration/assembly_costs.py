@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# assembly_costs.py
+# Roll up assembly material costs from AssemblyComponents and re-price only the assemblies a price change affects
+
+from decimal import Decimal
+import argparse
+import sys
+
+from db_backend import DatabaseError, add_database_arguments, connect, describe
+from import_metrics import ImportMetrics, add_metrics_arguments
+from import_state import ensure_checkpoint_table, load_checkpoint, save_checkpoint
+from price_history import LOOKUP_CHUNK_SIZE
+
+ROLLUP_NAME = 'assembly_cost_rollup'
+
+# One row per assembly with its rolled-up material cost
+ASSEMBLY_COST_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS `AssemblyCosts` (
+        `assembly_id` INT NOT NULL,
+        `material_cost` DECIMAL(12,2) NOT NULL DEFAULT 0,
+        `component_count` INT NOT NULL DEFAULT 0,
+        `unpriced_components` INT NOT NULL DEFAULT 0,
+        `updated_date` DATETIME NOT NULL,
+        PRIMARY KEY (`assembly_id`)
+    )
+"""
+
+SAVE_COST_SQL = """REPLACE INTO AssemblyCosts
+                   (assembly_id, material_cost, component_count, unpriced_components, updated_date)
+                   VALUES (%s, %s, %s, %s, NOW())"""
+
+def _decimal(value):
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+def _select_in(cursor, sql, ids, chunk_size=LOOKUP_CHUNK_SIZE):
+    """Run sql, whose {} is filled with one placeholder per id, over ids in chunks; returns all rows"""
+    ids = sorted(ids)
+    rows = []
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        cursor.execute(sql.format(', '.join(['%s'] * len(chunk))), chunk)
+        rows.extend(cursor.fetchall())
+    return rows
+
+def assemblies_using(cursor, material_ids):
+    """Ids of the active assemblies with a component made of any of the given materials.
+    
+    This is the material -> assembly reverse lookup, answered from the
+    material_id index of AssemblyComponents so the rest of the component
+    graph is never read.
+    """
+    rows = _select_in(cursor, """SELECT DISTINCT c.assembly_id FROM AssemblyComponents c
+                                 JOIN AssemblyTemplates a ON a.assembly_id = c.assembly_id
+                                 WHERE a.is_active = TRUE AND c.material_id IN ({})""", material_ids)
+    return {assembly_id for (assembly_id,) in rows}
+
+class AssemblyCostRollup:
+    """In-memory graph of materials and the assemblies built from them.
+    
+    AssemblyComponents only links assemblies to materials, so the graph has
+    two levels. Assembly costs are memoized. The graph can hold every active
+    assembly or just the ones being re-priced, with only the prices their
+    components need.
+    """
+    
+    def __init__(self, prices, components):
+        self.prices = prices  # material_id -> current price, None if the material is missing
+        self.components = components  # assembly_id -> [(material_id, quantity)]
+        self._costs = {}  # assembly_id -> (material_cost, unpriced_components)
+    
+    @classmethod
+    def load(cls, cursor, assembly_ids=None):
+        """Load the given assemblies (default: every active one), their components and the prices they use"""
+        if assembly_ids is None:
+            cursor.execute("SELECT material_id, current_price FROM Materials")
+            prices = {material_id: _decimal(price) for material_id, price in cursor.fetchall()}
+            
+            cursor.execute("SELECT assembly_id FROM AssemblyTemplates WHERE is_active = TRUE")
+            components = {assembly_id: [] for (assembly_id,) in cursor.fetchall()}
+            
+            cursor.execute("SELECT assembly_id, material_id, quantity FROM AssemblyComponents")
+            for assembly_id, material_id, quantity in cursor.fetchall():
+                if assembly_id in components:
+                    components[assembly_id].append((material_id, _decimal(quantity)))
+            
+            return cls(prices, components)
+        
+        components = {assembly_id: [] for assembly_id in assembly_ids}
+        rows = _select_in(cursor, """SELECT assembly_id, material_id, quantity FROM AssemblyComponents
+                                     WHERE assembly_id IN ({})""", components)
+        for assembly_id, material_id, quantity in rows:
+            components[assembly_id].append((material_id, _decimal(quantity)))
+        
+        material_ids = {material_id for parts in components.values() for material_id, quantity in parts}
+        rows = _select_in(cursor, "SELECT material_id, current_price FROM Materials WHERE material_id IN ({})",
+                          material_ids)
+        prices = {material_id: _decimal(price) for material_id, price in rows}
+        return cls(prices, components)
+    
+    def cost(self, assembly_id):
+        """Return (material_cost, unpriced_components) for an assembly, computing it once"""
+        cached = self._costs.get(assembly_id)
+        if cached is not None:
+            return cached
+        total = Decimal('0')
+        unpriced = 0
+        for material_id, quantity in self.components.get(assembly_id, []):
+            price = self.prices.get(material_id)
+            if price is None:
+                unpriced += 1
+                continue
+            total += price * quantity
+        self._costs[assembly_id] = (total.quantize(Decimal('0.01')), unpriced)
+        return self._costs[assembly_id]
+    
+    def save(self, cursor, assembly_ids=None, batch_size=1000):
+        """Write the costs of the given assemblies (default: all) to AssemblyCosts; the caller commits"""
+        if assembly_ids is None:
+            assembly_ids = self.components.keys()
+        rows = []
+        for assembly_id in sorted(assembly_ids):
+            if assembly_id not in self.components:
+                continue
+            material_cost, unpriced = self.cost(assembly_id)
+            rows.append((assembly_id, material_cost, len(self.components[assembly_id]), unpriced))
+        for start in range(0, len(rows), batch_size):
+            cursor.executemany(SAVE_COST_SQL, rows[start:start + batch_size])
+        return len(rows)
+
+def ensure_rollup_tables(cursor):
+    """Create the AssemblyCosts and MigrationCheckpoints tables if they don't exist.
+    
+    Call this before the transaction that rolls up costs: MySQL commits
+    implicitly on CREATE TABLE, which would commit any writes pending in it.
+    """
+    cursor.execute(ASSEMBLY_COST_TABLE_SQL)
+    ensure_checkpoint_table(cursor)
+
+def last_price_history_id(cursor):
+    cursor.execute("SELECT COALESCE(MAX(price_history_id), 0) FROM MaterialPriceHistory")
+    return cursor.fetchone()[0]
+
+def save_rollup_checkpoint(cursor, history_id):
+    """Record the last MaterialPriceHistory row the stored costs reflect"""
+    save_checkpoint(cursor, ROLLUP_NAME, 'MaterialPriceHistory', '', history_id, 0, is_complete=True)
+
+def rollup_all(cursor):
+    """Compute and store every active assembly's cost; returns the number of assemblies written.
+    
+    The tables must already exist (see ensure_rollup_tables); the caller commits.
+    """
+    history_id = last_price_history_id(cursor)
+    rollup = AssemblyCostRollup.load(cursor)
+    cursor.execute("DELETE FROM AssemblyCosts")
+    written = rollup.save(cursor)
+    save_rollup_checkpoint(cursor, history_id)
+    return written
+
+def reprice_changed(cursor):
+    """Re-price only the assemblies that use a material with new MaterialPriceHistory rows.
+    
+    Assemblies added since the last rollup are priced too. Only those
+    assemblies' components and the prices they use are loaded. Returns
+    (materials_changed, assemblies_repriced), or None if there is no
+    earlier rollup to start from. The tables must already exist (see
+    ensure_rollup_tables); the caller commits.
+    """
+    checkpoint = load_checkpoint(cursor, ROLLUP_NAME)
+    if checkpoint is None:
+        return None
+    
+    history_id = last_price_history_id(cursor)
+    cursor.execute(
+        "SELECT DISTINCT material_id FROM MaterialPriceHistory WHERE price_history_id > %s",
+        (checkpoint['last_row'],)
+    )
+    changed = [material_id for (material_id,) in cursor.fetchall()]
+    
+    # Assemblies created since the last rollup have no stored cost yet
+    cursor.execute(
+        """SELECT assembly_id FROM AssemblyTemplates
+           WHERE is_active = TRUE AND assembly_id NOT IN (SELECT assembly_id FROM AssemblyCosts)"""
+    )
+    unpriced_assemblies = {assembly_id for (assembly_id,) in cursor.fetchall()}
+    
+    repriced = 0
+    affected = assemblies_using(cursor, changed) | unpriced_assemblies
+    if affected:
+        # Prices come from Materials.current_price, as in the full rollup; the history only says what changed
+        rollup = AssemblyCostRollup.load(cursor, affected)
+        repriced = rollup.save(cursor)
+    
+    save_rollup_checkpoint(cursor, history_id)
+    return len(changed), repriced
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compute assembly material costs into the AssemblyCosts table")
+    parser.add_argument("--full", action="store_true",
+                        help="Recompute every assembly instead of only those affected by new price history")
+    add_database_arguments(parser)
+    add_metrics_arguments(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    metrics = ImportMetrics(ROLLUP_NAME, args)
+    
+    print("Electrical Contractor System - Assembly Cost Rollup")
+    print("===================================================")
+    
+    # Configuration - Update these settings
+    db_config = {
+        "host": "localhost",
+        "user": "root",
+        "password": "215Osborn",
+        "database": "electrical_contractor_db"
+    }
+    
+    try:
+        print(f"Connecting to {describe(db_config, args)}...")
+        conn = metrics.wrap_connection(connect(db_config, args))
+        cursor = conn.cursor()
+        ensure_rollup_tables(cursor)
+        
+        result = None if args.full else reprice_changed(cursor)
+        if result is None:
+            if not args.full:
+                print("No earlier rollup found, computing every assembly.")
+            assemblies = rollup_all(cursor)
+            conn.commit()
+            print(f"\nAssemblies priced: {assemblies}")
+            metrics.set_counts(assemblies, assemblies_priced=assemblies)
+        else:
+            materials_changed, assemblies = result
+            conn.commit()
+            print(f"\nMaterials with new prices: {materials_changed}")
+            print(f"Assemblies re-priced: {assemblies}")
+            metrics.set_counts(materials_changed, materials_changed=materials_changed, assemblies_repriced=assemblies)
+        print("Rollup completed!")
+        
+        metrics.finish()
+    
+    except DatabaseError as err:
+        print(f"Database error: {err}")
+        if 'conn' in locals():
+            conn.rollback()
+        sys.exit(1)
+    finally:
+        if 'conn' in locals() and conn.is_connected():
+            cursor.close()
+            conn.close()
+            print("Database connection closed.")
+
+if __name__ == "__main__":
+    main()
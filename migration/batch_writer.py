@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# batch_writer.py
+# Helpers for collecting rows and writing them in batches (executemany or LOAD DATA)
+
+from datetime import date, datetime
+import os
+import tempfile
+
+from db_backend import DatabaseError
+
+class BatchInserter:
+    """Buffer parameter tuples for one INSERT statement and flush them in batches.
+    
+    Rows are written with cursor.executemany() each time the buffer reaches
+    batch_size. Nothing is committed here; the caller owns the transaction.
+    """
+    
+    def __init__(self, cursor, sql, batch_size=1000):
+        self.cursor = cursor
+        self.sql = sql
+        self.batch_size = max(1, int(batch_size))
+        self.pending = []
+        self.rows_written = 0
+        self.batches_written = 0
+    
+    def add(self, params):
+        """Queue one row, flushing if the batch is full"""
+        self.pending.append(params)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        """Write any queued rows and return how many were written"""
+        if not self.pending:
+            return 0
+        self.cursor.executemany(self.sql, self.pending)
+        written = len(self.pending)
+        self.rows_written += written
+        self.batches_written += 1
+        self.pending = []
+        return written
+    
+    def close(self):
+        """Nothing to clean up; present so callers can treat both writers alike"""
+        pass
+    
+    def __len__(self):
+        return len(self.pending)
+
+# Savepoint each batch is written under when failed batches are retried row by row
+BATCH_SAVEPOINT = 'batch_writer_batch'
+
+def write_in_batches(cursor, sql, rows, batch_size=1000, on_row_error=None):
+    """Write a list of parameter tuples with executemany() in batches; returns the rows written.
+    
+    If a batch fails and on_row_error is given, that batch is rolled back
+    to a savepoint taken before it, since executemany() may have written
+    some of its rows, and then retried one row at a time. on_row_error(row,
+    error) is called for each row that still fails, so one bad row doesn't
+    cost the rest of its batch. Nothing is committed here.
+    """
+    batch_size = max(1, int(batch_size))
+    written = 0
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        if on_row_error is None:
+            cursor.executemany(sql, batch)
+            written += len(batch)
+            continue
+        
+        cursor.execute(f"SAVEPOINT {BATCH_SAVEPOINT}")
+        try:
+            cursor.executemany(sql, batch)
+            written += len(batch)
+        except DatabaseError:
+            cursor.execute(f"ROLLBACK TO SAVEPOINT {BATCH_SAVEPOINT}")
+            for row in batch:
+                try:
+                    cursor.execute(sql, row)
+                    written += 1
+                except DatabaseError as err:
+                    on_row_error(row, err)
+        cursor.execute(f"RELEASE SAVEPOINT {BATCH_SAVEPOINT}")
+    return written
+
+def replace_rows(cursor, table, key_column, key, insert_sql, rows, batch_size=1000):
+    """Swap the set of rows in table whose key_column equals key for rows; returns the rows written.
+    
+    The old rows are deleted and the new ones inserted with executemany()
+    batches. Nothing is committed here: commit once afterwards (or roll
+    back on error) so other connections see the old set or the new one,
+    never part of it.
+    """
+    cursor.execute(f"DELETE FROM {table} WHERE {key_column} = %s", (key,))
+    return write_in_batches(cursor, insert_sql, rows, batch_size)
+
+class BulkFileLoader:
+    """Spool rows to a temporary tab-delimited file and load them with LOAD DATA LOCAL INFILE.
+    
+    Has the same add()/flush() interface as BatchInserter, but add() never
+    flushes on its own: rows go to disk and are loaded in one statement when
+    the caller flushes (at a checkpoint or at the end of the import). If the
+    server or client refuses local infile, the spooled rows are written with
+    fallback_sql in executemany batches instead. Nothing is committed here.
+    """
+    
+    # ER_NOT_ALLOWED_COMMAND, CR_LOAD_DATA_LOCAL_INFILE_REJECTED, ER_CLIENT_LOCAL_FILES_DISABLED
+    LOCAL_INFILE_DISABLED_ERRORS = (1148, 2068, 3948)
+    
+    def __init__(self, cursor, table, columns, fallback_sql, batch_size=1000):
+        self.cursor = cursor
+        self.table = table
+        self.columns = columns
+        self.fallback_sql = fallback_sql
+        self.batch_size = max(1, int(batch_size))
+        self.use_fallback = False
+        self.pending = 0
+        self.rows_written = 0
+        self.rows_loaded = 0  # Rows the server reported for LOAD DATA
+        self.rows_inserted = 0  # Rows written by the executemany fallback
+        self.batches_written = 0
+        self.file = self._new_file()
+    
+    def _new_file(self):
+        return tempfile.NamedTemporaryFile('w', encoding='utf-8', newline='\n',
+                                           suffix='.tsv', prefix=f"{self.table}_", delete=False)
+    
+    def add(self, params):
+        """Append one row to the spool file"""
+        self.file.write('\t'.join(_to_infile_field(value) for value in params) + '\n')
+        self.pending += 1
+    
+    def flush(self):
+        """Load the spooled rows and return how many were written"""
+        if not self.pending:
+            return 0
+        self.file.close()
+        
+        if not self.use_fallback:
+            try:
+                self.cursor.execute(
+                    f"LOAD DATA LOCAL INFILE %s INTO TABLE {self.table} CHARACTER SET utf8mb4 "
+                    f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' "
+                    f"({', '.join(self.columns)})",
+                    (self.file.name,)
+                )
+                self.rows_loaded += self.cursor.rowcount
+                self.batches_written += 1
+            except DatabaseError as err:
+                if getattr(err, 'errno', None) not in self.LOCAL_INFILE_DISABLED_ERRORS:
+                    raise
+                print(f"LOAD DATA LOCAL INFILE is disabled ({getattr(err, 'msg', err)}); using batched inserts for {self.table}.")
+                self.use_fallback = True
+        
+        if self.use_fallback:
+            self._insert_spooled_rows()
+            self.rows_inserted += self.pending
+        
+        written = self.pending
+        self.rows_written += written
+        self.pending = 0
+        os.remove(self.file.name)
+        self.file = self._new_file()
+        return written
+    
+    def _insert_spooled_rows(self):
+        batch = []
+        with open(self.file.name, 'r', encoding='utf-8', newline='\n') as f:
+            for line in f:
+                batch.append(tuple(_from_infile_field(field) for field in line[:-1].split('\t')))
+                if len(batch) >= self.batch_size:
+                    self.cursor.executemany(self.fallback_sql, batch)
+                    self.batches_written += 1
+                    batch = []
+        if batch:
+            self.cursor.executemany(self.fallback_sql, batch)
+            self.batches_written += 1
+    
+    def close(self):
+        """Remove the spool file; call flush() first to keep pending rows"""
+        self.file.close()
+        if os.path.exists(self.file.name):
+            os.remove(self.file.name)
+    
+    def __len__(self):
+        return self.pending
+
+def server_allows_local_infile(cursor):
+    """True if the MySQL server has local_infile enabled"""
+    try:
+        cursor.execute("SELECT @@GLOBAL.local_infile")
+        result = cursor.fetchone()
+    except DatabaseError:
+        return False
+    return bool(result and int(result[0]))
+
+# LOAD DATA's default escaping: backslash escapes, \N for NULL
+_INFILE_ESCAPES = {'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r', '\0': '\\0'}
+_INFILE_UNESCAPES = {'\\': '\\', 't': '\t', 'n': '\n', 'r': '\r', '0': '\0'}
+
+def _to_infile_field(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, datetime):
+        value = value.strftime('%Y-%m-%d %H:%M:%S')
+    elif isinstance(value, date):
+        value = value.isoformat()
+    return ''.join(_INFILE_ESCAPES.get(ch, ch) for ch in str(value))
+
+def _from_infile_field(field):
+    if field == '\\N':
+        return None
+    if '\\' not in field:
+        return field
+    chars = []
+    i = 0
+    while i < len(field):
+        if field[i] == '\\' and i + 1 < len(field):
+            chars.append(_INFILE_UNESCAPES.get(field[i + 1], field[i + 1]))
+            i += 2
+        else:
+            chars.append(field[i])
+            i += 1
+    return ''.join(chars)
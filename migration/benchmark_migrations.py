@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# benchmark_migrations.py
+# Generate synthetic workbooks, run every migration script against a scratch database and record timings
+
+from datetime import datetime
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from db_backend import DatabaseError, add_database_arguments, connect
+from synthetic_workbooks import add_size_arguments, generate_workbooks
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Phases in the order the README runs them, with the generated rows each one reads
+PHASES = [
+    ('customer_job', 'customer_job_migration.py', ['jobs']),
+    ('price_list', 'price_list_migration.py', ['price_items', 'assemblies']),
+    ('material_labor', 'material_labor_migration.py', ['ledger_rows']),
+    ('job_sheet', 'job_sheet_migration.py', ['job_sheets']),
+    ('import_price_list', 'import_price_list_from_excel.py', ['price_items', 'assemblies']),
+]
+
+PHASE_NAMES = [name for name, script, size_keys in PHASES]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the migration scripts on synthetic data")
+    add_size_arguments(parser)
+    parser.add_argument("--phases", nargs="+", choices=PHASE_NAMES, default=PHASE_NAMES,
+                        help="Only run these phases (default: all, in README order)")
+    parser.add_argument("--work-dir", default=None,
+                        help="Directory for the generated workbooks, database and logs (default: a new temporary directory)")
+    parser.add_argument("--keep", action="store_true",
+                        help="Keep the temporary work directory after the run")
+    parser.add_argument("--output", default="benchmark_results.json",
+                        help="File to write the results to (default: benchmark_results.json)")
+    parser.add_argument("--compare", default=None,
+                        help="Earlier results file to compare this run against")
+    add_database_arguments(parser)
+    # Benchmarks run against a scratch SQLite file in the work directory unless told otherwise
+    parser.set_defaults(backend='sqlite', sqlite_db=None)
+    args = parser.parse_args(argv)
+    if args.sqlite_db and os.path.exists(args.sqlite_db):
+        parser.error(f"{args.sqlite_db} already exists; the benchmark needs a new database file")
+    return args
+
+def git_commit():
+    """Return the current commit hash, or None outside a git checkout"""
+    try:
+        output = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=SCRIPT_DIR,
+                                capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip()
+
+def prepare_database(args):
+    """Create the SQLite schema before any phase is timed"""
+    args.create_schema = True
+    conn = connect(None, args)
+    try:
+        cursor = conn.cursor()
+        # import_price_list_from_excel.py tags the materials it imports with created_by,
+        # which the Materials table in add_pricing_tables.sql doesn't have
+        try:
+            cursor.execute("ALTER TABLE Materials ADD COLUMN created_by VARCHAR(50) NULL")
+        except DatabaseError:
+            pass
+        conn.commit()
+    finally:
+        conn.close()
+
+def database_arguments(args):
+    if args.backend == 'sqlite':
+        return ['--backend', 'sqlite', '--sqlite-db', os.path.abspath(args.sqlite_db)]
+    return ['--backend', args.backend]
+
+def run_phase(name, script, rows, args, work_dir):
+    """Run one migration script in work_dir and return its measurements.
+    
+    The script runs in its own process so its peak RSS can be read from
+    os.wait4(); output goes to <name>.log in the work directory. The
+    script's own --metrics file (time per phase, SQL statements) is
+    included in the result.
+    """
+    log_path = os.path.join(work_dir, f"{name}.log")
+    metrics_path = os.path.join(work_dir, f"{name}_metrics.json")
+    command = [sys.executable, os.path.join(SCRIPT_DIR, script), '--metrics', metrics_path] + database_arguments(args)
+    
+    with open(log_path, 'w', encoding='utf-8') as log:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=work_dir, stdin=subprocess.DEVNULL,
+                                   stdout=log, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(process.pid, 0)
+        wall_seconds = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    
+    script_metrics = None
+    if os.path.exists(metrics_path):
+        with open(metrics_path, 'r', encoding='utf-8') as f:
+            script_metrics = json.load(f)
+    
+    return {
+        'phase': name,
+        'script': script,
+        'rows': rows,
+        'wall_seconds': round(wall_seconds, 3),
+        'rows_per_second': round(rows / wall_seconds, 1) if wall_seconds > 0 else None,
+        'peak_rss_mb': round(usage.ru_maxrss / 1024, 1),  # ru_maxrss is in KiB on Linux
+        'user_cpu_seconds': round(usage.ru_utime, 3),
+        'system_cpu_seconds': round(usage.ru_stime, 3),
+        'exit_code': process.returncode,
+        'log': log_path,
+        'script_metrics': script_metrics
+    }
+
+def print_comparison(results, previous):
+    """Print each phase's wall time next to the same phase from an earlier run"""
+    earlier = {phase['phase']: phase for phase in previous.get('phases', [])}
+    print(f"\nCompared with {previous.get('git_commit') or 'earlier run'} ({previous.get('created')}):")
+    for phase in results['phases']:
+        old = earlier.get(phase['phase'])
+        if not old or not old.get('wall_seconds'):
+            print(f"{phase['phase']}: no earlier result")
+            continue
+        change = (phase['wall_seconds'] - old['wall_seconds']) / old['wall_seconds'] * 100
+        print(f"{phase['phase']}: {old['wall_seconds']:.2f}s -> {phase['wall_seconds']:.2f}s ({change:+.1f}%)")
+    if previous.get('sizes') != results['sizes']:
+        print("Warning: the runs used different data sizes.")
+
+def main(argv=None):
+    args = parse_args(argv)
+    
+    print("Electrical Contractor System - Migration Benchmark")
+    print("==================================================")
+    
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='migration_benchmark_')
+    os.makedirs(work_dir, exist_ok=True)
+    if args.backend == 'sqlite' and args.sqlite_db is None:
+        args.sqlite_db = os.path.join(work_dir, 'benchmark.sqlite')
+        if os.path.exists(args.sqlite_db):
+            os.remove(args.sqlite_db)
+    failed = False
+    
+    try:
+        # Start from a clean directory so the job sheet manifest doesn't skip anything
+        for stale in ['job_sheets', 'job_sheet_manifest.json']:
+            stale_path = os.path.join(work_dir, stale)
+            if os.path.isdir(stale_path):
+                shutil.rmtree(stale_path)
+            elif os.path.exists(stale_path):
+                os.remove(stale_path)
+        
+        print(f"Generating synthetic workbooks in {work_dir}...")
+        start = time.perf_counter()
+        sizes = generate_workbooks(work_dir, args.jobs, args.ledger_rows, args.price_items,
+                                   args.assemblies, args.job_sheets, args.seed)
+        generate_seconds = time.perf_counter() - start
+        print(f"Generated in {generate_seconds:.1f}s: " + ', '.join(f"{key}={value}" for key, value in sizes.items()))
+        
+        if args.backend == 'sqlite':
+            prepare_database(args)
+        else:
+            print("Using the MySQL database configured in each script; it should be an empty scratch database.")
+        
+        results = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'backend': args.backend,
+            'sizes': sizes,
+            'generate_seconds': round(generate_seconds, 3),
+            'phases': []
+        }
+        
+        for name, script, size_keys in PHASES:
+            if name not in args.phases:
+                continue
+            print(f"\nRunning {script}...")
+            phase = run_phase(name, script, sum(sizes[key] for key in size_keys), args, work_dir)
+            results['phases'].append(phase)
+            print(f"{phase['rows']} rows in {phase['wall_seconds']:.2f}s "
+                  f"({phase['rows_per_second']} rows/sec), peak RSS {phase['peak_rss_mb']} MB")
+            if phase['script_metrics']:
+                print(', '.join(f"{key} {value['seconds']:.2f}s" for key, value in phase['script_metrics']['phases'].items()))
+            if phase['exit_code'] != 0:
+                print(f"Warning: {script} exited with code {phase['exit_code']}; see {phase['log']}")
+                failed = True
+        
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        
+        print("\nBenchmark Summary:")
+        for phase in results['phases']:
+            print(f"{phase['phase']}: {phase['wall_seconds']:.2f}s, {phase['rows_per_second']} rows/sec, "
+                  f"{phase['peak_rss_mb']} MB")
+        print(f"Results written to {args.output}")
+        
+        if args.compare:
+            with open(args.compare, 'r', encoding='utf-8') as f:
+                print_comparison(results, json.load(f))
+    
+    finally:
+        # Keep the logs around if anything failed
+        if not args.work_dir and not args.keep and not failed:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        elif not args.work_dir:
+            print(f"Work directory kept: {work_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# conftest.py
+# Shared pytest fixtures: a SQLite database with the schema, and a directory of synthetic workbooks
+
+import argparse
+
+import pytest
+
+from benchmark_migrations import prepare_database
+from db_backend import connect
+from synthetic_workbooks import generate_workbooks
+
+@pytest.fixture
+def sqlite_args(tmp_path):
+    """Namespace for a fresh SQLite database with the schema from database/*.sql"""
+    args = argparse.Namespace(backend='sqlite', sqlite_db=str(tmp_path / 'test.sqlite'))
+    prepare_database(args)
+    return args
+
+@pytest.fixture
+def database_argv(sqlite_args):
+    """Command-line options that point a migration script at the SQLite database"""
+    return ['--backend', 'sqlite', '--sqlite-db', sqlite_args.sqlite_db]
+
+@pytest.fixture
+def conn(sqlite_args):
+    """Connection to the SQLite database, closed after the test"""
+    connection = connect(None, sqlite_args)
+    yield connection
+    connection.close()
+
+@pytest.fixture
+def workbooks(tmp_path, monkeypatch):
+    """A small set of synthetic source workbooks, with the working directory set to them"""
+    generate_workbooks(str(tmp_path), num_jobs=20, ledger_rows=300, price_items=40, assemblies=6, job_sheets=5)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,6 @@
+#!/usr/bin/env python3
+# constants.py
+# Values from the database schema that more than one migration script checks against
+
+# Values allowed by the JobStages.stage_name ENUM
+STAGE_NAMES = ['Demo', 'Rough', 'Service', 'Finish', 'Extra', 'Temp Service', 'Inspection', 'Other']
@@ -2,13 +2,58 @@
 # customer_job_migration.py
 # Script to import customers and jobs from Jobs List.xlsx to the MySQL database
 
-import pandas as pd
-import mysql.connector
+from collections import namedtuple
 from datetime import datetime
+import argparse
 import os
 import sys
 
-def main():
+from batch_writer import BatchInserter
+from db_backend import DatabaseError, add_database_arguments, connect, describe
+from excel_readers import iter_sheet_records
+from import_metrics import ImportMetrics, add_metrics_arguments
+from sheet_cache import add_cache_arguments, cache_from_args
+
+# One row of Jobs List.xlsx
+JobListRow = namedtuple('JobListRow', ['job_number', 'customer', 'address', 'date'])
+
+# Sheet column header -> JobListRow field
+JOB_LIST_COLUMNS = {
+    'Job #': 'job_number',
+    'Customer': 'customer',
+    'Address': 'address',
+    'Date': 'date'
+}
+
+CUSTOMER_INSERT_SQL = "INSERT INTO Customers (name, address, city, state, zip) VALUES (%s, %s, %s, %s, %s)"
+
+JOB_INSERT_SQL = """INSERT INTO Jobs 
+                    (job_number, customer_id, job_name, address, city, state, zip, 
+                     status, create_date) 
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)"""
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Import customers and jobs from Jobs List.xlsx")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="Number of customers or jobs written per executemany batch (default: 1000)")
+    add_database_arguments(parser)
+    add_metrics_arguments(parser)
+    add_cache_arguments(parser)
+    return parser.parse_args(argv)
+
+def load_customer_map(cursor):
+    """Return lowercase customer name -> customer_id, keeping the oldest customer for duplicate names"""
+    cursor.execute("SELECT customer_id, name FROM Customers ORDER BY customer_id")
+    customer_map = {}
+    for customer_id, name in cursor.fetchall():
+        customer_map.setdefault(name.lower(), customer_id)
+    return customer_map
+
+def main(argv=None):
+    args = parse_args(argv)
+    metrics = ImportMetrics('customer_job_migration', args)
+    sheet_cache = cache_from_args(args)
+    
     print("Electrical Contractor System - Customer and Job Migration")
     print("========================================================")
     
@@ -30,31 +75,43 @@ def main():
     
     try:
         # Connect to the database
-        print(f"Connecting to MySQL database...")
-        conn = mysql.connector.connect(**db_config)
+        print(f"Connecting to {describe(db_config, args)}...")
+        conn = metrics.wrap_connection(connect(db_config, args))
         cursor = conn.cursor()
         
-        # Read the Excel file
-        print(f"Reading {excel_file}...")
-        jobs_df = pd.read_excel(excel_file)
+        # Load existing customers and jobs once instead of querying for every row
+        customer_map = load_customer_map(cursor)
+        print(f"Found {len(customer_map)} customers in database.")
         
-        print(f"Found {len(jobs_df)} job records.")
+        cursor.execute("SELECT job_number FROM Jobs")
+        existing_jobs = {str(job_number) for (job_number,) in cursor.fetchall()}
+        print(f"Found {len(existing_jobs)} jobs in database.")
         
         # Process each job/customer
         customers_added = 0
         jobs_added = 0
+        rows_read = 0
         
-        for index, row in jobs_df.iterrows():
-            # Extract basic info, handling potential NaN values
-            job_number = str(row['Job #']) if 'Job #' in row and pd.notna(row['Job #']) else None
-            customer_name = str(row['Customer']) if 'Customer' in row and pd.notna(row['Customer']) else None
+        # New customers and jobs are collected first and inserted in batches afterwards
+        new_customers = {}  # format: lowercase name -> (name, address, city, state, zip)
+        new_jobs = []  # format: (job_number, customer_name, street, city, state, zip, status, create_date)
+        
+        # Stream the sheet one row at a time
+        print(f"Reading {excel_file}...")
+        records = iter_sheet_records(excel_file, JobListRow, JOB_LIST_COLUMNS, cache=sheet_cache)
+        for index, row in metrics.timed(records):
+            rows_read += 1
+            
+            # Extract basic info, handling empty cells
+            job_number = str(row.job_number) if row.job_number is not None else None
+            customer_name = str(row.customer) if row.customer is not None else None
             
             if not job_number or not customer_name:
                 print(f"Skipping row {index}: Missing job number or customer name")
                 continue
                 
             # Process address - format typically "123 Main St, City, State Zip"
-            address = str(row['Address']) if 'Address' in row and pd.notna(row['Address']) else ""
+            address = str(row.address) if row.address is not None else ""
             address_parts = address.split(',')
             
             street = address_parts[0].strip() if len(address_parts) > 0 else ''
@@ -72,69 +129,80 @@ def main():
                 if len(parts) >= 2:
                     zip_code = parts[1]
             
-            # Check if customer already exists
-            cursor.execute("SELECT customer_id FROM Customers WHERE name = %s", (customer_name,))
-            result = cursor.fetchone()
-            
-            customer_id = None
-            if result:
-                customer_id = result[0]
-                print(f"Found existing customer: {customer_name} (ID: {customer_id})")
-            else:
-                # Insert new customer
-                cursor.execute(
-                    "INSERT INTO Customers (name, address, city, state, zip) VALUES (%s, %s, %s, %s, %s)",
-                    (customer_name, street, city, state, zip_code)
-                )
-                conn.commit()
-                customer_id = cursor.lastrowid
-                customers_added += 1
-                print(f"Added new customer: {customer_name} (ID: {customer_id})")
+            # Check if customer already exists (names compare case-insensitively, as in MySQL)
+            customer_key = customer_name.lower()
+            if customer_key in customer_map:
+                print(f"Found existing customer: {customer_name} (ID: {customer_map[customer_key]})")
+            elif customer_key not in new_customers:
+                new_customers[customer_key] = (customer_name, street, city, state, zip_code)
             
             # Check if job already exists
-            cursor.execute("SELECT job_id FROM Jobs WHERE job_number = %s", (job_number,))
-            if cursor.fetchone():
+            if job_number in existing_jobs:
                 print(f"Job {job_number} already exists, skipping.")
                 continue
+            existing_jobs.add(job_number)
             
             # Determine job status (assuming all existing jobs are complete)
             status = 'Complete'
                 
             # Create date (default to current date if not available)
-            create_date = row['Date'] if 'Date' in row and pd.notna(row['Date']) else datetime.now().date()
+            create_date = row.date if row.date is not None else datetime.now().date()
             
-            # Insert job
-            cursor.execute(
-                """INSERT INTO Jobs 
-                   (job_number, customer_id, job_name, address, city, state, zip, 
-                    status, create_date) 
-                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-                (
-                    job_number, 
-                    customer_id,
-                    customer_name,  # Using customer name as job name
-                    street,
-                    city,
-                    state,
-                    zip_code,
-                    status,
-                    create_date
-                )
-            )
-            conn.commit()
-            jobs_added += 1
-            print(f"Added job: {job_number} - {customer_name}")
+            new_jobs.append((job_number, customer_name, street, city, state, zip_code, status, create_date))
+        
+        # Insert new customers, then pick up their IDs with a single query
+        if new_customers:
+            customer_writer = BatchInserter(cursor, CUSTOMER_INSERT_SQL, args.batch_size)
+            for customer in new_customers.values():
+                customer_writer.add(customer)
+            customer_writer.flush()
+            customers_added = customer_writer.rows_written
+            customer_map = load_customer_map(cursor)
+            for customer_key, customer in new_customers.items():
+                print(f"Added new customer: {customer[0]} (ID: {customer_map.get(customer_key)})")
+        
+        # Insert jobs
+        job_writer = BatchInserter(cursor, JOB_INSERT_SQL, args.batch_size)
+        for job_number, customer_name, street, city, state, zip_code, status, create_date in new_jobs:
+            job_writer.add((
+                job_number, 
+                customer_map[customer_name.lower()],
+                customer_name,  # Using customer name as job name
+                street,
+                city,
+                state,
+                zip_code,
+                status,
+                create_date
+            ))
+        job_writer.flush()
+        jobs_added = job_writer.rows_written
+        for job in new_jobs:
+            print(f"Added job: {job[0]} - {job[1]}")
+        
+        # Customers and jobs are committed together
+        conn.commit()
         
         print("\nMigration Summary:")
+        print(f"Job records read: {rows_read}")
         print(f"Customers added: {customers_added}")
         print(f"Jobs added: {jobs_added}")
+        if sheet_cache:
+            print(f"Sheet cache: {sheet_cache.hits} hits, {sheet_cache.misses} misses")
         print("Migration completed successfully!")
         
-    except mysql.connector.Error as err:
+        metrics.set_counts(rows_read, customers_added=customers_added, jobs_added=jobs_added)
+        metrics.finish()
+        
+    except DatabaseError as err:
         print(f"Database error: {err}")
+        if 'conn' in locals():
+            conn.rollback()
         sys.exit(1)
     except Exception as e:
         print(f"Error: {e}")
+        if 'conn' in locals():
+            conn.rollback()
         sys.exit(1)
     finally:
         if 'conn' in locals() and conn.is_connected():
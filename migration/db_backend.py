@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# db_backend.py
+# Database backends for the migration scripts: MySQL for real imports, SQLite for offline runs
+
+from datetime import date, datetime
+from decimal import Decimal
+import os
+import re
+import sqlite3
+
+try:
+    import mysql.connector
+except ImportError:  # SQLite runs don't need the MySQL driver
+    mysql = None
+
+# Catch this in the scripts instead of mysql.connector.Error so both backends are handled
+if mysql is not None:
+    DatabaseError = (mysql.connector.Error, sqlite3.Error)
+else:
+    DatabaseError = (sqlite3.Error,)
+
+# Schema files applied by --create-schema, relative to the repository's database folder
+SCHEMA_FILES = ['electrical_contractor_db.sql', 'add_pricing_tables.sql']
+SCHEMA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'database')
+
+def add_database_arguments(parser):
+    """Add the --backend options shared by all migration scripts"""
+    parser.add_argument("--backend", choices=["mysql", "sqlite"], default="mysql",
+                        help="Database to import into (default: mysql)")
+    parser.add_argument("--sqlite-db", default="electrical_contractor.sqlite",
+                        help="SQLite database file used with --backend sqlite")
+    parser.add_argument("--create-schema", action="store_true",
+                        help="With --backend sqlite, create the tables from the database/*.sql schema if missing")
+
+def connect(db_config, args=None, **options):
+    """Open a connection for the backend selected on the command line (MySQL if args is None)"""
+    backend = getattr(args, 'backend', 'mysql')
+    
+    if backend == 'sqlite':
+        conn = SQLiteConnection(args.sqlite_db)
+        if getattr(args, 'create_schema', False):
+            create_schema(conn)
+        return conn
+    
+    if mysql is None:
+        raise RuntimeError("mysql-connector-python is not installed; install it or use --backend sqlite")
+    return mysql.connector.connect(**db_config, **options)
+
+def describe(db_config, args=None):
+    """Short description of the target database for progress messages"""
+    if getattr(args, 'backend', 'mysql') == 'sqlite':
+        return f"SQLite database {args.sqlite_db}"
+    return f"MySQL database {db_config.get('database')}"
+
+def table_exists(cursor, table_name):
+    """True if the table exists in the connected database"""
+    # Checked by attribute so wrapped cursors (see import_metrics) are recognised too
+    if getattr(cursor, 'backend', 'mysql') == 'sqlite':
+        cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = %s", (table_name,))
+    else:
+        cursor.execute(
+            """SELECT COUNT(*) FROM information_schema.tables
+               WHERE table_schema = DATABASE() AND table_name = %s""",
+            (table_name,)
+        )
+    return cursor.fetchone()[0] > 0
+
+# -----------------------------------------------------
+# SQLite stand-in
+# -----------------------------------------------------
+
+class LocalInfileNotSupported(sqlite3.OperationalError):
+    """Raised for LOAD DATA on SQLite; errno matches MySQL's so callers fall back to inserts"""
+    errno = 1148
+    msg = "LOAD DATA LOCAL INFILE is not supported by the SQLite backend"
+
+class SQLiteConnection:
+    """sqlite3 connection with the parts of the mysql.connector API the scripts use"""
+    
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+    
+    def cursor(self, dictionary=False):
+        return SQLiteCursor(self.conn.cursor(), dictionary)
+    
+    def commit(self):
+        self.conn.commit()
+    
+    def rollback(self):
+        self.conn.rollback()
+    
+    def close(self):
+        self.conn.close()
+        self.conn = None
+    
+    def is_connected(self):
+        return self.conn is not None
+
+class SQLiteCursor:
+    """Cursor that rewrites MySQL statements into SQLite's dialect before running them"""
+    
+    backend = 'sqlite'
+    
+    def __init__(self, cursor, dictionary=False):
+        self.cursor = cursor
+        self.dictionary = dictionary
+    
+    def execute(self, sql, params=()):
+        statements = translate_sql(sql)
+        if statements[0].upper().startswith('SAVEPOINT') and not self.cursor.connection.in_transaction:
+            # A savepoint outside a transaction would start one that RELEASE commits;
+            # in MySQL it belongs to the open transaction, so start that first
+            self.cursor.execute("BEGIN")
+        for statement in statements[:-1]:
+            self.cursor.execute(statement)
+        self.cursor.execute(statements[-1], _adapt_params(params))
+    
+    def executemany(self, sql, seq_of_params):
+        statements = translate_sql(sql)
+        self.cursor.executemany(statements[-1], (_adapt_params(params) for params in seq_of_params))
+    
+    def _row(self, row):
+        if row is None or not self.dictionary:
+            return row
+        return {column[0]: value for column, value in zip(self.cursor.description, row)}
+    
+    def fetchone(self):
+        return self._row(self.cursor.fetchone())
+    
+    def fetchall(self):
+        return [self._row(row) for row in self.cursor.fetchall()]
+    
+    @property
+    def lastrowid(self):
+        return self.cursor.lastrowid
+    
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+    
+    @property
+    def description(self):
+        return self.cursor.description
+    
+    def close(self):
+        self.cursor.close()
+
+def _adapt_params(params):
+    """Convert values sqlite3 can't bind (pandas Timestamps, numpy scalars, Decimals)"""
+    if not params:
+        return ()
+    adapted = []
+    for value in params:
+        if isinstance(value, datetime):
+            value = value.strftime('%Y-%m-%d %H:%M:%S')
+        elif isinstance(value, date):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = float(value)
+        elif hasattr(value, 'item') and not isinstance(value, (str, bytes)):
+            value = value.item()  # numpy scalar
+        adapted.append(value)
+    return tuple(adapted)
+
+def translate_sql(sql):
+    """Rewrite one MySQL statement for SQLite; returns the list of statements to run"""
+    stripped = sql.strip().rstrip(';')
+    upper = stripped.upper()
+    
+    if upper.startswith('LOAD DATA'):
+        raise LocalInfileNotSupported(LocalInfileNotSupported.msg)
+    if re.match(r'CREATE\s+(TEMPORARY\s+)?TABLE', upper):
+        return convert_create_table(stripped)
+    
+    sql = stripped.replace('%s', '?')
+    sql = re.sub(r'\bNOW\(\)', 'CURRENT_TIMESTAMP', sql, flags=re.IGNORECASE)
+    sql = re.sub(r'\bCURDATE\(\)', "DATE('now')", sql, flags=re.IGNORECASE)
+    sql = re.sub(r'\bINSERT\s+IGNORE\b', 'INSERT OR IGNORE', sql, flags=re.IGNORECASE)
+    sql = re.sub(r'^EXPLAIN\s+(?!QUERY\s+PLAN\b)', 'EXPLAIN QUERY PLAN ', sql, flags=re.IGNORECASE)
+    
+    match = re.search(r'\bON\s+DUPLICATE\s+KEY\s+UPDATE\b', sql, flags=re.IGNORECASE)
+    if match:
+        updates = re.sub(r'\bVALUES\((\w+)\)', r'excluded.\1', sql[match.end():], flags=re.IGNORECASE)
+        sql = sql[:match.start()] + 'ON CONFLICT DO UPDATE SET' + updates
+    
+    return [sql]
+
+def _split_top_level(body):
+    """Split a CREATE TABLE body on commas that are not inside parentheses or quotes"""
+    parts = []
+    depth = 0
+    quote = None
+    current = []
+    for ch in body:
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in ("'", '"'):
+            quote = ch
+        elif ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        elif ch == ',' and depth == 0:
+            parts.append(''.join(current).strip())
+            current = []
+            continue
+        current.append(ch)
+    if ''.join(current).strip():
+        parts.append(''.join(current).strip())
+    return parts
+
+def _strip_order(columns):
+    return re.sub(r'\s+(ASC|DESC)\b', '', columns, flags=re.IGNORECASE)
+
+def convert_create_table(sql):
+    """Convert a MySQL CREATE TABLE statement into SQLite DDL plus CREATE INDEX statements"""
+    match = re.match(
+        r'CREATE\s+(TEMPORARY\s+)?TABLE\s+(IF\s+NOT\s+EXISTS\s+)?`?(\w+)`?\s*\((.*)\)[^)]*$',
+        sql.strip(), flags=re.IGNORECASE | re.DOTALL
+    )
+    if not match:
+        raise sqlite3.OperationalError(f"Unsupported CREATE TABLE statement: {sql[:60]}")
+    temporary, if_not_exists, table, body = match.groups()
+    
+    definitions = _split_top_level(body)
+    
+    # Single-column primary keys on AUTO_INCREMENT columns become INTEGER PRIMARY KEY AUTOINCREMENT
+    auto_increment = None
+    for definition in definitions:
+        if re.search(r'\bAUTO_INCREMENT\b', definition, flags=re.IGNORECASE):
+            auto_increment = definition.split()[0].strip('`')
+    
+    columns = []
+    constraints = []
+    indexes = []
+    for definition in definitions:
+        definition = definition.replace('`', '')
+        upper = definition.upper()
+        
+        key_match = re.match(r'PRIMARY\s+KEY\s*\((.*)\)', definition, flags=re.IGNORECASE)
+        if key_match:
+            if key_match.group(1).strip() != auto_increment:
+                constraints.append(f"PRIMARY KEY ({_strip_order(key_match.group(1))})")
+            continue
+        
+        unique_match = re.match(r'UNIQUE\s+(INDEX|KEY)?\s*\w*\s*\((.*)\)', definition, flags=re.IGNORECASE)
+        if unique_match:
+            constraints.append(f"UNIQUE ({_strip_order(unique_match.group(2))})")
+            continue
+        
+        index_match = re.match(r'(INDEX|KEY)\s+(\w+)\s*\((.*)\)', definition, flags=re.IGNORECASE)
+        if index_match:
+            # SQLite index names are database-wide, so prefix them with the table name
+            indexes.append(
+                f"CREATE INDEX IF NOT EXISTS {table}_{index_match.group(2)} ON {table} ({index_match.group(3)})"
+            )
+            continue
+        
+        if upper.startswith('CONSTRAINT') or upper.startswith('FOREIGN KEY'):
+            constraints.append(definition)
+            continue
+        
+        # Column definition
+        name = definition.split()[0]
+        if name == auto_increment:
+            columns.append(f"{name} INTEGER PRIMARY KEY AUTOINCREMENT")
+            continue
+        
+        definition = re.sub(r'\s+ON\s+UPDATE\s+CURRENT_TIMESTAMP', '', definition, flags=re.IGNORECASE)
+        definition = re.sub(r"\s+COMMENT\s+'[^']*'", '', definition, flags=re.IGNORECASE)
+        definition = re.sub(r'\s+UNSIGNED\b', '', definition, flags=re.IGNORECASE)
+        
+        # ENUM becomes TEXT with a CHECK constraint
+        enum_match = re.search(r'\bENUM\s*\(([^)]*)\)', definition, flags=re.IGNORECASE)
+        check = ''
+        if enum_match:
+            definition = definition[:enum_match.start()] + 'TEXT' + definition[enum_match.end():]
+            check = f" CHECK ({name} IN ({enum_match.group(1)}))"
+        
+        # MySQL's default collations compare text case-insensitively
+        if re.search(r'\b(VARCHAR|CHAR|TEXT)\b', definition, flags=re.IGNORECASE):
+            type_match = re.search(r'\b(VARCHAR\s*\(\d+\)|CHAR\s*\(\d+\)|TEXT)', definition, flags=re.IGNORECASE)
+            definition = definition[:type_match.end()] + ' COLLATE NOCASE' + definition[type_match.end():]
+        
+        columns.append(definition + check)
+    
+    create = "CREATE {}TABLE {}{} (\n  {}\n)".format(
+        'TEMPORARY ' if temporary else '',
+        'IF NOT EXISTS ' if if_not_exists else '',
+        table,
+        ',\n  '.join(columns + constraints)
+    )
+    return [create] + indexes
+
+def split_sql_script(script):
+    """Split a .sql file into statements, dropping -- comments"""
+    lines = [line for line in script.splitlines() if not line.strip().startswith('--')]
+    return [statement.strip() for statement in '\n'.join(lines).split(';') if statement.strip()]
+
+def create_schema(conn, schema_files=None):
+    """Create the tables from the repository's MySQL schema files in an empty SQLite database"""
+    cursor = conn.cursor()
+    if table_exists(cursor, 'Jobs'):
+        cursor.close()
+        return
+    
+    for file_name in schema_files or SCHEMA_FILES:
+        with open(os.path.join(SCHEMA_DIR, file_name), 'r', encoding='utf-8') as f:
+            statements = split_sql_script(f.read())
+        for statement in statements:
+            upper = statement.upper()
+            # USE, views and other MySQL-only statements have no SQLite equivalent
+            if upper.startswith('CREATE TABLE') or upper.startswith('INSERT'):
+                cursor.execute(statement)
+            elif upper.startswith('CREATE INDEX'):
+                cursor.execute(re.sub(r'^CREATE\s+INDEX', 'CREATE INDEX IF NOT EXISTS', statement,
+                                      flags=re.IGNORECASE))
+    
+    conn.commit()
+    cursor.close()
+    print(f"Created schema from {', '.join(schema_files or SCHEMA_FILES)}")
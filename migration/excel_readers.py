@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# excel_readers.py
+# Shared helpers for reading the Excel workbooks used by the migration scripts
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from import_state import file_sha256
+
+class SheetNotFound(ValueError):
+    """The workbook has no sheet of the requested name"""
+
+def read_sheets(file_path, sheet_names, cache=None, file_hash=None):
+    """Open a workbook once and parse the requested sheets from it.
+    
+    Returns (frames, errors): frames maps sheet name -> DataFrame for every
+    sheet that could be read, errors maps sheet name -> exception for the
+    ones that could not, so callers can keep reporting problems per sheet.
+    A sheet the workbook doesn't have is reported as SheetNotFound, so it
+    can be told apart from one that failed to parse.
+    With a SheetCache, sheets cached for this file's contents are loaded
+    from it and the workbook is only opened for the rest; file_hash saves
+    re-hashing a file the caller already hashed.
+    """
+    frames = {}
+    errors = {}
+    
+    if cache is not None:
+        try:
+            file_hash = file_hash or file_sha256(file_path)
+        except OSError as e:
+            return frames, {sheet_name: e for sheet_name in sheet_names}
+        for sheet_name in sheet_names:
+            frame = cache.load(file_hash, sheet_name)
+            if frame is not None:
+                frames[sheet_name] = frame
+        sheet_names = [sheet_name for sheet_name in sheet_names if sheet_name not in frames]
+        if not sheet_names:
+            return frames, errors
+    
+    try:
+        workbook = pd.ExcelFile(file_path)
+    except Exception as e:
+        # The file itself could not be opened, so none of the sheets are available
+        return frames, {sheet_name: e for sheet_name in sheet_names}
+    
+    with workbook:
+        for sheet_name in sheet_names:
+            if sheet_name not in workbook.sheet_names:
+                errors[sheet_name] = SheetNotFound(f"Worksheet named '{sheet_name}' not found")
+                continue
+            try:
+                frames[sheet_name] = workbook.parse(sheet_name)
+            except Exception as e:
+                errors[sheet_name] = e
+                continue
+            if cache is not None:
+                cache.store(file_hash, sheet_name, frames[sheet_name])
+    
+    return frames, errors
+
+def read_sheet(file_path, sheet_name, cache=None, file_hash=None, **options):
+    """pd.read_excel() of one sheet, going through the SheetCache when one is given.
+    
+    options are passed to read_excel and are part of the cache key, so the
+    same sheet read with a different header setting is cached separately.
+    """
+    if cache is None:
+        return pd.read_excel(file_path, sheet_name=sheet_name, **options)
+    
+    file_hash = file_hash or file_sha256(file_path)
+    variant = f"frame:{sorted(options.items())!r}"
+    frame = cache.load(file_hash, sheet_name, variant)
+    if frame is None:
+        frame = pd.read_excel(file_path, sheet_name=sheet_name, **options)
+        cache.store(file_hash, sheet_name, frame, variant)
+    return frame
+
+def iter_sheet_records(file_path, record_type, column_map, sheet_name=None, cache=None, file_hash=None):
+    """Stream a sheet row by row as record_type instances.
+    
+    The workbook is opened in openpyxl's read-only mode, so only the current
+    row is held in memory. column_map maps header text in the first row to
+    field names of record_type; fields whose column is missing are None.
+    Yields (index, record) where index is the 0-based data row number, the
+    same numbering pandas uses, and fully empty rows are skipped.
+    
+    With a SheetCache, a sheet read before is replayed from the cache
+    without opening the workbook, decoding one group of rows at a time. On
+    a miss the records are written to the cache as they stream past, and
+    the entry is kept once the sheet has been read to the end.
+    """
+    if cache is None:
+        yield from _read_sheet_records(file_path, record_type, column_map, sheet_name)
+        return
+    
+    file_hash = file_hash or file_sha256(file_path)
+    variant = f"records:{record_type.__name__}{record_type._fields!r}:{sorted(column_map.items())!r}"
+    rows = cache.load_rows(file_hash, sheet_name or '', variant)
+    if rows is not None:
+        for index, values in rows:
+            yield index, record_type(*values)
+        return
+    
+    records = ((index,) + tuple(record)
+               for index, record in _read_sheet_records(file_path, record_type, column_map, sheet_name))
+    for index, *values in cache.stream_rows(file_hash, sheet_name or '', list(record_type._fields),
+                                            ['object'] * len(record_type._fields), records, variant):
+        yield index, record_type(*values)
+
+def _read_sheet_records(file_path, record_type, column_map, sheet_name=None):
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        rows = worksheet.iter_rows(values_only=True)
+        
+        header = next(rows, None)
+        if header is None:
+            return
+        
+        # Position of each record field in the row, or None if the column is missing
+        positions = {}
+        for position, heading in enumerate(header):
+            field = column_map.get(str(heading).strip()) if heading is not None else None
+            if field and field not in positions:
+                positions[field] = position
+        getters = [positions.get(field) for field in record_type._fields]
+        
+        for index, values in enumerate(rows):
+            # Blank text cells are treated as empty, as pandas does
+            values = [None if value == '' else value for value in values]
+            if all(value is None for value in values):
+                continue
+            yield index, record_type(*[
+                values[position] if position is not None and position < len(values) else None
+                for position in getters
+            ])
+    finally:
+        workbook.close()
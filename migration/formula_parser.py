@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# formula_parser.py
+# Parse the Price List sheet's assembly formulas into the rows they reference and their quantities
+
+from functools import lru_cache
+import re
+
+# Numbers, cell references (optionally $-anchored) and ranges, function names, quoted
+# text and operators; text and comparisons are only accepted inside a skipped function
+TOKEN_PATTERN = re.compile(r"""
+    \s*(?:
+        (?P<number>\d+(?:\.\d*)?|\.\d+)
+      | (?P<cell>\$?[A-Za-z]{1,3}\$?\d+)(?::(?P<range_end>\$?[A-Za-z]{1,3}\$?\d+))?
+      | (?P<function>[A-Za-z_][A-Za-z0-9_.]*)\s*\(
+      | (?P<text>"[^"]*")
+      | (?P<op>[-+*/(),<>=&])
+    )""", re.VERBOSE)
+
+CELL_PATTERN = re.compile(r'\$?([A-Za-z]{1,3})\$?(\d+)')
+
+class FormulaError(ValueError):
+    """The formula uses syntax outside the subset the Price List sheet uses"""
+
+def tokenize(formula):
+    """Split a formula (without the leading '=') into (kind, value) tokens"""
+    tokens = []
+    position = 0
+    formula = formula.rstrip()
+    while position < len(formula):
+        match = TOKEN_PATTERN.match(formula, position)
+        if not match:
+            raise FormulaError(f"unexpected character {formula[position]!r} at position {position}")
+        position = match.end()
+        if match.group('number'):
+            tokens.append(('number', float(match.group('number'))))
+        elif match.group('cell'):
+            tokens.append(('cell', (_split_cell(match.group('cell')), _split_cell(match.group('range_end') or match.group('cell')))))
+        elif match.group('function'):
+            tokens.append(('function', match.group('function').upper()))
+        elif match.group('text'):
+            tokens.append(('text', match.group('text')))
+        else:
+            tokens.append(('op', match.group('op')))
+    return tokens
+
+def _split_cell(reference):
+    column, row = CELL_PATTERN.fullmatch(reference).groups()
+    return column.upper(), int(row)
+
+class _Parser:
+    """Recursive-descent parser that evaluates a formula as a linear combination of cells.
+    
+    Each expression evaluates to (terms, constant) where terms maps
+    (column, row) to its coefficient, so '=G10+(2*G11)+G10' becomes
+    {('G', 10): 2, ('G', 11): 2}. Multiplying two cell expressions together
+    isn't linear and is rejected. A call to a function other than SUM is
+    skipped as if it were 0 and noted in warnings.
+    """
+    
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+        self.warnings = []
+    
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+    
+    def take(self, kind=None, value=None):
+        token = self.peek()
+        if token[0] is None or (kind and token[0] != kind) or (value and token[1] != value):
+            expected = value or kind or 'more input'
+            raise FormulaError(f"expected {expected} but found {token[1] if token[0] else 'end of formula'}")
+        self.position += 1
+        return token
+    
+    def parse(self):
+        result = self.expression()
+        if self.peek()[0] is not None:
+            raise FormulaError(f"unexpected {self.peek()[1]!r}")
+        return result
+    
+    def expression(self):
+        terms, constant = self.term()
+        while self.peek() in (('op', '+'), ('op', '-')):
+            sign = 1 if self.take()[1] == '+' else -1
+            right_terms, right_constant = self.term()
+            terms = _add(terms, right_terms, sign)
+            constant += sign * right_constant
+        return terms, constant
+    
+    def term(self):
+        terms, constant = self.unary()
+        while self.peek() in (('op', '*'), ('op', '/')):
+            operator = self.take()[1]
+            right_terms, right_constant = self.unary()
+            if operator == '*':
+                if terms and right_terms:
+                    raise FormulaError("product of two cell references")
+                if right_terms:
+                    terms, constant, right_constant = right_terms, right_constant, constant
+                factor = right_constant
+            else:
+                if right_terms:
+                    raise FormulaError("division by a cell reference")
+                if right_constant == 0:
+                    raise FormulaError("division by zero")
+                factor = 1 / right_constant
+            terms = {cell: coefficient * factor for cell, coefficient in terms.items()}
+            constant *= factor
+        return terms, constant
+    
+    def unary(self):
+        if self.peek() == ('op', '-'):
+            self.take()
+            terms, constant = self.unary()
+            return {cell: -coefficient for cell, coefficient in terms.items()}, -constant
+        if self.peek() == ('op', '+'):
+            self.take()
+        return self.primary()
+    
+    def primary(self):
+        kind, value = self.peek()
+        if kind == 'number':
+            self.take()
+            return {}, value
+        if kind == 'cell':
+            self.take()
+            return _cells(*value), 0.0
+        if kind == 'function':
+            self.take()
+            if value != 'SUM':
+                self.skip_arguments()
+                self.warnings.append(f"skipped unsupported function {value}()")
+                return {}, 0.0
+            terms, constant = {}, 0.0
+            if self.peek() != ('op', ')'):
+                while True:
+                    arg_terms, arg_constant = self.expression()
+                    terms = _add(terms, arg_terms)
+                    constant += arg_constant
+                    if self.peek() != ('op', ','):
+                        break
+                    self.take()
+            self.take('op', ')')
+            return terms, constant
+        if (kind, value) == ('op', '('):
+            self.take()
+            result = self.expression()
+            self.take('op', ')')
+            return result
+        raise FormulaError(f"unexpected {value if kind else 'end of formula'}")
+    
+    def skip_arguments(self):
+        """Move past a function's arguments and its closing parenthesis"""
+        depth = 1
+        while depth:
+            kind, value = self.take()
+            if kind == 'function' or (kind, value) == ('op', '('):
+                depth += 1
+            elif (kind, value) == ('op', ')'):
+                depth -= 1
+
+def _cells(start, end):
+    """Every cell in a range (a single cell is a range of one) with coefficient 1"""
+    (start_column, start_row), (end_column, end_row) = start, end
+    if start_column != end_column:
+        raise FormulaError(f"range {start_column}{start_row}:{end_column}{end_row} spans columns")
+    first, last = sorted((start_row, end_row))
+    return {(start_column, row): 1.0 for row in range(first, last + 1)}
+
+def _add(left, right, sign=1):
+    combined = dict(left)
+    for cell, coefficient in right.items():
+        combined[cell] = combined.get(cell, 0.0) + sign * coefficient
+    return combined
+
+@lru_cache(maxsize=4096)
+def formula_components(formula, column='G'):
+    """Return (((row, quantity), ...), warnings) for the cells of column a formula adds up.
+    
+    Rows appear in the order they are first referenced and repeated
+    references are combined, so '=G10+(2*G11)+G10' gives ((10, 2), (11, 2)).
+    A cell that nets out negative (e.g. '=G10-G12') can't be a component
+    quantity, so it is left out; that and any skipped function call are
+    described in warnings. Results are cached because variants of an
+    assembly often share a formula. Raises FormulaError for syntax outside
+    the supported subset: numbers, cell references and same-column ranges,
+    + - * /, parentheses and function calls.
+    """
+    if not formula or not formula.startswith('='):
+        return (), ()
+    parser = _Parser(tokenize(formula[1:]))
+    terms, constant = parser.parse()
+    components = []
+    warnings = list(parser.warnings)
+    for (cell_column, row), quantity in terms.items():
+        if cell_column != column or quantity == 0:
+            continue
+        quantity = round(quantity, 6)
+        quantity = int(quantity) if quantity == int(quantity) else quantity
+        if quantity < 0:
+            warnings.append(f"left out {cell_column}{row}, which has a negative quantity ({quantity})")
+            continue
+        components.append((row, quantity))
+    return tuple(components), tuple(warnings)
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# import_metrics.py
+# Per-phase timing, SQL statement log and throughput for the migration scripts
+
+from contextlib import contextmanager
+from datetime import datetime
+import os
+import re
+import time
+
+from db_backend import DatabaseError
+from import_state import save_json_state
+
+# Phases reported by every script
+PHASES = ['excel_read', 'parse', 'lookup', 'db_write', 'commit']
+
+# Statements that only read; everything else is counted as a write
+READ_STATEMENTS = ('SELECT', 'SHOW', 'DESCRIBE', 'EXPLAIN', 'PRAGMA', 'WITH')
+
+# Statements MySQL (and SQLite's EXPLAIN QUERY PLAN) can explain
+EXPLAINABLE_STATEMENTS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+DEFAULT_SLOW_QUERY_MS = 100
+
+def add_metrics_arguments(parser):
+    """Add the --metrics, --slow-query-ms and --explain options shared by the migration scripts"""
+    parser.add_argument("--metrics", default=None, metavar="FILE",
+                        help="Write per-phase timings, the SQL statement log and rows/sec to this JSON file")
+    parser.add_argument("--slow-query-ms", type=float, default=DEFAULT_SLOW_QUERY_MS, metavar="MS",
+                        help=f"Flag statements that take longer than this (default: {DEFAULT_SLOW_QUERY_MS} ms)")
+    parser.add_argument("--explain", type=int, default=0, metavar="N",
+                        help="At the end of the run, EXPLAIN the N statements with the most total time")
+
+def statement_type(sql):
+    """First keyword of a SQL statement, upper-cased"""
+    words = sql.lstrip(' \t\r\n(').split(None, 1)
+    return words[0].upper() if words else ''
+
+def statement_shape(sql):
+    """Collapse whitespace and replace literals so one statement with different values is logged once"""
+    shape = re.sub(r"'(?:[^'\\]|\\.)*'", '?', sql)
+    shape = re.sub(r'\b\d+(?:\.\d+)?\b', '?', shape)
+    return ' '.join(shape.split())
+
+class ImportMetrics:
+    """Accumulate wall time per phase for one script run.
+    
+    Phases nest: time spent in an inner phase (for example a lookup query
+    made while parsing a row) is counted only for the inner phase, so the
+    phase times add up to the time measured. Every statement run through a
+    wrapped connection is also logged by shape (see statement_shape) with
+    its call count, total time and worst latency.
+    """
+    
+    def __init__(self, script, args=None):
+        self.script = script
+        self.metrics_path = getattr(args, 'metrics', None)
+        self.slow_seconds = getattr(args, 'slow_query_ms', DEFAULT_SLOW_QUERY_MS) / 1000
+        self.explain_count = getattr(args, 'explain', 0)
+        self.started = datetime.now()
+        self.start_time = time.perf_counter()
+        self.phase_seconds = {phase: 0.0 for phase in PHASES}
+        self.phase_calls = {phase: 0 for phase in PHASES}
+        self.statements = 0
+        self.round_trips = 0
+        self.statement_types = {}
+        self.counts = {}
+        self.rows = 0
+        self.worker_seconds = {}
+        self.statement_log = {}  # shape -> call count, rows, total/max seconds, slow calls
+        self._shapes = {}  # SQL text -> shape, so each distinct text is normalized once
+        self._samples = {}  # shape -> (sql, params) of its slowest call, for EXPLAIN
+        self._conn = None
+        self._stack = []  # [phase, start, time spent in nested phases]
+    
+    def _enter(self, phase):
+        self._stack.append([phase, time.perf_counter(), 0.0])
+    
+    def _exit(self):
+        phase, start, nested = self._stack.pop()
+        elapsed = time.perf_counter() - start
+        self.phase_seconds[phase] = self.phase_seconds.get(phase, 0.0) + elapsed - nested
+        self.phase_calls[phase] = self.phase_calls.get(phase, 0) + 1
+        if self._stack:
+            self._stack[-1][2] += elapsed
+    
+    @contextmanager
+    def phase(self, phase):
+        """Time the enclosed block as part of phase"""
+        self._enter(phase)
+        try:
+            yield
+        finally:
+            self._exit()
+    
+    def timed(self, iterable, phase='excel_read', body_phase='parse'):
+        """Iterate over iterable, timing each step as phase (for streamed sheet readers).
+        
+        The caller's loop body, from one item to the next, is timed as
+        body_phase (unless it is None), so a row loop is instrumented without
+        changing its body.
+        """
+        iterator = iter(iterable)
+        while True:
+            self._enter(phase)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._exit()
+            if body_phase is None:
+                yield item
+                continue
+            self._enter(body_phase)
+            try:
+                yield item
+            finally:
+                self._exit()
+    
+    def record_statement(self, sql, rows=None, seconds=0.0, params=None):
+        """Log one execute() (rows is None) or one executemany() over rows parameter sets"""
+        kind = statement_type(sql)
+        count = 1 if rows is None else rows
+        self.statements += count
+        self.statement_types[kind] = self.statement_types.get(kind, 0) + count
+        # The MySQL connector sends a batch of INSERTs as one multi-row statement;
+        # other statements given to executemany() are sent one at a time
+        if rows is None or kind in ('INSERT', 'REPLACE'):
+            self.round_trips += 1
+        else:
+            self.round_trips += rows
+        
+        shape = self._shapes.get(sql)
+        if shape is None:
+            shape = self._shapes[sql] = statement_shape(sql)
+        entry = self.statement_log.get(shape)
+        if entry is None:
+            entry = self.statement_log[shape] = {
+                'type': kind, 'calls': 0, 'rows': 0, 'total_seconds': 0.0, 'max_seconds': 0.0, 'slow_calls': 0
+            }
+        entry['calls'] += 1
+        entry['rows'] += count
+        entry['total_seconds'] += seconds
+        if seconds >= entry['max_seconds']:
+            entry['max_seconds'] = seconds
+            self._samples[shape] = (sql, params)
+        if seconds > self.slow_seconds:
+            entry['slow_calls'] += 1
+            if entry['slow_calls'] == 1:
+                print(f"Slow statement ({seconds * 1000:.0f} ms): {shape[:200]}")
+    
+    def add_worker_time(self, phase, seconds):
+        """Add time measured where the work ran, such as a worker process; kept apart from the phases"""
+        self.worker_seconds[phase] = self.worker_seconds.get(phase, 0.0) + seconds
+    
+    def wrap_connection(self, conn):
+        """Return conn with cursors that record their statements and a timed commit()"""
+        self._conn = conn
+        return MeteredConnection(conn, self)
+    
+    def set_counts(self, rows, **counts):
+        """Record the source rows processed (used for rows/sec) and the summary counts"""
+        self.rows = rows
+        self.counts.update(counts)
+    
+    def slowest_statements(self, limit=None):
+        """Statement shapes ordered by total time, most expensive first"""
+        ranked = sorted(self.statement_log.items(), key=lambda item: item[1]['total_seconds'], reverse=True)
+        return ranked[:limit] if limit else ranked
+    
+    def explain(self, limit):
+        """Run EXPLAIN on the limit statements with the most total time and store the plans in the log"""
+        if self._conn is None or not self._conn.is_connected():
+            return
+        explained = 0
+        cursor = self._conn.cursor()
+        try:
+            for shape, entry in self.slowest_statements():
+                if explained >= limit:
+                    break
+                if entry['type'] not in EXPLAINABLE_STATEMENTS:
+                    continue
+                sql, params = self._samples[shape]
+                try:
+                    cursor.execute("EXPLAIN " + sql, params)
+                    columns = [column[0] for column in cursor.description]
+                    entry['plan'] = [dict(zip(columns, [str(value) for value in row])) for row in cursor.fetchall()]
+                except DatabaseError as err:
+                    entry['plan_error'] = str(err)
+                explained += 1
+        finally:
+            cursor.close()
+    
+    def print_statement_report(self):
+        """Print the statements that were slow or explained"""
+        flagged = [(shape, entry) for shape, entry in self.slowest_statements()
+                   if entry['slow_calls'] or 'plan' in entry or 'plan_error' in entry]
+        if not flagged:
+            return
+        print(f"\nSQL statements slower than {self.slow_seconds * 1000:g} ms or explained:")
+        for shape, entry in flagged:
+            print(f"{entry['calls']} calls, {entry['total_seconds']:.2f}s total, "
+                  f"worst {entry['max_seconds'] * 1000:.1f} ms, {entry['slow_calls']} slow: {shape[:200]}")
+            for row in entry.get('plan', []):
+                print("    " + ", ".join(f"{key}={value}" for key, value in row.items() if value not in ('None', '')))
+            if 'plan_error' in entry:
+                print(f"    EXPLAIN failed: {entry['plan_error']}")
+    
+    def finish(self):
+        """Explain the slowest statements if asked to, report slow ones and write the metrics file"""
+        if self.explain_count:
+            self.explain(self.explain_count)
+        self.print_statement_report()
+        self.write(self.metrics_path)
+    
+    def as_dict(self):
+        wall_seconds = time.perf_counter() - self.start_time
+        measured = sum(self.phase_seconds.values())
+        return {
+            'script': self.script,
+            'started': self.started.isoformat(timespec='seconds'),
+            'wall_seconds': round(wall_seconds, 3),
+            'phases': {
+                phase: {'seconds': round(seconds, 3), 'calls': self.phase_calls[phase]}
+                for phase, seconds in self.phase_seconds.items()
+            },
+            'other_seconds': round(max(0.0, wall_seconds - measured), 3),
+            'worker_phases': {phase: round(seconds, 3) for phase, seconds in self.worker_seconds.items()},
+            'sql': {
+                'statements': self.statements,
+                'round_trips': self.round_trips,
+                'by_type': dict(sorted(self.statement_types.items())),
+                'slow_query_ms': self.slow_seconds * 1000,
+                'log': [
+                    dict(entry, sql=shape, total_seconds=round(entry['total_seconds'], 4),
+                         max_seconds=round(entry['max_seconds'], 4))
+                    for shape, entry in self.slowest_statements()
+                ]
+            },
+            'rows': self.rows,
+            'rows_per_second': round(self.rows / wall_seconds, 1) if wall_seconds > 0 else None,
+            'counts': self.counts
+        }
+    
+    def write(self, path):
+        """Write the metrics to a JSON file, if a path was given"""
+        if not path:
+            return
+        save_json_state(path, self.as_dict())
+        print(f"Metrics written to {os.path.abspath(path)}")
+
+class MeteredConnection:
+    """Connection wrapper whose cursors are MeteredCursors and whose commits are timed"""
+    
+    def __init__(self, conn, metrics):
+        self._conn = conn
+        self._metrics = metrics
+    
+    def cursor(self, *args, **kwargs):
+        return MeteredCursor(self._conn.cursor(*args, **kwargs), self._metrics)
+    
+    def commit(self):
+        with self._metrics.phase('commit'):
+            self._conn.commit()
+    
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+class MeteredCursor:
+    """Cursor wrapper that logs statements and times them as lookup or db_write"""
+    
+    def __init__(self, cursor, metrics):
+        self._cursor = cursor
+        self._metrics = metrics
+    
+    def execute(self, sql, params=None, *args, **kwargs):
+        phase = 'lookup' if statement_type(sql) in READ_STATEMENTS else 'db_write'
+        start = time.perf_counter()
+        try:
+            with self._metrics.phase(phase):
+                if params is None:
+                    return self._cursor.execute(sql, *args, **kwargs)
+                return self._cursor.execute(sql, params, *args, **kwargs)
+        finally:
+            self._metrics.record_statement(sql, None, time.perf_counter() - start, params)
+    
+    def executemany(self, sql, seq_params, *args, **kwargs):
+        seq_params = list(seq_params)
+        start = time.perf_counter()
+        try:
+            with self._metrics.phase('db_write'):
+                return self._cursor.executemany(sql, seq_params, *args, **kwargs)
+        finally:
+            self._metrics.record_statement(sql, len(seq_params), time.perf_counter() - start,
+                                           seq_params[0] if seq_params else None)
+    
+    def fetchone(self):
+        with self._metrics.phase('lookup'):
+            return self._cursor.fetchone()
+    
+    def fetchall(self):
+        with self._metrics.phase('lookup'):
+            return self._cursor.fetchall()
+    
+    def __iter__(self):
+        return iter(self._cursor)
+    
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
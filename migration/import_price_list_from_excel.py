@@ -2,15 +2,23 @@
 Import Price List and Assemblies from Excel
 This script imports materials and assemblies from your Excel template into the database
 
-Usage: python import_price_list_from_excel.py [excel_file]
+Usage: python import_price_list_from_excel.py [excel_file] [--backend sqlite --sqlite-db FILE]
 """
 
 import pandas as pd
-import mysql.connector
-import re
-import sys
+import argparse
 from datetime import datetime
 
+from assembly_costs import ensure_rollup_tables, reprice_changed, rollup_all
+from batch_writer import write_in_batches
+from db_backend import add_database_arguments, connect
+from excel_readers import read_sheet
+from formula_parser import FormulaError, formula_components
+from import_metrics import ImportMetrics, add_metrics_arguments
+from price_history import PriceHistoryWriter, code_key, resolve_material_ids
+from price_sync import MATERIAL_COLUMNS, load_current_rows, plan_sync
+from sheet_cache import add_cache_arguments, cache_from_args
+
 # Database configuration
 DB_CONFIG = {
     'host': 'localhost',
@@ -19,23 +27,37 @@ DB_CONFIG = {
     'database': 'electrical_contractor_db'
 }
 
+MATERIAL_UPSERT_SQL = """
+    INSERT INTO Materials 
+    (material_code, name, category, unit_of_measure, current_price, tax_rate, created_by)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+    current_price = VALUES(current_price),
+    updated_date = NOW()
+"""
+
+# Sync mode: rewrite a changed material (reactivating it) or deactivate one that left the sheet
+MATERIAL_UPDATE_SQL = """
+    UPDATE Materials SET
+    name = %s, category = %s, unit_of_measure = %s, current_price = %s,
+    is_active = TRUE, updated_date = NOW()
+    WHERE material_code = %s
+"""
+MATERIAL_DEACTIVATE_SQL = "UPDATE Materials SET is_active = FALSE, updated_date = NOW() WHERE material_code = %s"
+
 def parse_formula(formula_str, cell_values):
     """Parse Excel formula to extract component references"""
-    if not formula_str or not formula_str.startswith('='):
+    try:
+        references, warnings = formula_components(formula_str)
+    except FormulaError as e:
+        print(f"Warning: Could not parse formula {formula_str}: {e}")
         return []
+    for warning in warnings:
+        print(f"Warning: In formula {formula_str}, {warning}")
     
-    # Extract cell references like G211, G186, etc.
-    cell_refs = re.findall(r'G(\d+)', formula_str)
     components = []
-    
-    for ref in cell_refs:
-        row_num = int(ref)
+    for row_num, quantity in references:
         if row_num in cell_values:
-            # Check for quantity multipliers like (4*G184)
-            pattern = rf'\((\d+)\*G{ref}\)'
-            match = re.search(pattern, formula_str)
-            quantity = int(match.group(1)) if match else 1
-            
             components.append({
                 'row': row_num,
                 'quantity': quantity,
@@ -44,69 +66,162 @@ def parse_formula(formula_str, cell_values):
     
     return components
 
-def import_materials(df, cursor):
-    """Import raw materials from the price list"""
+def _column(df, letter):
+    """A column by letter, or an empty one if the sheet doesn't reach that far"""
+    if letter in df.columns:
+        return df[letter]
+    return pd.Series(None, index=df.index, dtype=object)
+
+def _has_formula(column):
+    return column.notna() & column.astype(str).str.startswith('=')
+
+def classify_materials(df):
+    """Pick out and classify the raw materials on the Price List, working on whole columns.
+    
+    Rows without a name in column D and assemblies (a formula in column I or
+    J) are dropped. Returns a DataFrame with material_code, name, category,
+    unit_of_measure and current_price, indexed like df so index + 1 is the
+    Excel row.
+    """
+    names = _column(df, 'D')
+    has_name = names.notna() & names.astype(str).str.strip().ne('')
+    is_assembly = _has_formula(_column(df, 'I')) | _has_formula(_column(df, 'J'))
+    rows = df[has_name & ~is_assembly]
+    
+    codes = _column(rows, 'C')
+    default_codes = pd.Series('MAT-' + rows.index.astype(str), index=rows.index)
+    names = rows['D'].map(str)
+    
+    prices = pd.to_numeric(_column(rows, 'E'), errors='coerce')
+    unreadable = prices.isna() & _column(rows, 'E').notna()
+    for index in rows.index[unreadable]:
+        print(f"Warning: price {rows.at[index, 'E']!r} for {names[index]} isn't a number, using 0")
+    
+    # Category from column A, falling back to column B
+    column_a, column_b = _column(rows, 'A'), _column(rows, 'B')
+    category = column_a.map(str).where(column_a.notna(), 'General')
+    category = category.mask(category.isin(['', 'nan']), column_b.map(str).where(column_b.notna(), 'General'))
+    
+    # Unit of measure from the name; "per foot" wins over "per 250"
+    lowered = names.str.lower()
+    per_foot = lowered.str.contains('per foot', regex=False) | lowered.str.contains('/ft', regex=False)
+    per_250 = lowered.str.contains('per 250', regex=False)
+    unit_of_measure = pd.Series('Each', index=rows.index).mask(per_250, 'Per 250ft').mask(per_foot, 'Foot')
+    
+    return pd.DataFrame({
+        'material_code': codes.map(str).where(codes.notna(), default_codes),
+        'name': names,
+        'category': category,
+        'unit_of_measure': unit_of_measure,
+        'current_price': prices.fillna(0).astype(float)
+    }, index=rows.index)
+
+def import_materials(df, cursor, batch_size=1000, price_history=None):
+    """Import raw materials from the price list, recording each price with price_history if given"""
     print("Importing materials...")
     
-    materials_imported = 0
-    material_map = {}  # Map row numbers to material IDs
+    materials = classify_materials(df)
+    rows = [row + (6.4, 'Excel Import') for row in zip(
+        materials['material_code'].tolist(), materials['name'].tolist(), materials['category'].tolist(),
+        materials['unit_of_measure'].tolist(), materials['current_price'].tolist()
+    )]
     
-    for index, row in df.iterrows():
-        # Skip if no name in column D
-        if pd.isna(row['D']) or not str(row['D']).strip():
-            continue
-        
-        # Skip assembly items (those with formulas in columns I or J)
-        if pd.notna(row.get('I')) and str(row['I']).startswith('='):
-            continue
-        if pd.notna(row.get('J')) and str(row['J']).startswith('='):
-            continue
-        
-        material_code = str(row['C']) if pd.notna(row['C']) else f"MAT-{index}"
-        name = str(row['D'])
-        base_price = float(row['E']) if pd.notna(row['E']) else 0
-        tax_amount = float(row['F']) if pd.notna(row['F']) else 0
-        
-        # Determine category from column A or B
-        category = str(row['A']) if pd.notna(row['A']) else 'General'
-        if category in ['', 'nan']:
-            category = str(row['B']) if pd.notna(row['B']) else 'General'
-        
-        # Determine unit of measure from name
-        unit_of_measure = 'Each'
-        if 'per foot' in name.lower() or '/ft' in name.lower():
-            unit_of_measure = 'Foot'
-        elif 'per 250' in name.lower():
-            unit_of_measure = 'Per 250ft'
-        
-        try:
-            cursor.execute("""
-                INSERT INTO Materials 
-                (material_code, name, category, unit_of_measure, current_price, tax_rate, created_by)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE
-                current_price = VALUES(current_price),
-                updated_date = NOW()
-            """, (material_code, name, category, unit_of_measure, base_price, 6.4, 'Excel Import'))
-            
-            if cursor.lastrowid:
-                material_map[index + 2] = cursor.lastrowid  # Excel rows start at 1, pandas at 0
-                materials_imported += 1
-        except Exception as e:
-            print(f"Error importing material {name}: {e}")
+    failed_codes = set()
+    
+    def report_error(row, err):
+        print(f"Error importing material {row[1]}: {err}")
+        failed_codes.add(row[0])
     
+    materials_imported = write_in_batches(cursor, MATERIAL_UPSERT_SQL, rows, batch_size, report_error)
+    
+    # Only prices that reached Materials go into the history
+    if price_history is not None:
+        for material_code, price in zip(materials['material_code'].tolist(), materials['current_price'].tolist()):
+            if material_code not in failed_codes:
+                price_history.record(material_code, price)
+    
+    material_map = map_material_ids(cursor, materials)
     print(f"Imported {materials_imported} materials")
     return material_map
 
-def import_assemblies(df, cursor, material_map):
-    """Import assemblies with their components"""
+def map_material_ids(cursor, materials):
+    """Map the Excel row of each classified material to its material_id once the writes are done"""
+    # Batched upserts don't report per-row ids (and lastrowid isn't reliable for an
+    # updated row anyway), so resolve every code with keyed lookups
+    material_ids = resolve_material_ids(cursor, materials['material_code'].unique().tolist())
+    material_map = {}  # Map row numbers to material IDs
+    unresolved = 0
+    for index, material_code in materials['material_code'].items():
+        if code_key(material_code) in material_ids:
+            material_map[index + 1] = material_ids[code_key(material_code)]  # Excel rows start at 1, pandas at 0
+        else:
+            unresolved += 1
+    
+    if unresolved:
+        print(f"Warning: {unresolved} material rows have no material_id; assemblies using them will miss those components")
+    return material_map
+
+def sync_materials(df, cursor, batch_size=1000, price_history=None, plan_only=False):
+    """Bring Materials in line with the price list, writing only the rows that differ.
+    
+    Each material's normalized row is hashed and compared with the current
+    Materials row. New codes are inserted, changed or inactive ones updated,
+    and active materials this import created that are no longer on the sheet
+    are deactivated. Returns (plan, material_map); material_map is None when
+    plan_only is set and nothing is written.
+    """
+    print("Syncing materials...")
+    
+    materials = classify_materials(df)
+    latest = materials.drop_duplicates('material_code', keep='last')  # The upsert would keep the last row too
+    source_rows = dict(zip(latest['material_code'].tolist(), zip(
+        latest['name'].tolist(), latest['category'].tolist(),
+        latest['unit_of_measure'].tolist(), latest['current_price'].tolist()
+    )))
+    
+    current_rows = load_current_rows(cursor, 'Materials', 'material_code', MATERIAL_COLUMNS)
+    cursor.execute("SELECT material_code FROM Materials WHERE created_by = 'Excel Import'")
+    imported_codes = {material_code for (material_code,) in cursor.fetchall()}
+    
+    plan = plan_sync(source_rows, current_rows, MATERIAL_COLUMNS, deactivatable=imported_codes)
+    plan.print()
+    if plan_only:
+        return plan, None
+    
+    failed_codes = set()
+    
+    def report_error(material_code, err):
+        print(f"Error syncing material {material_code}: {err}")
+        failed_codes.add(code_key(material_code))
+    
+    write_in_batches(cursor, MATERIAL_UPSERT_SQL,
+                     [(code,) + source_rows[code] + (6.4, 'Excel Import') for code in plan.inserts],
+                     batch_size, lambda row, err: report_error(row[0], err))
+    write_in_batches(cursor, MATERIAL_UPDATE_SQL,
+                     [source_rows[code] + (plan.table_key(code),) for code, changes in plan.updates], batch_size,
+                     lambda row, err: report_error(row[-1], err))
+    write_in_batches(cursor, MATERIAL_DEACTIVATE_SQL, [(code,) for code in plan.deactivations], batch_size)
+    
+    # Only prices that reached Materials go into the history
+    if price_history is not None:
+        written_codes = set(plan.inserts) | {code for code, changes in plan.updates}
+        for material_code in written_codes:
+            if code_key(material_code) not in failed_codes:
+                price_history.record(material_code, source_rows[material_code][3])
+    
+    material_map = map_material_ids(cursor, materials)
+    print(f"Added {len(plan.inserts)}, updated {len(plan.updates)} and deactivated {len(plan.deactivations)} materials")
+    return plan, material_map
+
+def import_assemblies(df, cursor, material_map, skip_codes=None):
+    """Import assemblies with their components, leaving out any whose code is in skip_codes"""
     print("\nImporting assemblies...")
     
     # Build cell value map for G column
     cell_values = {}
     for index, row in df.iterrows():
         if pd.notna(row.get('G')):
-            cell_values[index + 2] = float(row['G'])  # Excel rows start at 1
+            cell_values[index + 1] = float(row['G'])  # Excel rows start at 1, pandas at 0
     
     assemblies_imported = 0
     
@@ -123,6 +238,8 @@ def import_assemblies(df, cursor, material_map):
             continue
         
         assembly_code = str(row['C'])
+        if skip_codes and assembly_code in skip_codes:
+            continue
         name = str(row['D'])
         description = name
         
@@ -179,40 +296,94 @@ def import_assemblies(df, cursor, material_map):
     
     print(f"Imported {assemblies_imported} assemblies")
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Import materials and assemblies from the Excel price list")
+    parser.add_argument("excel_file", nargs="?", default="template 3.xlsx",
+                        help="Workbook containing the 'Price List' sheet (default: template 3.xlsx)")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="Number of materials written per executemany batch (default: 1000)")
+    parser.add_argument("--sync", action="store_true",
+                        help="Write only new and changed materials, deactivate imported materials no longer "
+                             "in the sheet and skip assemblies that already exist")
+    parser.add_argument("--plan", action="store_true",
+                        help="Print what --sync would change without writing anything")
+    add_database_arguments(parser)
+    add_metrics_arguments(parser)
+    add_cache_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.plan:
+        args.sync = True
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    metrics = ImportMetrics('import_price_list_from_excel', args)
+    sheet_cache = cache_from_args(args)
+    
     # Get Excel file path
-    excel_file = sys.argv[1] if len(sys.argv) > 1 else 'template 3.xlsx'
+    excel_file = args.excel_file
     
     print(f"Reading Excel file: {excel_file}")
     
     try:
         # Read the Price List sheet
-        df = pd.read_excel(excel_file, sheet_name='Price List', header=None)
+        with metrics.phase('excel_read'):
+            df = read_sheet(excel_file, 'Price List', sheet_cache, header=None)
         
         # Rename columns to A, B, C, etc. for easier reference
         df.columns = [chr(65 + i) for i in range(len(df.columns))]
         
         # Connect to database
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = metrics.wrap_connection(connect(DB_CONFIG, args))
         cursor = conn.cursor()
         
         print("Connected to database")
         
-        # Import materials first
-        material_map = import_materials(df, cursor)
+        # Create the cost rollup's tables now: DDL commits implicitly on MySQL, so it
+        # must not run inside the import transaction
+        if not args.plan:
+            ensure_rollup_tables(cursor)
+        
+        # Snapshot current prices so only real changes go into the price history
+        price_history = PriceHistoryWriter(cursor, 'Excel Import', 'Excel price list', args.batch_size)
+        price_history.load_snapshot()
+        
+        # Import materials first (queries inside are timed as lookup/db_write)
+        existing_assemblies = None
+        with metrics.phase('parse'):
+            if args.sync:
+                plan, material_map = sync_materials(df, cursor, args.batch_size, price_history, args.plan)
+                cursor.execute("SELECT assembly_code FROM AssemblyTemplates WHERE is_active = TRUE")
+                existing_assemblies = {assembly_code for (assembly_code,) in cursor.fetchall()}
+            else:
+                material_map = import_materials(df, cursor, args.batch_size, price_history)
+        
+        if args.plan:
+            conn.rollback()
+            print("\nPlan only; nothing was written.")
+            metrics.set_counts(len(df), to_add=len(plan.inserts), to_update=len(plan.updates),
+                               to_deactivate=len(plan.deactivations), unchanged=plan.unchanged)
+            metrics.finish()
+            return
         
         # Import assemblies
-        import_assemblies(df, cursor, material_map)
-        
-        # Create price history records for imported materials
-        print("\nCreating initial price history records...")
-        cursor.execute("""
-            INSERT INTO MaterialPriceHistory (material_id, price, effective_date, created_by)
-            SELECT material_id, current_price, NOW(), 'Initial Import'
-            FROM Materials
-            WHERE created_by = 'Excel Import'
-            AND material_id NOT IN (SELECT DISTINCT material_id FROM MaterialPriceHistory)
-        """)
+        with metrics.phase('parse'):
+            import_assemblies(df, cursor, material_map, existing_assemblies)
+        
+        # Record price history for new materials and changed prices
+        print("\nRecording price history...")
+        history_entries = price_history.flush()
+        print(f"Recorded {price_history.initial_prices} initial prices and {price_history.price_changes} price changes")
+        
+        # Store what each assembly's materials cost so consumers don't have to walk the components;
+        # after the first import only the assemblies new prices or new assemblies affect are re-priced
+        repriced = reprice_changed(cursor)
+        if repriced is None:
+            assemblies_priced = rollup_all(cursor)
+            print(f"Rolled up material costs for {assemblies_priced} assemblies")
+        else:
+            materials_changed, assemblies_priced = repriced
+            print(f"Re-priced {assemblies_priced} assemblies for {materials_changed} materials with new prices")
         
         # Commit changes
         conn.commit()
@@ -228,6 +399,11 @@ def main():
         print(f"\nSummary:")
         print(f"- Total materials in database: {material_count}")
         print(f"- Total assemblies in database: {assembly_count}")
+        if sheet_cache:
+            print(f"- Sheet cache: {sheet_cache.hits} hits, {sheet_cache.misses} misses")
+        
+        metrics.set_counts(len(df), materials=material_count, assemblies=assembly_count, history_entries=history_entries)
+        metrics.finish()
         
     except Exception as e:
         print(f"Error: {e}")
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# import_state.py
+# Small persisted state files shared by the migration scripts
+
+from datetime import datetime
+import hashlib
+import json
+import os
+
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_json_state(path):
+    """Load a JSON state file, returning an empty dict if it doesn't exist"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_json_state(path, state):
+    """Write a JSON state file atomically so a crash never leaves it half written"""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+# Checkpoints live in the database so they are committed in the same
+# transaction as the rows they describe
+CHECKPOINT_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS `MigrationCheckpoints` (
+        `migration_name` VARCHAR(50) NOT NULL,
+        `source_file` VARCHAR(255) NOT NULL,
+        `source_hash` CHAR(64) NOT NULL,
+        `last_row` INT NOT NULL,
+        `batch_number` INT NOT NULL DEFAULT 0,
+        `is_complete` BOOLEAN NOT NULL DEFAULT FALSE,
+        `updated_date` DATETIME NOT NULL,
+        PRIMARY KEY (`migration_name`)
+    )
+"""
+
+def ensure_checkpoint_table(cursor):
+    """Create the MigrationCheckpoints table if it doesn't exist"""
+    cursor.execute(CHECKPOINT_TABLE_SQL)
+
+def load_checkpoint(cursor, migration_name):
+    """Return the saved checkpoint for a migration as a dict, or None"""
+    cursor.execute(
+        """SELECT source_file, source_hash, last_row, batch_number, is_complete
+           FROM MigrationCheckpoints WHERE migration_name = %s""",
+        (migration_name,)
+    )
+    result = cursor.fetchone()
+    if not result:
+        return None
+    source_file, source_hash, last_row, batch_number, is_complete = result
+    return {
+        'source_file': source_file,
+        'source_hash': source_hash,
+        'last_row': last_row,
+        'batch_number': batch_number,
+        'is_complete': bool(is_complete)
+    }
+
+def save_checkpoint(cursor, migration_name, source_file, source_hash, last_row, batch_number, is_complete=False):
+    """Record the last source row covered by the current transaction; the caller commits"""
+    cursor.execute(
+        """REPLACE INTO MigrationCheckpoints
+           (migration_name, source_file, source_hash, last_row, batch_number, is_complete, updated_date)
+           VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+        (migration_name, source_file, source_hash, last_row, batch_number, is_complete, datetime.now())
+    )
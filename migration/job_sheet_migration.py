@@ -2,13 +2,523 @@
 # job_sheet_migration.py
 # Script to import individual job sheets (e.g., 619.xlsx) to the MySQL database
 
+import numpy as np
 import pandas as pd
-import mysql.connector
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+import argparse
+import json
 import os
+import re
 import sys
 import glob
+import time
 
-def main():
+from batch_writer import replace_rows
+from constants import STAGE_NAMES
+from db_backend import DatabaseError, add_database_arguments, connect, describe
+from excel_readers import SheetNotFound, read_sheets
+from import_metrics import ImportMetrics, add_metrics_arguments
+from import_state import file_sha256, load_json_state, save_json_state
+from pipeline import DEFAULT_QUEUE_CHUNKS, Pipeline
+from sheet_cache import add_cache_arguments, cache_from_args
+
+STAGES = ['Demo', 'Inspection', 'Temp Service', 'Rough', 'Service', 'Finish', 'Extra']
+
+def stage_label_table(stages):
+    """Estimate sheet label -> (stage, kind), with an hours row "<stage>" and a material row "<stage> Material" per stage"""
+    labels = {}
+    for stage in stages:
+        labels[stage] = (stage, 'hours')
+        labels[f"{stage} Material"] = (stage, 'material')
+    return labels
+
+def load_stage_labels(path):
+    """Read a stage label table from a JSON object of stage -> [hours label, material label].
+    
+    Stages are written in the order the file lists them, e.g.
+    {"Rough": ["Rough", "Rough Material"], "Finish": ["Trim Out", "Trim Material"]}
+    Each stage must be one of the JobStages.stage_name values (STAGE_NAMES),
+    and no stage or label may appear twice.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        pairs = json.load(f, object_pairs_hook=tuple)  # Keeps repeated keys, which a dict would merge
+    if not isinstance(pairs, tuple):
+        raise ValueError(f"{path} should hold a JSON object of stage -> [hours label, material label]")
+    stages = {}
+    for stage, stage_labels in pairs:
+        if stage not in STAGE_NAMES:
+            raise ValueError(f"{path}: unknown stage '{stage}' (expected one of {', '.join(STAGE_NAMES)})")
+        if stage in stages:
+            raise ValueError(f"{path}: stage {stage} is listed twice")
+        stages[stage] = stage_labels
+    
+    labels = {}
+    for stage, stage_labels in stages.items():
+        if (not isinstance(stage_labels, list) or len(stage_labels) != 2
+                or not all(isinstance(label, str) for label in stage_labels)):
+            raise ValueError(f"{path}: stage {stage} needs [hours label, material label]")
+        for label, kind in zip(stage_labels, ('hours', 'material')):
+            if label in labels:
+                raise ValueError(f"{path}: label '{label}' is listed twice")
+            labels[label] = (stage, kind)
+    return labels
+
+# Estimate sheet labels matched to stages; --stage-labels replaces this table
+DEFAULT_STAGE_LABELS = stage_label_table(STAGES)
+
+# Sheets read from each job workbook
+JOB_SHEETS = ['Estimate', 'Template', 'Permits']
+
+ROOM_SPEC_INSERT_SQL = """INSERT INTO RoomSpecifications
+                          (job_id, room_name, item_description, quantity,
+                           item_code, unit_price, total_price)
+                          VALUES (%s, %s, %s, %s, %s, %s, %s)"""
+
+PERMIT_ITEM_INSERT_SQL = """INSERT INTO PermitItems
+                            (job_id, category, quantity, description)
+                            VALUES (%s, %s, %s, %s)"""
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Import individual job sheets from the job_sheets directory")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of processes used to parse workbooks (default: 1, no pool)")
+    parser.add_argument("--sheets", nargs="+", choices=JOB_SHEETS, default=JOB_SHEETS,
+                        help="Only load and import these sheets (default: all)")
+    parser.add_argument("--manifest", default="job_sheet_manifest.json",
+                        help="File recording the content hash of each successfully imported job sheet")
+    parser.add_argument("--force", action="store_true",
+                        help="Re-import every job sheet, even if it is unchanged since the last run")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Parse workbooks on a background thread while earlier ones are written")
+    parser.add_argument("--queue-chunks", type=int, default=DEFAULT_QUEUE_CHUNKS,
+                        help=f"With --pipeline, parsed workbooks that may wait for the writer (default: {DEFAULT_QUEUE_CHUNKS})")
+    parser.add_argument("--stage-labels",
+                        help="JSON file mapping each stage to its Estimate sheet labels, e.g. "
+                             "{\"Rough\": [\"Rough\", \"Rough Material\"]} (default: the standard stages)")
+    add_database_arguments(parser)
+    add_metrics_arguments(parser)
+    add_cache_arguments(parser)
+    return parser.parse_args(argv)
+
+# Columns of a Template sheet: room header / item quantity / item description, then up to
+# five columns that may hold the unit price (the first numeric one is used)
+TEMPLATE_QUANTITY_COLUMN = 1
+TEMPLATE_DESCRIPTION_COLUMN = 2
+TEMPLATE_PRICE_COLUMNS = range(3, 8)
+
+# Quantity text that int() accepts, e.g. " 3"
+INTEGER_TEXT = re.compile(r'\s*[+-]?\d+\s*')
+
+def is_text(values):
+    """Boolean array marking the str cells of an object array"""
+    return np.fromiter((type(value) is str for value in values), dtype=bool, count=len(values))
+
+def numeric_cells(column):
+    """A column as a float array, NaN wherever the cell is empty or not a number (text is never converted)"""
+    if pd.api.types.is_bool_dtype(column) or pd.api.types.is_numeric_dtype(column):
+        return column.to_numpy(dtype=float, na_value=np.nan, copy=True)
+    if column.dtype != object:
+        return np.full(len(column), np.nan)  # All text or all dates
+    values = column.to_numpy()
+    return pd.to_numeric(np.where(is_text(values), None, values), errors='coerce').astype(float)
+
+def parse_room_specs(template_df):
+    """Build RoomSpecifications rows (without job_id) from a Template sheet.
+    
+    A row whose first cell is text not indented by two spaces starts a
+    room, which is forward-filled onto the rows below it. Rows with a
+    quantity and a description are items: the quantity is truncated to a
+    whole number (1 if it isn't one) and the unit price is the first
+    numeric cell in the price columns (0 if there is none). Each step works
+    on whole columns rather than row by row.
+    """
+    if len(template_df.columns) <= TEMPLATE_DESCRIPTION_COLUMN:
+        return []
+    
+    first = template_df.iloc[:, 0].to_numpy(dtype=object)
+    rooms = np.array([
+        value.strip() if type(value) is str and not value.startswith('  ') else ''
+        for value in first
+    ], dtype=object)
+    is_room = rooms != ''
+    # Position of the nearest room header at or above each row, -1 before the first one
+    room_rows = np.maximum.accumulate(np.where(is_room, np.arange(len(rooms)), -1))
+    
+    quantity_cells = template_df.iloc[:, TEMPLATE_QUANTITY_COLUMN].to_numpy(dtype=object)
+    descriptions = template_df.iloc[:, TEMPLATE_DESCRIPTION_COLUMN].to_numpy(dtype=object)
+    is_item = ~is_room & (room_rows >= 0) & pd.notna(quantity_cells) & pd.notna(descriptions)
+    items = np.flatnonzero(is_item)
+    if not len(items):
+        return []
+    
+    # int() of each quantity: numbers are truncated, integer text is parsed, anything else counts as 1
+    quantities = numeric_cells(template_df.iloc[items, TEMPLATE_QUANTITY_COLUMN])
+    quantities[~np.isfinite(quantities)] = np.nan
+    quantity_cells = quantity_cells[items]
+    for position in np.flatnonzero(is_text(quantity_cells)):
+        if INTEGER_TEXT.fullmatch(quantity_cells[position]):
+            quantities[position] = int(quantity_cells[position])
+    quantities = np.trunc(np.nan_to_num(quantities, nan=1)).astype(np.int64)
+    
+    # First price column holding a number in each row
+    price_columns = [position for position in TEMPLATE_PRICE_COLUMNS if position < len(template_df.columns)]
+    if price_columns:
+        prices = np.column_stack([numeric_cells(template_df.iloc[items, position]) for position in price_columns])
+        has_price = ~np.isnan(prices)
+        unit_prices = np.where(has_price.any(axis=1), prices[np.arange(len(items)), has_price.argmax(axis=1)], 0.0)
+    else:
+        unit_prices = np.zeros(len(items))
+    
+    descriptions = [str(value) for value in descriptions[items]]
+    return [
+        (room_name, item_description, quantity, None, unit_price, total_price)
+        for room_name, item_description, quantity, unit_price, total_price in zip(
+            rooms[room_rows[items]], descriptions, quantities.tolist(),
+            unit_prices.tolist(), (quantities * unit_prices).tolist()
+        )
+        if item_description
+    ]
+
+def parse_permit_items(permits_df):
+    """Build PermitItems rows (without job_id) from a Permits sheet"""
+    permit_items = []
+    for index, row in permits_df.iterrows():
+        # Skip rows without category or quantity
+        if pd.isna(row.iloc[0]) or pd.isna(row.iloc[1]):
+            continue
+        
+        category = str(row.iloc[0]).strip()
+        
+        # Skip header rows or empty categories
+        if not category or category.lower() in ['item', 'description', 'category']:
+            continue
+        
+        try:
+            quantity = int(row.iloc[1]) if pd.notna(row.iloc[1]) else 0
+        except (ValueError, TypeError):
+            quantity = 0
+        
+        # Only add items with quantity > 0
+        if quantity > 0:
+            description = str(row.iloc[2]) if len(row) > 2 and pd.notna(row.iloc[2]) else None
+            permit_items.append((category, quantity, description))
+    
+    return permit_items
+
+def is_number(value):
+    """True for a numeric cell value (including numpy scalars), False for text, dates and empty cells"""
+    return isinstance(value, (int, float, np.number)) and pd.notna(value)
+
+def parse_estimate(estimate_df, stage_labels=DEFAULT_STAGE_LABELS):
+    """Read job details and stage figures from an Estimate sheet in one scan of its first column.
+    
+    Each label is looked up in stage_labels (exact text) and checked for
+    the square footage and floors rows; the first row found for each
+    wins. Returns (square_footage, num_floors, stages, problems): stages
+    holds (stage, estimated_hours, actual_hours, estimated_material,
+    actual_material) in table order, for stages that have an hours row;
+    problems holds (stage, exception) for stages whose figures aren't
+    numbers.
+    """
+    if estimate_df.empty:
+        return None, None, [], []
+    
+    values = estimate_df.to_numpy(dtype=object)
+    columns = list(estimate_df.columns)
+    estimated = columns.index('Estimated') if 'Estimated' in columns else None
+    actual = columns.index('Actual') if 'Actual' in columns else None
+    
+    square_footage_row = None
+    floors_row = None
+    stage_rows = {}  # (stage, kind) -> position of its first row
+    for position, label in enumerate(values[:, 0]):
+        if not isinstance(label, str):
+            continue
+        stage_kind = stage_labels.get(label)
+        if stage_kind is not None:
+            stage_rows.setdefault(stage_kind, position)
+        if square_footage_row is None and 'Square footage' in label:
+            square_footage_row = position
+        if floors_row is None and 'floors' in label.lower():
+            floors_row = position
+    
+    def first_number(position):
+        if position is None:
+            return None
+        return next((int(value) for value in values[position] if is_number(value)), None)
+    
+    def figures(position):
+        """(estimated, actual) from a row, 0 for an empty or missing column"""
+        if position is None:
+            return 0, 0
+        row = values[position]
+        return tuple(
+            float(row[column]) if column is not None and pd.notna(row[column]) else 0
+            for column in (estimated, actual)
+        )
+    
+    stages = []
+    problems = []
+    for stage in dict.fromkeys(stage for stage, kind in stage_labels.values()):
+        if (stage, 'hours') not in stage_rows:
+            continue
+        try:
+            estimated_hours, actual_hours = figures(stage_rows[(stage, 'hours')])
+            estimated_material, actual_material = figures(stage_rows.get((stage, 'material')))
+        except (ValueError, TypeError) as e:
+            problems.append((stage, e))
+            continue
+        stages.append((stage, estimated_hours, actual_hours, estimated_material, actual_material))
+    
+    return first_number(square_footage_row), first_number(floors_row), stages, problems
+
+def parse_job_sheet(file_path, sheets=JOB_SHEETS, cache=None, file_hash=None, stage_labels=DEFAULT_STAGE_LABELS):
+    """Read one job workbook and return the records to write for it.
+    
+    Runs without a database connection so it can be executed in a worker
+    process. Messages are collected instead of printed so output from
+    parallel workers is not interleaved. The workbook is opened once and
+    only the sheets listed in sheets are parsed; records for skipped
+    sheets are left as None so nothing is written for them. cache is an
+    optional SheetCache the sheets are loaded from and saved to, and
+    stage_labels the table Estimate sheet labels are matched against.
+    """
+    file_name = os.path.basename(file_path)
+    result = {
+        'file_name': file_name,
+        'job_number': os.path.splitext(file_name)[0],
+        'square_footage': None,
+        'num_floors': None,
+        'stages': [],
+        'room_specs': None,    # None means the Template sheet was not read
+        'permit_items': None,  # None means the Permits sheet was not read
+        'messages': [],
+        'errors': 0,
+        'cache_hits': 0,  # Sheets loaded from the sheet cache instead of the workbook
+        'timings': {}  # Seconds spent reading and parsing, measured in whichever process ran this
+    }
+    messages = result['messages']
+    start = time.perf_counter()
+    
+    # Open the workbook once and parse every sheet we need from it
+    cache_hits = cache.hits if cache is not None else 0
+    frames, sheet_errors = read_sheets(file_path, sheets, cache, file_hash)
+    if cache is not None:
+        result['cache_hits'] = cache.hits - cache_hits
+    read_seconds = time.perf_counter() - start
+    
+    # Read the Estimate sheet. Here and below, a sheet the workbook doesn't have is
+    # only a warning, so the file still enters the manifest; a failed read is an error
+    estimate_df = frames.get('Estimate')
+    if estimate_df is not None:
+        messages.append("Read Estimate sheet.")
+    elif 'Estimate' in sheet_errors:
+        messages.append(f"Warning: Could not read Estimate sheet: {sheet_errors['Estimate']}")
+        if not isinstance(sheet_errors['Estimate'], SheetNotFound):
+            result['errors'] += 1
+    
+    # Job details and stage figures, from one scan of the Estimate sheet's labels
+    if estimate_df is not None:
+        try:
+            square_footage, num_floors, stages, problems = parse_estimate(estimate_df, stage_labels)
+        except Exception as e:
+            messages.append(f"Error processing Estimate sheet: {e}")
+            result['errors'] += 1
+        else:
+            result['square_footage'] = square_footage
+            result['num_floors'] = num_floors
+            result['stages'] = stages
+            for stage, error in problems:
+                messages.append(f"Error processing stage {stage}: {error}")
+                result['errors'] += 1
+    
+    # Room specifications
+    template_df = frames.get('Template')
+    if 'Template' in sheet_errors:
+        messages.append(f"Warning: Could not process Template sheet: {sheet_errors['Template']}")
+        if not isinstance(sheet_errors['Template'], SheetNotFound):
+            result['errors'] += 1
+    elif template_df is not None:
+        messages.append("Read Template sheet for room specifications.")
+        try:
+            result['room_specs'] = parse_room_specs(template_df)
+        except Exception as e:
+            messages.append(f"Warning: Could not process Template sheet: {e}")
+            result['errors'] += 1
+    
+    # Permit items
+    permits_df = frames.get('Permits')
+    if 'Permits' in sheet_errors:
+        messages.append(f"Warning: Could not process Permits sheet: {sheet_errors['Permits']}")
+        if not isinstance(sheet_errors['Permits'], SheetNotFound):
+            result['errors'] += 1
+    elif permits_df is not None:
+        messages.append("Read Permits sheet.")
+        try:
+            result['permit_items'] = parse_permit_items(permits_df)
+        except Exception as e:
+            messages.append(f"Warning: Could not process Permits sheet: {e}")
+            result['errors'] += 1
+    
+    result['timings'] = {'excel_read': read_seconds, 'parse': time.perf_counter() - start - read_seconds}
+    return result
+
+def write_job_sheet(conn, cursor, job_id, parsed, batch_size=1000):
+    """Write the records parsed from one job sheet and return per-job counts"""
+    counts = {'stages_updated': 0, 'room_specs_added': 0, 'permit_items_added': 0, 'errors': 0}
+    
+    # Update job with square footage and floors if available
+    try:
+        if parsed['square_footage']:
+            cursor.execute(
+                "UPDATE Jobs SET square_footage = %s WHERE job_id = %s",
+                (parsed['square_footage'], job_id)
+            )
+            conn.commit()
+            print(f"Updated job with square footage: {parsed['square_footage']}")
+        
+        if parsed['num_floors']:
+            cursor.execute(
+                "UPDATE Jobs SET num_floors = %s WHERE job_id = %s",
+                (parsed['num_floors'], job_id)
+            )
+            conn.commit()
+            print(f"Updated job with number of floors: {parsed['num_floors']}")
+    except Exception as e:
+        print(f"Error updating job details: {e}")
+        counts['errors'] += 1
+    
+    # Stages
+    for stage, estimated_hours, actual_hours, estimated_material, actual_material in parsed['stages']:
+        try:
+            # Check if stage exists
+            cursor.execute(
+                "SELECT stage_id FROM JobStages WHERE job_id = %s AND stage_name = %s",
+                (job_id, stage)
+            )
+            result = cursor.fetchone()
+            
+            if result:
+                # Update existing stage
+                cursor.execute(
+                    """UPDATE JobStages SET
+                       estimated_hours = %s, actual_hours = %s,
+                       estimated_material_cost = %s, actual_material_cost = %s
+                       WHERE stage_id = %s""",
+                    (estimated_hours, actual_hours, estimated_material, actual_material, result[0])
+                )
+            else:
+                # Create new stage
+                cursor.execute(
+                    """INSERT INTO JobStages
+                       (job_id, stage_name, estimated_hours, actual_hours,
+                        estimated_material_cost, actual_material_cost)
+                       VALUES (%s, %s, %s, %s, %s, %s)""",
+                    (job_id, stage, estimated_hours, actual_hours,
+                     estimated_material, actual_material)
+                )
+            counts['stages_updated'] += 1
+            
+            conn.commit()
+            print(f"Processed stage: {stage}")
+        
+        except Exception as e:
+            print(f"Error processing stage {stage}: {e}")
+            counts['errors'] += 1
+    
+    # Room specifications and permit items: each set is swapped whole in one transaction,
+    # so the app never reads a job with only part of its rows
+    if parsed['room_specs'] is not None:
+        try:
+            counts['room_specs_added'] = replace_rows(
+                cursor, 'RoomSpecifications', 'job_id', job_id, ROOM_SPEC_INSERT_SQL,
+                [(job_id,) + room_spec for room_spec in parsed['room_specs']], batch_size
+            )
+            conn.commit()
+            print(f"Added {counts['room_specs_added']} room specifications.")
+        
+        except Exception as e:
+            conn.rollback()
+            print(f"Warning: Could not process Template sheet: {e}")
+            counts['errors'] += 1
+    
+    if parsed['permit_items'] is not None:
+        try:
+            counts['permit_items_added'] = replace_rows(
+                cursor, 'PermitItems', 'job_id', job_id, PERMIT_ITEM_INSERT_SQL,
+                [(job_id,) + permit_item for permit_item in parsed['permit_items']], batch_size
+            )
+            conn.commit()
+            print(f"Added {counts['permit_items_added']} permit items.")
+        
+        except Exception as e:
+            conn.rollback()
+            print(f"Warning: Could not process Permits sheet: {e}")
+            counts['errors'] += 1
+    
+    return counts
+
+def is_unchanged(manifest_entry, file_hash, sheets):
+    """True if the manifest shows this exact file content was already imported for these sheets"""
+    if not manifest_entry or manifest_entry.get('sha256') != file_hash:
+        return False
+    return set(sheets) <= set(manifest_entry.get('sheets', JOB_SHEETS))
+
+def iter_parsed_job_sheets(job_files, workers, sheets=JOB_SHEETS, max_pending=None, cache=None, file_hashes=None,
+                           stage_labels=DEFAULT_STAGE_LABELS):
+    """Yield (file_path, parsed, error) for each file, parsing in a process pool when workers > 1.
+    
+    At most max_pending workbooks (default: twice the workers) are submitted
+    to the pool ahead of the caller, so parsed results don't pile up in
+    memory while the caller is busy writing. Closing the generator early
+    cancels the workbooks not yet started. cache, file_hashes (file
+    name -> SHA-256) and stage_labels are passed on to parse_job_sheet.
+    """
+    file_hashes = file_hashes or {}
+    
+    def task_args(file_path):
+        return file_path, sheets, cache, file_hashes.get(os.path.basename(file_path)), stage_labels
+    
+    if workers <= 1:
+        for file_path in job_files:
+            try:
+                yield file_path, parse_job_sheet(*task_args(file_path)), None
+            except Exception as e:
+                yield file_path, None, e
+        return
+    
+    max_pending = max(workers, max_pending or workers * 2)
+    remaining = iter(job_files)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        try:
+            for file_path in remaining:
+                futures[executor.submit(parse_job_sheet, *task_args(file_path))] = file_path
+                if len(futures) >= max_pending:
+                    break
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    file_path = futures.pop(future)
+                    # Keep the pool busy before handing the result over
+                    next_file = next(remaining, None)
+                    if next_file is not None:
+                        futures[executor.submit(parse_job_sheet, *task_args(next_file))] = next_file
+                    try:
+                        yield file_path, future.result(), None
+                    except Exception as e:
+                        yield file_path, None, e
+        finally:
+            # When the caller stops early, drop the workbooks not yet started so the pool shuts down promptly
+            for future in futures:
+                future.cancel()
+
+def main(argv=None):
+    args = parse_args(argv)
+    metrics = ImportMetrics('job_sheet_migration', args)
+    sheet_cache = cache_from_args(args)
+    
     print("Electrical Contractor System - Job Sheet Migration")
     print("=================================================")
     
@@ -28,10 +538,18 @@ def main():
         print(f"Please create the directory and place job sheet Excel files in it.")
         sys.exit(1)
     
+    stage_labels = DEFAULT_STAGE_LABELS
+    if args.stage_labels:
+        try:
+            stage_labels = load_stage_labels(args.stage_labels)
+        except (OSError, ValueError) as e:
+            print(f"Error: Could not read stage labels: {e}")
+            sys.exit(1)
+    
     try:
         # Connect to the database
-        print(f"Connecting to MySQL database...")
-        conn = mysql.connector.connect(**db_config)
+        print(f"Connecting to {describe(db_config, args)}...")
+        conn = metrics.wrap_connection(connect(db_config, args))
         cursor = conn.cursor()
         
         # Get job mapping (job_number -> job_id)
@@ -53,276 +571,122 @@ def main():
         room_specs_added = 0
         permit_items_added = 0
         errors = 0
+        unchanged_skipped = 0
+        cache_hits = 0
+        
+        # Content hashes of job sheets from previous successful imports
+        manifest = load_json_state(args.manifest)
+        file_hashes = {}
         
-        # Process each job file
+        # Skip files whose job doesn't exist in the database, or that haven't changed, before parsing them
+        files_to_parse = []
         for file_path in job_files:
             file_name = os.path.basename(file_path)
             job_number = os.path.splitext(file_name)[0]  # Remove extension to get job number
+            if job_number not in job_map:
+                print(f"Job {job_number} not found in database, skipping.")
+                errors += 1
+                continue
+            
+            with metrics.phase('excel_read'):
+                file_hashes[file_name] = file_sha256(file_path)
+            if not args.force and is_unchanged(manifest.get(file_name), file_hashes[file_name], args.sheets):
+                unchanged_skipped += 1
+                continue
+            files_to_parse.append(file_path)
+        
+        if unchanged_skipped:
+            print(f"Skipping {unchanged_skipped} job sheets unchanged since the last import (use --force to re-import).")
+        
+        if args.workers > 1:
+            print(f"Parsing workbooks with {args.workers} worker processes.")
+        
+        # Parse each job file and write its records; waiting for a parsed workbook is timed as parse
+        if args.pipeline:
+            # Parsing runs on a background thread (feeding from the pool, if any) while the writer works
+            parsed_job_sheets = pipeline = Pipeline(
+                iter_parsed_job_sheets(files_to_parse, args.workers, args.sheets, args.workers + args.queue_chunks,
+                                       sheet_cache, file_hashes, stage_labels),
+                1, args.queue_chunks
+            )
+            print(f"Parsing on a background thread, up to {args.queue_chunks} workbooks ahead of the writer.")
+        else:
+            parsed_job_sheets = iter_parsed_job_sheets(files_to_parse, args.workers, args.sheets,
+                                                       cache=sheet_cache, file_hashes=file_hashes,
+                                                       stage_labels=stage_labels)
+        for file_path, parsed, parse_error in metrics.timed(parsed_job_sheets, 'parse', body_phase=None):
+            file_name = os.path.basename(file_path)
+            job_number = os.path.splitext(file_name)[0]
             
             print(f"\nProcessing job {job_number} from file {file_name}...")
             
-            # Skip if job doesn't exist in database
-            if job_number not in job_map:
-                print(f"Job {job_number} not found in database, skipping.")
+            if parse_error is not None:
+                print(f"Error processing job file {file_name}: {parse_error}")
                 errors += 1
                 continue
             
-            job_id = job_map[job_number]
+            for message in parsed['messages']:
+                print(message)
+            errors += parsed['errors']
+            cache_hits += parsed['cache_hits']
+            for phase, seconds in parsed['timings'].items():
+                metrics.add_worker_time(phase, seconds)
             
             try:
-                # Read the Estimate sheet
-                try:
-                    estimate_df = pd.read_excel(file_path, sheet_name='Estimate')
-                    print(f"Read Estimate sheet.")
-                except Exception as e:
-                    print(f"Warning: Could not read Estimate sheet: {e}")
-                    estimate_df = None
-                
-                # Update job with square footage and floors if available
-                if estimate_df is not None:
-                    try:
-                        # Look for square footage row
-                        sq_ft_rows = estimate_df[estimate_df.iloc[:, 0].str.contains('Square footage', na=False)]
-                        if not sq_ft_rows.empty:
-                            sq_ft_row = sq_ft_rows.iloc[0]
-                            sq_ft_value = None
-                            # Try to find square footage in this row (might be in different columns)
-                            for col in sq_ft_row.index:
-                                if pd.notna(sq_ft_row[col]) and isinstance(sq_ft_row[col], (int, float)):
-                                    sq_ft_value = int(sq_ft_row[col])
-                                    break
-                            
-                            if sq_ft_value:
-                                cursor.execute(
-                                    "UPDATE Jobs SET square_footage = %s WHERE job_id = %s",
-                                    (sq_ft_value, job_id)
-                                )
-                                conn.commit()
-                                print(f"Updated job with square footage: {sq_ft_value}")
-                        
-                        # Look for floors row
-                        floors_rows = estimate_df[estimate_df.iloc[:, 0].str.contains('floors', na=False, case=False)]
-                        if not floors_rows.empty:
-                            floors_row = floors_rows.iloc[0]
-                            floors_value = None
-                            # Try to find floors in this row
-                            for col in floors_row.index:
-                                if pd.notna(floors_row[col]) and isinstance(floors_row[col], (int, float)):
-                                    floors_value = int(floors_row[col])
-                                    break
-                            
-                            if floors_value:
-                                cursor.execute(
-                                    "UPDATE Jobs SET num_floors = %s WHERE job_id = %s",
-                                    (floors_value, job_id)
-                                )
-                                conn.commit()
-                                print(f"Updated job with number of floors: {floors_value}")
-                                
-                    except Exception as e:
-                        print(f"Error updating job details: {e}")
-                
-                # Process stages data
-                if estimate_df is not None:
-                    stages = ['Demo', 'Inspection', 'Temp Service', 'Rough', 'Service', 'Finish', 'Extra']
-                    
-                    for stage in stages:
-                        try:
-                            # Find rows matching this stage
-                            stage_rows = estimate_df[estimate_df.iloc[:, 0].str.contains(f'^{stage}$', na=False, regex=True)]
-                            
-                            if stage_rows.empty:
-                                continue
-                            
-                            estimated_hours = 0
-                            actual_hours = 0
-                            estimated_material = 0
-                            actual_material = 0
-                            
-                            # First row should be hours
-                            stage_row = stage_rows.iloc[0]
-                            if 'Estimated' in stage_row and pd.notna(stage_row['Estimated']):
-                                estimated_hours = float(stage_row['Estimated'])
-                            if 'Actual' in stage_row and pd.notna(stage_row['Actual']):
-                                actual_hours = float(stage_row['Actual'])
-                            
-                            # Look for material row (typically stage + " Material")
-                            material_rows = estimate_df[estimate_df.iloc[:, 0].str.contains(f'^{stage} Material$', na=False, regex=True)]
-                            if not material_rows.empty:
-                                material_row = material_rows.iloc[0]
-                                if 'Estimated' in material_row and pd.notna(material_row['Estimated']):
-                                    estimated_material = float(material_row['Estimated'])
-                                if 'Actual' in material_row and pd.notna(material_row['Actual']):
-                                    actual_material = float(material_row['Actual'])
-                            
-                            # Check if stage exists
-                            cursor.execute(
-                                "SELECT stage_id FROM JobStages WHERE job_id = %s AND stage_name = %s",
-                                (job_id, stage)
-                            )
-                            result = cursor.fetchone()
-                            
-                            if result:
-                                # Update existing stage
-                                cursor.execute(
-                                    """UPDATE JobStages SET 
-                                       estimated_hours = %s, actual_hours = %s,
-                                       estimated_material_cost = %s, actual_material_cost = %s
-                                       WHERE stage_id = %s""",
-                                    (estimated_hours, actual_hours, estimated_material, actual_material, result[0])
-                                )
-                                stages_updated += 1
-                            else:
-                                # Create new stage
-                                cursor.execute(
-                                    """INSERT INTO JobStages 
-                                       (job_id, stage_name, estimated_hours, actual_hours,
-                                        estimated_material_cost, actual_material_cost)
-                                       VALUES (%s, %s, %s, %s, %s, %s)""",
-                                    (job_id, stage, estimated_hours, actual_hours, 
-                                     estimated_material, actual_material)
-                                )
-                                stages_updated += 1
-                                
-                            conn.commit()
-                            print(f"Processed stage: {stage}")
-                            
-                        except Exception as e:
-                            print(f"Error processing stage {stage}: {e}")
-                            errors += 1
-                
-                # Process room specifications
-                try:
-                    template_df = pd.read_excel(file_path, sheet_name='Template')
-                    print(f"Read Template sheet for room specifications.")
-                    
-                    # Delete existing room specifications for this job
-                    cursor.execute("DELETE FROM RoomSpecifications WHERE job_id = %s", (job_id,))
-                    conn.commit()
-                    
-                    current_room = None
-                    
-                    # Process template rows
-                    for index, row in template_df.iterrows():
-                        # Skip empty rows
-                        if all(pd.isna(val) for val in row):
-                            continue
-                        
-                        # Check if this is a room header row
-                        first_col = row.iloc[0] if pd.notna(row.iloc[0]) else ""
-                        if isinstance(first_col, str) and first_col.strip() and not first_col.startswith('  '):
-                            current_room = first_col.strip()
-                            continue
-                        
-                        # If we have a current room and this looks like an item row
-                        if current_room and pd.notna(row.iloc[1]) and pd.notna(row.iloc[2]):
-                            # Get quantity from column B
-                            try:
-                                quantity = int(row.iloc[1]) if pd.notna(row.iloc[1]) else 1
-                            except (ValueError, TypeError):
-                                quantity = 1
-                            
-                            # Get item description from column C
-                            item_description = str(row.iloc[2]) if pd.notna(row.iloc[2]) else ""
-                            
-                            # Get item code if available (column name may vary)
-                            item_code = None
-                            
-                            # Get unit price from a pricing column (may vary)
-                            unit_price = 0
-                            for col_idx in range(3, min(8, len(row))):  # Check reasonable range for price
-                                if pd.notna(row.iloc[col_idx]) and isinstance(row.iloc[col_idx], (int, float)):
-                                    unit_price = float(row.iloc[col_idx])
-                                    break
-                            
-                            # Insert room specification
-                            if item_description:
-                                cursor.execute(
-                                    """INSERT INTO RoomSpecifications 
-                                       (job_id, room_name, item_description, quantity, 
-                                        item_code, unit_price, total_price)
-                                       VALUES (%s, %s, %s, %s, %s, %s, %s)""",
-                                    (
-                                        job_id, current_room, item_description, quantity,
-                                        item_code, unit_price, quantity * unit_price
-                                    )
-                                )
-                                conn.commit()
-                                room_specs_added += 1
-                    
-                    print(f"Added {room_specs_added} room specifications.")
-                    
-                except Exception as e:
-                    print(f"Warning: Could not process Template sheet: {e}")
-                
-                # Process permit items
-                try:
-                    permits_df = pd.read_excel(file_path, sheet_name='Permits')
-                    print(f"Read Permits sheet.")
-                    
-                    # Delete existing permit items for this job
-                    cursor.execute("DELETE FROM PermitItems WHERE job_id = %s", (job_id,))
-                    conn.commit()
-                    
-                    # Process permit rows
-                    permit_rows_processed = 0
-                    for index, row in permits_df.iterrows():
-                        # Skip rows without category or quantity
-                        if pd.isna(row.iloc[0]) or pd.isna(row.iloc[1]):
-                            continue
-                        
-                        category = str(row.iloc[0]).strip()
-                        
-                        # Skip header rows or empty categories
-                        if not category or category.lower() in ['item', 'description', 'category']:
-                            continue
-                        
-                        try:
-                            quantity = int(row.iloc[1]) if pd.notna(row.iloc[1]) else 0
-                        except (ValueError, TypeError):
-                            quantity = 0
-                        
-                        # Only add items with quantity > 0
-                        if quantity > 0:
-                            description = str(row.iloc[2]) if len(row) > 2 and pd.notna(row.iloc[2]) else None
-                            
-                            cursor.execute(
-                                """INSERT INTO PermitItems
-                                   (job_id, category, quantity, description)
-                                   VALUES (%s, %s, %s, %s)""",
-                                (job_id, category, quantity, description)
-                            )
-                            conn.commit()
-                            permit_items_added += 1
-                            permit_rows_processed += 1
-                    
-                    print(f"Added {permit_rows_processed} permit items.")
-                    
-                except Exception as e:
-                    print(f"Warning: Could not process Permits sheet: {e}")
+                counts = write_job_sheet(conn, cursor, job_map[job_number], parsed)
+                stages_updated += counts['stages_updated']
+                room_specs_added += counts['room_specs_added']
+                permit_items_added += counts['permit_items_added']
+                errors += counts['errors']
                 
                 jobs_processed += 1
                 print(f"Successfully processed job {job_number}")
                 
+                # Only clean imports are recorded, so files with errors are retried next run
+                if parsed['errors'] == 0 and counts['errors'] == 0:
+                    imported_sheets = set(args.sheets)
+                    previous = manifest.get(file_name)
+                    if previous and previous.get('sha256') == file_hashes[file_name]:
+                        imported_sheets |= set(previous.get('sheets', []))
+                    manifest[file_name] = {
+                        'sha256': file_hashes[file_name],
+                        'imported_at': datetime.now().isoformat(timespec='seconds'),
+                        'sheets': sorted(imported_sheets)
+                    }
+                    save_json_state(args.manifest, manifest)
+            
             except Exception as e:
                 print(f"Error processing job file {file_name}: {e}")
                 errors += 1
         
+        if args.pipeline:
+            print(f"\nParser thread waited for the writer {pipeline.parser_waits} times.")
+        
         print("\nMigration Summary:")
         print(f"Job sheets processed: {jobs_processed}")
+        print(f"Unchanged job sheets skipped: {unchanged_skipped}")
         print(f"Stages created/updated: {stages_updated}")
         print(f"Room specifications added: {room_specs_added}")
         print(f"Permit items added: {permit_items_added}")
         print(f"Errors encountered: {errors}")
+        if sheet_cache:
+            print(f"Sheets loaded from the sheet cache: {cache_hits}")
         print("Migration completed!")
         
-    except mysql.connector.Error as err:
+        metrics.set_counts(len(files_to_parse), jobs_processed=jobs_processed, unchanged_skipped=unchanged_skipped,
+                           stages_updated=stages_updated, room_specs_added=room_specs_added,
+                           permit_items_added=permit_items_added, errors=errors)
+        metrics.finish()
+    
+    except DatabaseError as err:
         print(f"Database error: {err}")
         sys.exit(1)
     except Exception as e:
         print(f"Error: {e}")
         sys.exit(1)
     finally:
+        if 'pipeline' in locals():
+            pipeline.close()
         if 'conn' in locals() and conn.is_connected():
             cursor.close()
             conn.close()
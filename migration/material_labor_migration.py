@@ -2,13 +2,311 @@
 # material_labor_migration.py
 # Script to import material and labor entries from ERE.xlsx to the MySQL database
 
-import pandas as pd
-import mysql.connector
-from datetime import datetime
+from collections import namedtuple
+from datetime import date, datetime
+import argparse
 import os
 import sys
 
-def main():
+from batch_writer import BatchInserter, BulkFileLoader, server_allows_local_infile
+from constants import STAGE_NAMES
+from db_backend import DatabaseError, add_database_arguments, connect, describe
+from excel_readers import iter_sheet_records
+from import_metrics import ImportMetrics, add_metrics_arguments
+from import_state import file_sha256, ensure_checkpoint_table, load_checkpoint, save_checkpoint
+from pipeline import DEFAULT_QUEUE_CHUNKS, Pipeline
+from sheet_cache import add_cache_arguments, cache_from_args
+
+MIGRATION_NAME = 'material_labor_migration'
+
+# One row of the Material and Labor sheet
+LedgerRow = namedtuple('LedgerRow', [
+    'job_number', 'stage', 'date', 'hours', 'employee',
+    'cost', 'vendor', 'invoice_number', 'invoice_total', 'notes'
+])
+
+# A LedgerRow after validation, ready for the job, stage, employee and vendor lookups
+LedgerEntry = namedtuple('LedgerEntry', [
+    'job_number', 'stage_name', 'date', 'hours', 'employee',
+    'cost', 'vendor', 'invoice_number', 'invoice_total', 'notes'
+])
+
+# Sheet column header -> LedgerRow field
+LEDGER_COLUMNS = {
+    'Job number': 'job_number',
+    'Stage': 'stage',
+    'Date': 'date',
+    'Hours': 'hours',
+    'Employee': 'employee',
+    'Cost': 'cost',
+    'Vendor': 'vendor',
+    'Invoice #': 'invoice_number',
+    'Invoice Total': 'invoice_total',
+    'Notes': 'notes'
+}
+
+LABOR_INSERT_SQL = """INSERT INTO LaborEntries 
+                      (job_id, employee_id, stage_id, date, hours) 
+                      VALUES (%s, %s, %s, %s, %s)"""
+
+LABOR_COLUMNS = ['job_id', 'employee_id', 'stage_id', 'date', 'hours']
+
+MATERIAL_INSERT_SQL = """INSERT INTO MaterialEntries 
+                         (job_id, stage_id, vendor_id, date, cost, invoice_number, invoice_total, notes) 
+                         VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"""
+
+MATERIAL_COLUMNS = ['job_id', 'stage_id', 'vendor_id', 'date', 'cost', 'invoice_number', 'invoice_total', 'notes']
+
+# Raw ERE rows are bulk-loaded here and resolved to IDs with set-based statements
+STAGING_TABLE_SQL = """
+    CREATE TEMPORARY TABLE IF NOT EXISTS `LedgerStaging` (
+        `source_row` INT NOT NULL,
+        `job_number` VARCHAR(255) NOT NULL,
+        `stage_name` VARCHAR(20) NOT NULL,
+        `entry_date` DATE NOT NULL,
+        `hours` DECIMAL(5,2) NULL,
+        `employee_name` VARCHAR(255) NULL,
+        `cost` DECIMAL(10,2) NULL,
+        `vendor_name` VARCHAR(255) NULL,
+        `invoice_number` VARCHAR(50) NULL,
+        `invoice_total` DECIMAL(10,2) NULL,
+        `notes` TEXT NULL,
+        INDEX `idx_job_number` (`job_number`)
+    )
+"""
+
+STAGING_COLUMNS = [
+    'source_row', 'job_number', 'stage_name', 'entry_date', 'hours', 'employee_name',
+    'cost', 'vendor_name', 'invoice_number', 'invoice_total', 'notes'
+]
+
+STAGING_INSERT_SQL = f"""INSERT INTO LedgerStaging ({', '.join(STAGING_COLUMNS)})
+                         VALUES ({', '.join(['%s'] * len(STAGING_COLUMNS))})"""
+
+# Staged rows whose labor entry can't be written because the employee is unknown are
+# skipped entirely, as the row-by-row import does
+UNKNOWN_EMPLOYEE_SQL = """(s.hours > 0 AND s.employee_name IS NOT NULL
+                           AND NOT EXISTS (SELECT 1 FROM Employees e WHERE e.name = s.employee_name))"""
+
+STAGING_MERGE_SQL = {
+    'missing_jobs': """
+        SELECT COUNT(*) FROM LedgerStaging s
+        LEFT JOIN Jobs j ON j.job_number = s.job_number
+        WHERE j.job_id IS NULL
+    """,
+    'unknown_employees': f"""
+        SELECT COUNT(*) FROM LedgerStaging s
+        JOIN Jobs j ON j.job_number = s.job_number
+        WHERE {UNKNOWN_EMPLOYEE_SQL}
+    """,
+    'stages': """
+        INSERT INTO JobStages (job_id, stage_name)
+        SELECT DISTINCT j.job_id, s.stage_name
+        FROM LedgerStaging s
+        JOIN Jobs j ON j.job_number = s.job_number
+        WHERE NOT EXISTS (
+            SELECT 1 FROM JobStages js WHERE js.job_id = j.job_id AND js.stage_name = s.stage_name
+        )
+    """,
+    'vendors': f"""
+        INSERT INTO Vendors (name)
+        SELECT MIN(s.vendor_name)
+        FROM LedgerStaging s
+        JOIN Jobs j ON j.job_number = s.job_number
+        WHERE s.cost > 0 AND s.vendor_name IS NOT NULL
+          AND NOT {UNKNOWN_EMPLOYEE_SQL}
+          AND NOT EXISTS (SELECT 1 FROM Vendors v WHERE v.name = s.vendor_name)
+        GROUP BY s.vendor_name
+    """,
+    'labor': """
+        INSERT INTO LaborEntries (job_id, employee_id, stage_id, date, hours)
+        SELECT j.job_id,
+               (SELECT MAX(e.employee_id) FROM Employees e WHERE e.name = s.employee_name),
+               (SELECT MIN(js.stage_id) FROM JobStages js
+                WHERE js.job_id = j.job_id AND js.stage_name = s.stage_name),
+               s.entry_date, s.hours
+        FROM LedgerStaging s
+        JOIN Jobs j ON j.job_number = s.job_number
+        WHERE s.hours > 0
+          AND EXISTS (SELECT 1 FROM Employees e WHERE e.name = s.employee_name)
+        ORDER BY s.source_row
+    """,
+    'material': f"""
+        INSERT INTO MaterialEntries
+            (job_id, stage_id, vendor_id, date, cost, invoice_number, invoice_total, notes)
+        SELECT j.job_id,
+               (SELECT MIN(js.stage_id) FROM JobStages js
+                WHERE js.job_id = j.job_id AND js.stage_name = s.stage_name),
+               COALESCE((SELECT MAX(v.vendor_id) FROM Vendors v WHERE v.name = s.vendor_name), %s),
+               s.entry_date, s.cost, s.invoice_number, s.invoice_total, s.notes
+        FROM LedgerStaging s
+        JOIN Jobs j ON j.job_number = s.job_number
+        WHERE s.cost > 0
+          AND NOT {UNKNOWN_EMPLOYEE_SQL}
+          AND (s.vendor_name IS NOT NULL OR %s IS NOT NULL)
+        ORDER BY s.source_row
+    """
+}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Import material and labor entries from ERE.xlsx")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="Number of entries written per executemany batch (default: 1000)")
+    parser.add_argument("--checkpoint-every", type=int, default=0,
+                        help="Commit and record a checkpoint every N source rows (default: 0, one transaction)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue after the last checkpoint instead of starting from the first row")
+    parser.add_argument("--bulk-load", action="store_true",
+                        help="Load entries with LOAD DATA LOCAL INFILE instead of batched INSERTs")
+    parser.add_argument("--staging", action="store_true",
+                        help="Load raw rows into a staging table and resolve jobs, stages and vendors in SQL")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Read and validate rows on a background thread while entries are written")
+    parser.add_argument("--queue-chunks", type=int, default=DEFAULT_QUEUE_CHUNKS,
+                        help=f"With --pipeline, chunks of --batch-size rows the reader may get ahead of the writer "
+                             f"(default: {DEFAULT_QUEUE_CHUNKS})")
+    add_database_arguments(parser)
+    add_metrics_arguments(parser)
+    add_cache_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.staging and (args.resume or args.checkpoint_every):
+        parser.error("--staging imports in a single transaction and can't be combined with --resume or --checkpoint-every")
+    return args
+
+def to_entry_date(value):
+    """Return a date for an ERE Date cell, defaulting to today like the row-by-row import"""
+    if value is None:
+        return datetime.now().date()
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.fromisoformat(str(value).strip()).date()
+
+def parse_ledger_row(row):
+    """Validate a LedgerRow and convert its values, returning a LedgerEntry (None if there's no job number).
+    
+    Raises ValueError or TypeError for a value that can't be converted.
+    Needs no database, so it can run on the pipeline's reader thread.
+    """
+    if row.job_number is None:
+        return None
+    
+    stage_name = str(row.stage) if row.stage is not None else 'Other'
+    if stage_name not in STAGE_NAMES:
+        raise ValueError(f"Unknown stage '{stage_name}'")
+    
+    cost = float(row.cost) if row.cost is not None else None
+    has_material = cost is not None and cost > 0
+    return LedgerEntry(
+        str(row.job_number).strip(),
+        stage_name,
+        row.date if row.date is not None else datetime.now().date(),
+        float(row.hours) if row.hours is not None else None,
+        row.employee,
+        cost,
+        row.vendor,
+        str(row.invoice_number) if has_material and row.invoice_number is not None else None,
+        float(row.invoice_total) if has_material and row.invoice_total is not None else None,
+        str(row.notes) if has_material and row.notes is not None else None
+    )
+
+def parse_ledger_records(records):
+    """Yield (index, entry, error) for each (index, LedgerRow); error is the exception for an invalid row"""
+    for index, row in records:
+        try:
+            yield index, parse_ledger_row(row), None
+        except (ValueError, TypeError) as e:
+            yield index, None, e
+
+def stage_ledger_rows(excel_file, sheet_name, writer, metrics=None, pipelined=False, queue_chunks=DEFAULT_QUEUE_CHUNKS,
+                      cache=None, file_hash=None):
+    """Validate each ERE row and queue it for the staging table.
+    
+    With pipelined, the sheet is read on a background thread while the
+    rows are written; cache is an optional SheetCache for the sheet.
+    Returns (rows_read, rows_staged, errors, last_index).
+    """
+    rows_read = 0
+    errors = 0
+    last_index = -1
+    
+    records = iter_sheet_records(excel_file, LedgerRow, LEDGER_COLUMNS, sheet_name, cache, file_hash)
+    pipeline = None
+    if pipelined:
+        records = pipeline = Pipeline(records, writer.batch_size, queue_chunks)
+    if metrics is not None:
+        records = metrics.timed(records)
+    for index, row in records:
+        rows_read += 1
+        last_index = index
+        try:
+            # Skip rows without job number
+            if row.job_number is None:
+                print(f"Skipping row {index}: No job number")
+                continue
+            
+            stage_name = str(row.stage) if row.stage is not None else 'Other'
+            if stage_name not in STAGE_NAMES:
+                raise ValueError(f"Unknown stage '{stage_name}'")
+            
+            hours = float(row.hours) if row.hours is not None else None
+            if hours and hours > 0 and row.employee is None:
+                print(f"Warning: Row {index} has hours but no employee specified")
+            
+            writer.add((
+                index,
+                str(row.job_number).strip(),
+                stage_name,
+                to_entry_date(row.date),
+                hours,
+                str(row.employee).lower().strip() if row.employee is not None else None,
+                float(row.cost) if row.cost is not None else None,
+                str(row.vendor).strip() if row.vendor is not None else None,
+                str(row.invoice_number) if row.invoice_number is not None else None,
+                float(row.invoice_total) if row.invoice_total is not None else None,
+                str(row.notes) if row.notes is not None else None
+            ))
+            
+        except Exception as e:
+            print(f"Error processing row {index}: {e}")
+            errors += 1
+    
+    writer.flush()
+    if pipeline is not None and metrics is not None:
+        metrics.add_worker_time('pipeline_reader', pipeline.parser_seconds)
+    return rows_read, writer.rows_written, errors, last_index
+
+def merge_staged_ledger(cursor):
+    """Create missing stages and vendors and insert the entries from LedgerStaging; returns counts"""
+    counts = {}
+    
+    for check in ('missing_jobs', 'unknown_employees'):
+        cursor.execute(STAGING_MERGE_SQL[check])
+        counts[check] = cursor.fetchone()[0]
+    
+    cursor.execute(STAGING_MERGE_SQL['stages'])
+    counts['stages_added'] = cursor.rowcount
+    
+    cursor.execute(STAGING_MERGE_SQL['vendors'])
+    counts['vendors_added'] = cursor.rowcount
+    
+    cursor.execute(STAGING_MERGE_SQL['labor'])
+    counts['labor_entries_added'] = cursor.rowcount
+    
+    # Rows without a vendor fall back to the first vendor, as in the row-by-row import
+    cursor.execute("SELECT MIN(vendor_id) FROM Vendors")
+    default_vendor_id = cursor.fetchone()[0]
+    cursor.execute(STAGING_MERGE_SQL['material'], (default_vendor_id, default_vendor_id))
+    counts['material_entries_added'] = cursor.rowcount
+    
+    return counts
+
+def main(argv=None):
+    args = parse_args(argv)
+    metrics = ImportMetrics(MIGRATION_NAME, args)
+    sheet_cache = cache_from_args(args)
+    
     print("Electrical Contractor System - Material and Labor Migration")
     print("=========================================================")
     
@@ -31,15 +329,78 @@ def main():
     
     try:
         # Connect to the database
-        print(f"Connecting to MySQL database...")
-        conn = mysql.connector.connect(**db_config)
+        print(f"Connecting to {describe(db_config, args)}...")
+        if args.bulk_load:
+            conn = metrics.wrap_connection(connect(db_config, args, allow_local_infile=True))
+        else:
+            conn = metrics.wrap_connection(connect(db_config, args))
         cursor = conn.cursor()
         
-        # Read the Excel file
-        print(f"Reading {excel_file}, sheet '{sheet_name}'...")
-        ml_df = pd.read_excel(excel_file, sheet_name=sheet_name)
+        # Work out where to start from the saved checkpoint
+        ensure_checkpoint_table(cursor)
+        with metrics.phase('excel_read'):
+            source_hash = file_sha256(excel_file)
+        resume_after = -1  # Index of the last source row already committed
+        batch_number = 0
+        
+        if args.resume:
+            checkpoint = load_checkpoint(cursor, MIGRATION_NAME)
+            if checkpoint is None:
+                print("No checkpoint found, starting from the first row.")
+            elif checkpoint['source_hash'] != source_hash:
+                print(f"Error: {excel_file} has changed since the checkpoint was written; cannot resume safely.")
+                sys.exit(1)
+            elif checkpoint['is_complete']:
+                print("The last import of this file completed; nothing to resume.")
+                sys.exit(0)
+            else:
+                resume_after = checkpoint['last_row']
+                batch_number = checkpoint['batch_number']
+                print(f"Resuming after row {resume_after} (checkpoint batch {batch_number}).")
+        else:
+            checkpoint = load_checkpoint(cursor, MIGRATION_NAME)
+            if checkpoint and not checkpoint['is_complete']:
+                print(f"Warning: an interrupted import committed rows through {checkpoint['last_row']}; "
+                      f"use --resume to continue it without duplicating entries.")
         
-        print(f"Found {len(ml_df)} records.")
+        if args.staging:
+            # Load every row into the staging table, then resolve and insert with a few set-based statements
+            cursor.execute(STAGING_TABLE_SQL)
+            if args.bulk_load and server_allows_local_infile(cursor):
+                staging_writer = BulkFileLoader(cursor, 'LedgerStaging', STAGING_COLUMNS, STAGING_INSERT_SQL, args.batch_size)
+            else:
+                staging_writer = BatchInserter(cursor, STAGING_INSERT_SQL, args.batch_size)
+            
+            print(f"Reading {excel_file}, sheet '{sheet_name}' into the staging table...")
+            try:
+                rows_read, rows_staged, errors, last_index = stage_ledger_rows(
+                    excel_file, sheet_name, staging_writer, metrics, args.pipeline, args.queue_chunks,
+                    sheet_cache, source_hash
+                )
+            finally:
+                staging_writer.close()
+            print(f"Staged {rows_staged} rows.")
+            
+            counts = merge_staged_ledger(cursor)
+            save_checkpoint(cursor, MIGRATION_NAME, excel_file, source_hash, last_index, 1, is_complete=True)
+            conn.commit()
+            
+            print("\nMigration Summary:")
+            print(f"Rows read: {rows_read}")
+            print(f"Rows skipped, job not found in database: {counts['missing_jobs']}")
+            print(f"Rows skipped, employee not found in database: {counts['unknown_employees']}")
+            print(f"Labor entries added: {counts['labor_entries_added']}")
+            print(f"Material entries added: {counts['material_entries_added']}")
+            print(f"Job stages created: {counts['stages_added']}")
+            print(f"Vendors added: {counts['vendors_added']}")
+            print(f"Errors encountered: {errors}")
+            if sheet_cache:
+                print(f"Sheet cache: {sheet_cache.hits} hits, {sheet_cache.misses} misses")
+            print("Migration completed!")
+            
+            metrics.set_counts(rows_read, rows_staged=rows_staged, errors=errors, **counts)
+            metrics.finish()
+            return
         
         # Get job mapping (job_number -> job_id)
         cursor.execute("SELECT job_id, job_number FROM Jobs")
@@ -59,22 +420,71 @@ def main():
         # Track job stages to avoid recreating them
         stages_map = {}  # format: "job_id_stage_name" -> stage_id
         
+        # Entries are buffered and written in batches; everything is committed once at the end
+        # unless --checkpoint-every asks for a commit and checkpoint every N source rows
+        bulk_load = args.bulk_load
+        if bulk_load and not server_allows_local_infile(cursor):
+            print("Server has local_infile disabled; falling back to batched inserts.")
+            bulk_load = False
+        
+        if bulk_load:
+            labor_writer = BulkFileLoader(cursor, 'LaborEntries', LABOR_COLUMNS, LABOR_INSERT_SQL, args.batch_size)
+            material_writer = BulkFileLoader(cursor, 'MaterialEntries', MATERIAL_COLUMNS, MATERIAL_INSERT_SQL, args.batch_size)
+            print("Spooling entries to temporary files for LOAD DATA LOCAL INFILE.")
+        else:
+            labor_writer = BatchInserter(cursor, LABOR_INSERT_SQL, args.batch_size)
+            material_writer = BatchInserter(cursor, MATERIAL_INSERT_SQL, args.batch_size)
+            print(f"Writing entries in batches of {labor_writer.batch_size}.")
+        
         # Initialize counters
         labor_entries_added = 0
         material_entries_added = 0
         stages_added = 0
         vendors_added = 0
         errors = 0
+        rows_read = 0
+        rows_since_checkpoint = 0
+        last_index = resume_after
         
-        # Process each row
-        for index, row in ml_df.iterrows():
+        # Stream the sheet one row at a time
+        print(f"Reading {excel_file}, sheet '{sheet_name}'...")
+        records = iter_sheet_records(excel_file, LedgerRow, LEDGER_COLUMNS, sheet_name, sheet_cache, source_hash)
+        if args.pipeline:
+            # Read and validate on a background thread; time spent waiting for it is excel_read
+            pipeline = Pipeline(parse_ledger_records(records), args.batch_size, args.queue_chunks)
+            entries = metrics.timed(pipeline)
+            print(f"Reading on a background thread, up to {args.queue_chunks} batches ahead of the writer.")
+        else:
+            entries = metrics.timed(parse_ledger_records(metrics.timed(records, body_phase=None)), 'parse')
+        
+        for index, entry, parse_error in entries:
+            # Rows up to the checkpoint were committed by an earlier run
+            if index <= resume_after:
+                continue
+            
+            # Commit everything up to the previous row together with its checkpoint
+            if args.checkpoint_every > 0 and rows_since_checkpoint >= args.checkpoint_every:
+                labor_writer.flush()
+                material_writer.flush()
+                batch_number += 1
+                save_checkpoint(cursor, MIGRATION_NAME, excel_file, source_hash, last_index, batch_number)
+                conn.commit()
+                rows_since_checkpoint = 0
+                print(f"Checkpoint {batch_number}: committed through row {last_index}")
+            
+            rows_read += 1
+            rows_since_checkpoint += 1
+            last_index = index
             try:
+                if parse_error is not None:
+                    raise parse_error
+                
                 # Skip rows without job number
-                if 'Job number' not in row or pd.isna(row['Job number']):
+                if entry is None:
                     print(f"Skipping row {index}: No job number")
                     continue
                 
-                job_number = str(row['Job number']).strip()
+                job_number = entry.job_number
                 
                 # Skip if job doesn't exist in database
                 if job_number not in job_map:
@@ -84,7 +494,7 @@ def main():
                 job_id = job_map[job_number]
                 
                 # Get or create stage
-                stage_name = str(row['Stage']) if 'Stage' in row and pd.notna(row['Stage']) else 'Other'
+                stage_name = entry.stage_name
                 stage_key = f"{job_id}_{stage_name}"
                 
                 if stage_key not in stages_map:
@@ -103,47 +513,39 @@ def main():
                             "INSERT INTO JobStages (job_id, stage_name) VALUES (%s, %s)",
                             (job_id, stage_name)
                         )
-                        conn.commit()
                         stages_map[stage_key] = cursor.lastrowid
                         stages_added += 1
                 
                 stage_id = stages_map[stage_key]
                 
-                # Get date
-                entry_date = row['Date'] if 'Date' in row and pd.notna(row['Date']) else datetime.now().date()
+                entry_date = entry.date
                 
                 # Process labor entry if hours exist
-                if 'Hours' in row and pd.notna(row['Hours']) and float(row['Hours']) > 0:
-                    if 'Employee' not in row or pd.isna(row['Employee']):
+                if entry.hours is not None and entry.hours > 0:
+                    if entry.employee is None:
                         print(f"Warning: Row {index} has hours but no employee specified")
                     else:
-                        employee_name = str(row['Employee']).lower().strip()
+                        employee_name = str(entry.employee).lower().strip()
                         
                         # Find employee ID
                         employee_id = None
                         if employee_name in employee_map:
                             employee_id = employee_map[employee_name]
                         else:
-                            print(f"Warning: Employee '{row['Employee']}' not found in database")
+                            print(f"Warning: Employee '{entry.employee}' not found in database")
                             continue
                         
                         if employee_id:
-                            # Insert labor entry
-                            cursor.execute(
-                                """INSERT INTO LaborEntries 
-                                   (job_id, employee_id, stage_id, date, hours) 
-                                   VALUES (%s, %s, %s, %s, %s)""",
-                                (job_id, employee_id, stage_id, entry_date, float(row['Hours']))
-                            )
-                            conn.commit()
+                            # Queue labor entry
+                            labor_writer.add((job_id, employee_id, stage_id, entry_date, entry.hours))
                             labor_entries_added += 1
                 
                 # Process material entry if cost exists
-                if 'Cost' in row and pd.notna(row['Cost']) and float(row['Cost']) > 0:
+                if entry.cost is not None and entry.cost > 0:
                     # Handle vendor
                     vendor_id = None
-                    if 'Vendor' in row and pd.notna(row['Vendor']):
-                        vendor_name = str(row['Vendor']).lower().strip()
+                    if entry.vendor is not None:
+                        vendor_name = str(entry.vendor).lower().strip()
                         
                         # Find or create vendor
                         if vendor_name in vendor_map:
@@ -152,9 +554,8 @@ def main():
                             # Create new vendor
                             cursor.execute(
                                 "INSERT INTO Vendors (name) VALUES (%s)",
-                                (row['Vendor'],)
+                                (entry.vendor,)
                             )
-                            conn.commit()
                             vendor_id = cursor.lastrowid
                             vendor_map[vendor_name] = vendor_id
                             vendors_added += 1
@@ -163,43 +564,74 @@ def main():
                         vendor_id = next(iter(vendor_map.values())) if vendor_map else None
                     
                     if vendor_id:
-                        # Get invoice info
-                        invoice_number = str(row['Invoice #']) if 'Invoice #' in row and pd.notna(row['Invoice #']) else None
-                        invoice_total = float(row['Invoice Total']) if 'Invoice Total' in row and pd.notna(row['Invoice Total']) else None
-                        notes = str(row['Notes']) if 'Notes' in row and pd.notna(row['Notes']) else None
-                        
-                        # Insert material entry
-                        cursor.execute(
-                            """INSERT INTO MaterialEntries 
-                               (job_id, stage_id, vendor_id, date, cost, invoice_number, invoice_total, notes) 
-                               VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
-                            (
-                                job_id, stage_id, vendor_id, entry_date, 
-                                float(row['Cost']), invoice_number, invoice_total, notes
-                            )
-                        )
-                        conn.commit()
+                        # Queue material entry
+                        material_writer.add((
+                            job_id, stage_id, vendor_id, entry_date, 
+                            entry.cost, entry.invoice_number, entry.invoice_total, entry.notes
+                        ))
                         material_entries_added += 1
                 
+            except DatabaseError:
+                # A failed batch write aborts the whole transaction
+                raise
             except Exception as e:
                 print(f"Error processing row {index}: {e}")
                 errors += 1
         
+        if args.pipeline:
+            metrics.add_worker_time('pipeline_reader', pipeline.parser_seconds)
+            print(f"Reader thread busy for {pipeline.parser_seconds:.1f}s; "
+                  f"it waited for the writer {pipeline.parser_waits} times.")
+        
+        # Write any remaining queued entries and commit them with the final checkpoint
+        labor_writer.flush()
+        material_writer.flush()
+        batch_number += 1
+        save_checkpoint(cursor, MIGRATION_NAME, excel_file, source_hash, last_index, batch_number, is_complete=True)
+        conn.commit()
+        
         print("\nMigration Summary:")
+        print(f"Rows read: {rows_read}")
         print(f"Labor entries added: {labor_entries_added}")
         print(f"Material entries added: {material_entries_added}")
         print(f"Job stages created: {stages_added}")
         print(f"Vendors added: {vendors_added}")
         print(f"Errors encountered: {errors}")
+        print(f"Write batches: {labor_writer.batches_written + material_writer.batches_written}")
+        if bulk_load:
+            for label, writer, added in (("Labor", labor_writer, labor_entries_added),
+                                         ("Material", material_writer, material_entries_added)):
+                print(f"{label} entries loaded by LOAD DATA: {writer.rows_loaded}")
+                if writer.rows_inserted:
+                    print(f"{label} entries written by fallback inserts: {writer.rows_inserted}")
+                if writer.rows_loaded + writer.rows_inserted != added:
+                    print(f"Warning: {added} {label.lower()} entries were spooled but the server reported "
+                          f"{writer.rows_loaded + writer.rows_inserted}; check SHOW WARNINGS.")
+        if sheet_cache:
+            print(f"Sheet cache: {sheet_cache.hits} hits, {sheet_cache.misses} misses")
         print("Migration completed!")
         
-    except mysql.connector.Error as err:
+        metrics.set_counts(rows_read, labor_entries_added=labor_entries_added,
+                           material_entries_added=material_entries_added, stages_added=stages_added,
+                           vendors_added=vendors_added, errors=errors)
+        metrics.finish()
+        
+    except DatabaseError as err:
         print(f"Database error: {err}")
+        if 'conn' in locals():
+            conn.rollback()
         sys.exit(1)
     except Exception as e:
         print(f"Error: {e}")
+        if 'conn' in locals():
+            conn.rollback()
         sys.exit(1)
     finally:
+        if 'pipeline' in locals():
+            pipeline.close()
+        if 'material_writer' in locals():
+            labor_writer.close()
+            material_writer.close()
         if 'conn' in locals() and conn.is_connected():
             cursor.close()
             conn.close()
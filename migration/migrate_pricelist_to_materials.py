@@ -2,9 +2,13 @@
 # This script migrates items from the PriceList table to the Materials table
 # so they can be used in Material Price Tracking
 
-import mysql.connector
+import argparse
 from datetime import datetime
 
+from db_backend import DatabaseError, add_database_arguments, connect, table_exists
+from import_metrics import ImportMetrics, add_metrics_arguments
+from price_history import PriceHistoryWriter, code_key
+
 # Database configuration
 DB_CONFIG = {
     'host': 'localhost',
@@ -13,31 +17,26 @@ DB_CONFIG = {
     'database': 'electrical_contractor_db'
 }
 
-def migrate_pricelist_to_materials():
+def migrate_pricelist_to_materials(args=None, metrics=None):
     """
     Migrate items from PriceList table to Materials table
     """
     connection = None
     cursor = None
+    row_cursor = None
     
     try:
         # Connect to database
-        connection = mysql.connector.connect(**DB_CONFIG)
+        connection = connect(DB_CONFIG, args)
+        if metrics is not None:
+            connection = metrics.wrap_connection(connection)
         cursor = connection.cursor(dictionary=True)
+        row_cursor = connection.cursor()  # Tuple rows, for the helpers that unpack them
         
         print("Connected to database successfully")
         
         # First, check if Materials table exists
-        cursor.execute("""
-            SELECT COUNT(*) as table_exists 
-            FROM information_schema.tables 
-            WHERE table_schema = %s 
-            AND table_name = 'Materials'
-        """, (DB_CONFIG['database'],))
-        
-        result = cursor.fetchone()
-        
-        if result['table_exists'] == 0:
+        if not table_exists(row_cursor, 'Materials'):
             print("Materials table does not exist. Creating it now...")
             
             # Create Materials table
@@ -85,9 +84,10 @@ def migrate_pricelist_to_materials():
         
         print(f"Found {len(price_list_items)} items in PriceList")
         
-        # Check for existing materials to avoid duplicates
-        cursor.execute("SELECT material_code FROM Materials")
-        existing_codes = {row['material_code'] for row in cursor.fetchall()}
+        # Snapshot existing materials and their prices; the codes are used to avoid duplicates
+        price_history = PriceHistoryWriter(row_cursor, 'Migration Script', 'PriceList migration')
+        price_history.load_snapshot()
+        existing_codes = set(price_history.snapshot)
         
         # Prepare data for insertion
         materials_to_insert = []
@@ -95,7 +95,7 @@ def migrate_pricelist_to_materials():
         
         for item in price_list_items:
             # Skip if material code already exists
-            if item['item_code'] in existing_codes:
+            if code_key(item['item_code']) in existing_codes:
                 print(f"Skipping {item['item_code']} - {item['name']} (already exists)")
                 skipped_count += 1
                 continue
@@ -117,6 +117,8 @@ def migrate_pricelist_to_materials():
             )
             
             materials_to_insert.append(material_data)
+            existing_codes.add(code_key(item['item_code']))
+            price_history.record(item['item_code'], item['base_cost'])
         
         if materials_to_insert:
             # Insert materials in batches
@@ -136,25 +138,10 @@ def migrate_pricelist_to_materials():
         if skipped_count > 0:
             print(f"Skipped {skipped_count} items that already existed")
         
-        # Create MaterialPriceHistory entries for the initial prices
+        # Create MaterialPriceHistory entries for the materials just added
         print("\nCreating initial price history entries...")
         
-        cursor.execute("""
-            INSERT INTO MaterialPriceHistory 
-            (material_id, price, effective_date, notes, created_by, created_date)
-            SELECT 
-                m.material_id,
-                m.current_price,
-                m.created_date,
-                'Initial price from PriceList migration',
-                'Migration Script',
-                NOW()
-            FROM Materials m
-            LEFT JOIN MaterialPriceHistory mph ON m.material_id = mph.material_id
-            WHERE mph.material_id IS NULL
-        """)
-        
-        history_count = cursor.rowcount
+        history_count = price_history.flush()
         connection.commit()
         
         print(f"Created {history_count} initial price history entries")
@@ -176,7 +163,12 @@ def migrate_pricelist_to_materials():
         for row in cursor.fetchall():
             print(f"  {row['category']}: {row['count']} items")
         
-    except mysql.connector.Error as e:
+        if metrics is not None:
+            metrics.set_counts(len(price_list_items), materials_added=len(materials_to_insert),
+                               skipped=skipped_count, history_entries=history_count)
+            metrics.finish()
+        
+    except DatabaseError as e:
         print(f"Database error: {e}")
         if connection:
             connection.rollback()
@@ -185,12 +177,14 @@ def migrate_pricelist_to_materials():
         if connection:
             connection.rollback()
     finally:
+        if row_cursor:
+            row_cursor.close()
         if cursor:
             cursor.close()
         if connection:
             connection.close()
 
-def create_material_price_history_table():
+def create_material_price_history_table(args=None, metrics=None):
     """
     Create MaterialPriceHistory table if it doesn't exist
     """
@@ -198,7 +192,9 @@ def create_material_price_history_table():
     cursor = None
     
     try:
-        connection = mysql.connector.connect(**DB_CONFIG)
+        connection = connect(DB_CONFIG, args)
+        if metrics is not None:
+            connection = metrics.wrap_connection(connection)
         cursor = connection.cursor()
         
         cursor.execute("""
@@ -232,7 +228,7 @@ def create_material_price_history_table():
         connection.commit()
         print("MaterialPriceHistory table created successfully")
         
-    except mysql.connector.Error as e:
+    except DatabaseError as e:
         print(f"Database error creating MaterialPriceHistory table: {e}")
     finally:
         if cursor:
@@ -241,6 +237,12 @@ def create_material_price_history_table():
             connection.close()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate PriceList items to the Materials table")
+    add_database_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    metrics = ImportMetrics('migrate_pricelist_to_materials', args)
+    
     print("PriceList to Materials Migration Script")
     print("======================================")
     print("\nThis script will migrate items from the PriceList table to the Materials table")
@@ -251,9 +253,9 @@ if __name__ == "__main__":
     
     if response.lower() in ['yes', 'y']:
         # First ensure MaterialPriceHistory table exists
-        create_material_price_history_table()
+        create_material_price_history_table(args, metrics)
         
         # Then run migration
-        migrate_pricelist_to_materials()
+        migrate_pricelist_to_materials(args, metrics)
     else:
         print("Migration cancelled.")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# pipeline.py
+# Run a parser on a background thread and hand its records to the writer through a bounded queue
+
+import queue
+import threading
+import time
+
+# Chunks of records the parser may get ahead of the writer before it blocks
+DEFAULT_QUEUE_CHUNKS = 8
+
+_DONE = object()
+
+class _Failure:
+    """Carries an exception raised by the parser over to the writer's thread"""
+    
+    def __init__(self, error):
+        self.error = error
+
+class Pipeline:
+    """Iterate over records produced on a parser thread while the caller writes them.
+    
+    The parser thread pulls from source and puts records on a queue in
+    chunks of chunk_size; at most max_chunks chunks wait in the queue, so a
+    slow writer holds the parser back instead of letting memory grow. An
+    exception raised by the source is re-raised in the caller's loop after
+    the records before it, and close() (or leaving the loop early) stops the
+    parser and closes the source if it is a generator. The source must not use the caller's database connection or
+    ImportMetrics, which aren't thread-safe.
+    """
+    
+    def __init__(self, source, chunk_size=500, max_chunks=DEFAULT_QUEUE_CHUNKS, name='parser'):
+        self.source = source
+        self.chunk_size = max(1, int(chunk_size))
+        self.queue = queue.Queue(maxsize=max(1, int(max_chunks)))
+        self.stopped = threading.Event()
+        self.parser_seconds = 0.0  # Time the parser spent producing records
+        self.parser_waits = 0  # Times the parser found the queue full and had to wait for the writer
+        self.thread = threading.Thread(target=self._produce, name=name, daemon=True)
+        self._started = False
+    
+    def _put(self, item):
+        """Put item on the queue, waiting while it is full; returns False if the pipeline was closed"""
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self.parser_waits += 1
+        # Wake up now and then so close() can stop a parser blocked on a full queue
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+    
+    def _produce(self):
+        chunk = []
+        iterator = None
+        try:
+            iterator = iter(self.source)
+            while not self.stopped.is_set():
+                start = time.perf_counter()
+                try:
+                    record = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    self.parser_seconds += time.perf_counter() - start
+                chunk.append(record)
+                if len(chunk) >= self.chunk_size:
+                    if not self._put(chunk):
+                        return
+                    chunk = []
+            if chunk and not self._put(chunk):
+                return
+            self._put(_DONE)
+        except BaseException as e:
+            # Hand over the records read before the error, then the error
+            if not chunk or self._put(chunk):
+                self._put(_Failure(e))
+        finally:
+            # A generator source left part way runs its cleanup now (e.g. shutting down a process pool)
+            # rather than whenever it is garbage collected
+            if hasattr(iterator, 'close'):
+                iterator.close()
+    
+    def __iter__(self):
+        if self._started:
+            raise RuntimeError("a Pipeline can only be iterated once")
+        self._started = True
+        self.thread.start()
+        try:
+            while True:
+                item = self.queue.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.error
+                yield from item
+        finally:
+            self.close()
+    
+    def close(self):
+        """Stop the parser thread and wait for it to finish its current record"""
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# price_history.py
+# Write MaterialPriceHistory rows only for materials whose price actually changed
+
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from batch_writer import write_in_batches
+
+# Codes per lookup query; stays under the 999 bound parameters older SQLite builds allow
+LOOKUP_CHUNK_SIZE = 900
+
+HISTORY_INSERT_SQL = """INSERT INTO MaterialPriceHistory
+                        (material_id, price, effective_date, notes, created_by)
+                        VALUES (%s, %s, %s, %s, %s)"""
+
+def code_key(code):
+    """A material or item code as the unique key compares it: case-insensitive, surrounding spaces ignored.
+    
+    MySQL's collation matches 'abc' to an existing 'ABC' in the upsert, so
+    snapshots and lookups are keyed the same way.
+    """
+    return str(code).strip().casefold()
+
+def resolve_material_ids(cursor, material_codes, chunk_size=LOOKUP_CHUNK_SIZE):
+    """Look up the material_id of each code with keyed IN queries; returns {code_key(material_code): material_id}"""
+    material_ids = {}
+    for start in range(0, len(material_codes), chunk_size):
+        chunk = material_codes[start:start + chunk_size]
+        cursor.execute(
+            f"SELECT material_code, material_id FROM Materials WHERE material_code IN ({', '.join(['%s'] * len(chunk))})",
+            chunk
+        )
+        material_ids.update((code_key(material_code), material_id) for material_code, material_id in cursor.fetchall())
+    return material_ids
+
+def to_cents(price):
+    """Price as a Decimal rounded to cents (the precision MaterialPriceHistory stores), or None"""
+    if price is None:
+        return None
+    try:
+        return Decimal(str(price)).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+
+class PriceHistoryWriter:
+    """Compare incoming prices with a snapshot of Materials and record only the changes.
+    
+    Load the snapshot before the import writes any prices, record() each
+    price the import actually wrote, then flush() once the Materials rows
+    are written. A material missing from the snapshot gets an initial-price
+    row; one whose price differs gets a change row; everything else is
+    skipped. Codes are compared with code_key(). The history table itself
+    is never read. Nothing is committed here.
+    """
+    
+    def __init__(self, cursor, created_by, source, batch_size=1000):
+        self.cursor = cursor
+        self.created_by = created_by
+        self.source = source  # Used in the notes, e.g. "Initial price from <source>"
+        self.batch_size = batch_size
+        self.effective_date = datetime.now()
+        self.snapshot = {}  # code_key(material_code) -> (material_id, price in cents)
+        self.pending = {}  # code_key(material_code) -> (material_code, new price in cents), last one recorded wins
+        self.initial_prices = 0
+        self.price_changes = 0
+    
+    def load_snapshot(self):
+        """Read every material's current price; call before the import updates Materials"""
+        self.cursor.execute("SELECT material_code, material_id, current_price FROM Materials")
+        self.snapshot = {
+            code_key(material_code): (material_id, to_cents(price))
+            for material_code, material_id, price in self.cursor.fetchall()
+        }
+        return len(self.snapshot)
+    
+    def record(self, material_code, price):
+        """Queue a history row for material_code if price differs from the snapshot.
+        
+        Only record prices that were written to Materials; a row whose write
+        failed would otherwise show a price change that never happened.
+        """
+        price = to_cents(price)
+        if price is None:
+            return
+        key = code_key(material_code)
+        known = self.snapshot.get(key)
+        if known is not None and known[1] == price:
+            self.pending.pop(key, None)
+        else:
+            self.pending[key] = (material_code, price)
+    
+    def flush(self):
+        """Write the queued history rows in batches and return how many were written.
+        
+        Ids are looked up only for materials that weren't in the snapshot.
+        """
+        if not self.pending:
+            return 0
+        new_codes = [material_code for key, (material_code, price) in self.pending.items() if key not in self.snapshot]
+        new_ids = resolve_material_ids(self.cursor, new_codes) if new_codes else {}
+        
+        rows = []
+        for key, (material_code, price) in self.pending.items():
+            known = self.snapshot.get(key)
+            if known is not None:
+                material_id, old_price = known
+                notes = f"Price changed from {old_price} ({self.source})"
+                self.price_changes += 1
+            elif key in new_ids:
+                material_id = new_ids[key]
+                notes = f"Initial price from {self.source}"
+                self.initial_prices += 1
+            else:
+                # The material row was never written (its upsert failed)
+                continue
+            rows.append((material_id, price, self.effective_date, notes, self.created_by))
+            self.snapshot[key] = (material_id, price)
+        
+        self.pending = {}
+        return write_in_batches(self.cursor, HISTORY_INSERT_SQL, rows, self.batch_size)
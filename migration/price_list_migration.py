@@ -3,11 +3,71 @@
 # Script to import price list from template 3.xlsx to the MySQL database
 
 import pandas as pd
-import mysql.connector
+import argparse
 import os
 import sys
 
-def main():
+from batch_writer import write_in_batches
+from db_backend import DatabaseError, add_database_arguments, connect, describe, table_exists
+from excel_readers import read_sheet
+from import_metrics import ImportMetrics, add_metrics_arguments
+from price_history import code_key
+from price_sync import PRICE_LIST_COLUMNS, load_current_rows, plan_sync
+from sheet_cache import add_cache_arguments, cache_from_args
+
+# Insert new items and update existing ones (matched on the unique item_code) in one statement
+PRICE_LIST_UPSERT_SQL = """INSERT INTO PriceList 
+                           (category, item_code, name, description, 
+                            base_cost, tax_rate, labor_minutes, markup_percentage) 
+                           VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                           ON DUPLICATE KEY UPDATE
+                           category = VALUES(category), name = VALUES(name), description = VALUES(description),
+                           base_cost = VALUES(base_cost), tax_rate = VALUES(tax_rate),
+                           labor_minutes = VALUES(labor_minutes), markup_percentage = VALUES(markup_percentage)"""
+
+# Sync mode: rewrite a changed item (reactivating it) or deactivate one that left the sheet
+PRICE_LIST_UPDATE_SQL = """UPDATE PriceList SET 
+                           category = %s, name = %s, description = %s, 
+                           base_cost = %s, tax_rate = %s, labor_minutes = %s, 
+                           markup_percentage = %s, is_active = TRUE
+                           WHERE item_code = %s"""
+PRICE_LIST_DEACTIVATE_SQL = "UPDATE PriceList SET is_active = FALSE WHERE item_code = %s"
+
+# PriceList has no created_by column, so the item codes this import has written
+# are kept in their own table; --sync only deactivates those. Being in the
+# database, the record moves with it when the database is copied or renamed.
+PRICE_LIST_IMPORTS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS `PriceListImports` (
+        `item_code` VARCHAR(20) NOT NULL,
+        `imported_date` DATETIME NOT NULL,
+        PRIMARY KEY (`item_code`)
+    )
+"""
+PRICE_LIST_IMPORT_SQL = """INSERT INTO PriceListImports (item_code, imported_date) VALUES (%s, NOW())
+                           ON DUPLICATE KEY UPDATE imported_date = VALUES(imported_date)"""
+PRICE_LIST_FORGET_SQL = "DELETE FROM PriceListImports WHERE item_code = %s"
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Import the price list from template 3.xlsx")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="Number of price list items written per executemany batch (default: 1000)")
+    parser.add_argument("--sync", action="store_true",
+                        help="Write only new and changed items and deactivate items no longer in the sheet")
+    parser.add_argument("--plan", action="store_true",
+                        help="Print what --sync would change without writing anything")
+    add_database_arguments(parser)
+    add_metrics_arguments(parser)
+    add_cache_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.plan:
+        args.sync = True
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    metrics = ImportMetrics('price_list_migration', args)
+    sheet_cache = cache_from_args(args)
+    
     print("Electrical Contractor System - Price List Migration")
     print("=================================================")
     
@@ -30,26 +90,48 @@ def main():
     
     try:
         # Connect to the database
-        print(f"Connecting to MySQL database...")
-        conn = mysql.connector.connect(**db_config)
+        print(f"Connecting to {describe(db_config, args)}...")
+        conn = metrics.wrap_connection(connect(db_config, args))
         cursor = conn.cursor()
         
+        # Before any rows are written, so the DDL doesn't commit part of the import on MySQL
+        if not args.plan:
+            cursor.execute(PRICE_LIST_IMPORTS_TABLE_SQL)
+        
         # Read the Excel file
         print(f"Reading {excel_file}, sheet '{sheet_name}'...")
         try:
-            price_df = pd.read_excel(excel_file, sheet_name=sheet_name)
+            with metrics.phase('excel_read'):
+                price_df = read_sheet(excel_file, sheet_name, sheet_cache)
             print(f"Found {len(price_df)} records.")
         except Exception as e:
             print(f"Error reading Excel sheet: {e}")
             print("Make sure the sheet name is correct and contains price data.")
             sys.exit(1)
         
+        # Load the existing item codes once instead of looking each row up. Codes
+        # are compared with code_key(), as case-insensitively as the unique index does
+        if args.sync:
+            current_rows = load_current_rows(cursor, 'PriceList', 'item_code', PRICE_LIST_COLUMNS)
+            existing_codes = {code_key(item_code) for item_code in current_rows}
+        else:
+            cursor.execute("SELECT item_code FROM PriceList")
+            existing_codes = {code_key(item_code) for (item_code,) in cursor.fetchall()}
+        
+        # Item codes earlier runs wrote from the sheet
+        owned_codes = set()
+        if table_exists(cursor, 'PriceListImports'):
+            cursor.execute("SELECT item_code FROM PriceListImports")
+            owned_codes = {item_code for (item_code,) in cursor.fetchall()}
+        if args.sync and not owned_codes and existing_codes:
+            print("Note: No price list items are recorded as imported yet, so --sync won't deactivate any.")
+        
         # Initialize counters
-        items_added = 0
+        price_items = {}  # item_code -> row to write; a code repeated in the sheet keeps its last row
         errors = 0
         
         # Process each row
-        for index, row in price_df.iterrows():
+        for index, row in metrics.timed(price_df.iterrows(), 'parse'):
             try:
                 # Skip header rows or empty rows
                 if not 'Name' in row or pd.isna(row['Name']):
@@ -106,54 +188,94 @@ def main():
                     except (ValueError, TypeError):
                         print(f"Warning: Invalid markup for item '{name}', using 15%")
                 
-                # Check if item code already exists
-                cursor.execute("SELECT item_id FROM PriceList WHERE item_code = %s", (item_code,))
-                existing_item = cursor.fetchone()
-                
-                if existing_item:
+                # --sync and --plan print the plan instead of every row
+                if not args.sync and (code_key(item_code) in existing_codes or item_code in price_items):
                     print(f"Item code '{item_code}' already exists, updating.")
-                    
-                    # Update existing item
-                    cursor.execute(
-                        """UPDATE PriceList SET 
-                           category = %s, name = %s, description = %s, 
-                           base_cost = %s, tax_rate = %s, labor_minutes = %s, 
-                           markup_percentage = %s
-                           WHERE item_code = %s""",
-                        (
-                            category, name, description,
-                            base_cost, tax_rate, labor_minutes,
-                            markup_percentage, item_code
-                        )
-                    )
-                else:
-                    # Insert new item
-                    cursor.execute(
-                        """INSERT INTO PriceList 
-                           (category, item_code, name, description, 
-                            base_cost, tax_rate, labor_minutes, markup_percentage) 
-                           VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
-                        (
-                            category, item_code, name, description,
-                            base_cost, tax_rate, labor_minutes, markup_percentage
-                        )
-                    )
-                    items_added += 1
                 
-                conn.commit()
-                print(f"Processed: {item_code} - {name}")
+                price_items[item_code] = (
+                    category, item_code, name, description,
+                    base_cost, tax_rate, labor_minutes, markup_percentage
+                )
+                if not args.sync:
+                    print(f"Processed: {item_code} - {name}")
                 
             except Exception as e:
                 print(f"Error processing row {index}: {e}")
                 errors += 1
         
+        failed_codes = set()
+        
+        def report_error(row, err):
+            print(f"Error writing item {row[1]}: {err}")
+            failed_codes.add(code_key(row[1]))
+        
+        def report_update_error(row, err):
+            print(f"Error updating item {row[-1]}: {err}")
+            failed_codes.add(code_key(row[-1]))
+        
+        items_deactivated = 0
+        items_unchanged = 0
+        deactivated_codes = []
+        if args.sync:
+            # Compare row hashes with the table and write only the differences
+            source_rows = {code: row[:1] + row[2:] for code, row in price_items.items()}
+            plan = plan_sync(source_rows, current_rows, PRICE_LIST_COLUMNS, deactivatable=owned_codes)
+            print()
+            plan.print()
+            if args.plan:
+                print("\nPlan only; nothing was written.")
+                metrics.set_counts(len(price_df), to_add=len(plan.inserts), to_update=len(plan.updates),
+                                   to_deactivate=len(plan.deactivations), unchanged=plan.unchanged)
+                metrics.finish()
+                return
+            
+            write_in_batches(cursor, PRICE_LIST_UPSERT_SQL, [price_items[code] for code in plan.inserts],
+                             args.batch_size, report_error)
+            write_in_batches(cursor, PRICE_LIST_UPDATE_SQL,
+                             [source_rows[code] + (plan.table_key(code),) for code, changes in plan.updates],
+                             args.batch_size, report_update_error)
+            items_deactivated = write_in_batches(cursor, PRICE_LIST_DEACTIVATE_SQL,
+                                                 [(code,) for code in plan.deactivations], args.batch_size)
+            items_unchanged = plan.unchanged
+            deactivated_codes = plan.deactivations
+            written_codes = set(plan.inserts) | {code for code, changes in plan.updates}
+        else:
+            # Write every item in batches and commit once, so row locks are held only for the write
+            print(f"\nWriting {len(price_items)} items in batches of {args.batch_size}...")
+            write_in_batches(cursor, PRICE_LIST_UPSERT_SQL, list(price_items.values()), args.batch_size, report_error)
+            written_codes = set(price_items)
+        
+        # Every code on the sheet now belongs to this import, until it is deactivated;
+        # recorded in the same transaction as the rows
+        write_in_batches(cursor, PRICE_LIST_FORGET_SQL, [(code,) for code in deactivated_codes], args.batch_size)
+        write_in_batches(cursor, PRICE_LIST_IMPORT_SQL,
+                         [(code,) for code in price_items if code_key(code) not in failed_codes], args.batch_size)
+        conn.commit()
+        
+        written_codes = {code_key(item_code) for item_code in written_codes} - failed_codes
+        items_added = len(written_codes - existing_codes)
+        items_updated = len(written_codes & existing_codes)
+        errors += len(failed_codes)
+        
         print("\nMigration Summary:")
         print(f"Price list items added: {items_added}")
+        print(f"Price list items updated: {items_updated}")
+        if args.sync:
+            print(f"Price list items deactivated: {items_deactivated}")
+            print(f"Price list items unchanged: {items_unchanged}")
         print(f"Errors encountered: {errors}")
+        if sheet_cache:
+            print(f"Sheet cache: {sheet_cache.hits} hits, {sheet_cache.misses} misses")
         print("Migration completed!")
         
-    except mysql.connector.Error as err:
+        metrics.set_counts(len(price_df), items_added=items_added, items_updated=items_updated,
+                           items_deactivated=items_deactivated, errors=errors)
+        metrics.finish()
+        
+    except DatabaseError as err:
         print(f"Database error: {err}")
+        if 'conn' in locals():
+            conn.rollback()
         sys.exit(1)
     except Exception as e:
         print(f"Error: {e}")
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# price_sync.py
+# Diff a price file against PriceList/Materials by row hash so a sync writes only what changed
+
+from decimal import Decimal, InvalidOperation
+import hashlib
+
+from price_history import code_key
+
+# Compared columns and the number of decimal places the table stores (None for text)
+PRICE_LIST_COLUMNS = [('category', None), ('name', None), ('description', None), ('base_cost', 2),
+                      ('tax_rate', 3), ('labor_minutes', 0), ('markup_percentage', 2)]
+MATERIAL_COLUMNS = [('name', None), ('category', None), ('unit_of_measure', None), ('current_price', 2)]
+
+def normalize(value, scale=None):
+    """A value as text the way the table stores it: stripped text, or a number rounded to scale places"""
+    if value is None or (isinstance(value, float) and value != value):
+        return ''
+    if scale is None:
+        return str(value).strip()
+    try:
+        return str(Decimal(str(value)).quantize(Decimal(1).scaleb(-scale)))
+    except InvalidOperation:
+        return str(value).strip()
+
+def row_hash(values, columns):
+    """SHA-1 of a row's normalized values, in the order of columns"""
+    normalized = '\x1f'.join(normalize(value, scale) for value, (column, scale) in zip(values, columns))
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+def load_current_rows(cursor, table, key_column, columns, where=None):
+    """Return {key: (values, is_active)} for the rows of table, values in the order of columns"""
+    sql = f"SELECT {key_column}, {', '.join(column for column, scale in columns)}, is_active FROM {table}"
+    if where:
+        sql += f" WHERE {where}"
+    cursor.execute(sql)
+    return {row[0]: (tuple(row[1:-1]), bool(row[-1])) for row in cursor.fetchall()}
+
+class SyncPlan:
+    """The inserts, updates and deactivations that bring a table in line with the source"""
+    
+    def __init__(self):
+        self.inserts = []  # keys
+        self.updates = []  # (key, [(column, old, new)]); no changed columns means a reactivation
+        self.deactivations = []  # keys as the table spells them
+        self.table_keys = {}  # source key -> the table's spelling of it, where the two differ
+        self.unchanged = 0
+    
+    def table_key(self, key):
+        """The key to use in an UPDATE's WHERE clause for a source key"""
+        return self.table_keys.get(key, key)
+    
+    def has_changes(self):
+        return bool(self.inserts or self.updates or self.deactivations)
+    
+    def print(self, limit=20):
+        """Print the counts and up to limit keys of each kind of change"""
+        print(f"Sync plan: {len(self.inserts)} to add, {len(self.updates)} to update, "
+              f"{len(self.deactivations)} to deactivate, {self.unchanged} unchanged")
+        for key in self.inserts[:limit]:
+            print(f"  + {key}")
+        for key, changes in self.updates[:limit]:
+            described = ', '.join(f"{column} {old or '-'} -> {new or '-'}" for column, old, new in changes)
+            print(f"  ~ {key}: {described or 'reactivate'}")
+        for key in self.deactivations[:limit]:
+            print(f"  - {key}")
+        hidden = sum(max(0, len(keys) - limit) for keys in (self.inserts, self.updates, self.deactivations))
+        if hidden:
+            print(f"  ... and {hidden} more")
+
+def plan_sync(source_rows, current_rows, columns, deactivatable=None):
+    """Compare source rows ({key: values}) with load_current_rows() output and return a SyncPlan.
+    
+    Keys are matched with code_key(), the way MySQL's unique index compares
+    them, so 'abc' on the sheet updates an existing 'ABC' instead of
+    inserting a duplicate. A row is updated when its hash differs or it is
+    inactive. Active rows missing from the source are deactivated; pass
+    deactivatable (a set of keys) to limit that to rows the source owns. An
+    empty source deactivates nothing, so a misread sheet can't switch off
+    the whole table.
+    """
+    plan = SyncPlan()
+    current_keys = {code_key(key): key for key in current_rows}
+    source_keys = {code_key(key): key for key in source_rows}  # Keys differing only in case: the last one wins
+    for key in source_keys.values():
+        values = source_rows[key]
+        table_key = current_keys.get(code_key(key))
+        if table_key is None:
+            plan.inserts.append(key)
+            continue
+        if table_key != key:
+            plan.table_keys[key] = table_key
+        current = current_rows[table_key]
+        current_values, is_active = current
+        if is_active and row_hash(values, columns) == row_hash(current_values, columns):
+            plan.unchanged += 1
+            continue
+        changes = []
+        for (column, scale), old, new in zip(columns, current_values, values):
+            old, new = normalize(old, scale), normalize(new, scale)
+            if old != new:
+                changes.append((column, old, new))
+        plan.updates.append((key, changes))
+    
+    if not source_rows:
+        return plan
+    if deactivatable is not None:
+        deactivatable = {code_key(key) for key in deactivatable}
+    for key, (values, is_active) in current_rows.items():
+        if is_active and code_key(key) not in source_keys and (deactivatable is None or code_key(key) in deactivatable):
+            plan.deactivations.append(key)
+    return plan
@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+# sheet_cache.py
+# Local cache of parsed workbook sheets, keyed by file content hash, so re-runs skip the .xlsx parsing
+
+from datetime import date, datetime, time, timedelta
+import argparse
+import hashlib
+import json
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+# Per user, so nobody else can change the values an import reads
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+    'electrical-contractor-system', 'sheets'
+)
+DEFAULT_CACHE_MB = 500
+
+CACHE_SUFFIX = '.npz'
+OLD_CACHE_SUFFIXES = ('.pkl', '.jsonl')  # Earlier pickle and JSON lines entries; never loaded, only evicted and cleared
+
+# Streamed rows are stored in groups of this many, so neither writing nor replaying a sheet holds all of it
+GROUP_ROWS = 10000
+
+# Cell types a column holding only one of them is stored as a plain array of, with the numpy dtype used
+CELL_DTYPES = {str: np.str_, int: np.int64, float: np.float64, bool: np.bool_, datetime: 'datetime64[us]'}
+
+# Mask codes for the cells of such a column
+VALUE, NAN, NONE, INTEGER = 0, 1, 2, 3
+
+# Largest integer a float64 holds exactly
+EXACT_FLOAT_INTEGER = 2 ** 53
+
+_NUMBER = object()  # _cell_type() of a column mixing ints and floats
+
+def encode_value(value):
+    """A cell value as JSON: plain JSON for None, bools, numbers and text, a tagged object otherwise"""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if value is pd.NaT:
+        return {'nat': None}
+    if isinstance(value, pd.Timestamp):
+        return {'timestamp': value.isoformat()}
+    if isinstance(value, datetime):
+        return {'datetime': value.isoformat()}
+    if isinstance(value, date):
+        return {'date': value.isoformat()}
+    if isinstance(value, time):
+        return {'time': value.isoformat()}
+    if isinstance(value, timedelta):
+        return {'timedelta': pd.Timedelta(value).value}
+    raise TypeError(f"Can't cache a {type(value).__name__} value")
+
+def decode_value(value):
+    """Reverse encode_value()"""
+    if not isinstance(value, dict):
+        return value
+    (tag, encoded), = value.items()
+    if tag == 'nat':
+        return pd.NaT
+    if tag == 'timestamp':
+        return pd.Timestamp(encoded)
+    if tag == 'datetime':
+        return datetime.fromisoformat(encoded)
+    if tag == 'date':
+        return date.fromisoformat(encoded)
+    if tag == 'time':
+        return time.fromisoformat(encoded)
+    if tag == 'timedelta':
+        return pd.Timedelta(encoded)
+    raise ValueError(f"Unknown cached value type {tag!r}")
+
+def encode_cells(values):
+    """A list of cell values as (meta, arrays) for the cache file.
+    
+    Cells that are all one of the CELL_DTYPES types (ints and floats may
+    mix), apart from empty ones, become one typed array, plus a mask of
+    VALUE/NAN/NONE/INTEGER codes when any cell needs one. Anything else,
+    and text whose longest cell would make a fixed-width array much larger
+    than the text itself, is stored as a single JSON list of
+    encode_value() cells.
+    """
+    codes = [NONE if value is None else NAN if type(value) is float and value != value else VALUE for value in values]
+    masked = any(codes)
+    present = [value for value, code in zip(values, codes) if code == VALUE] if masked else values
+    cell_type = _cell_type(present)
+    if cell_type is _NUMBER:  # Ints and floats mixed: stored as floats, with the ints marked
+        codes = [INTEGER if type(value) is int else code for value, code in zip(values, codes)]
+        cell_type, masked = float, True
+    if cell_type is not None:
+        if masked:
+            filler = {str: '', int: 0, float: 0.0, bool: False, datetime: None}[cell_type]
+            cells = [value if code == VALUE or code == INTEGER else filler for value, code in zip(values, codes)]
+        else:
+            cells = values
+        try:
+            if cell_type is datetime:
+                cells = pd.DatetimeIndex(cells).as_unit('us').to_numpy()  # Much faster than numpy's own conversion
+            else:
+                cells = np.array(cells, dtype=CELL_DTYPES[cell_type])
+        except (OverflowError, ValueError):
+            pass  # An int beyond int64 or a date beyond datetime64
+        else:
+            meta = {'kind': 'cells', 'type': cell_type.__name__, 'masked': masked}
+            if not masked:
+                return meta, {'cells': cells}
+            return meta, {'cells': cells, 'mask': np.array(codes, dtype=np.uint8)}
+    
+    encoded = [encode_value(value) for value in values]
+    return ({'kind': 'json', 'tagged': any(isinstance(value, dict) for value in encoded)},
+            {'json': np.frombuffer(json.dumps(encoded).encode('utf-8'), dtype=np.uint8)})
+
+def _cell_type(present):
+    """The CELL_DTYPES type the non-empty cells can be stored as, or None to use JSON"""
+    types = set(map(type, present))
+    if not types:
+        return float
+    if types == {int, float}:
+        return _NUMBER if all(abs(value) < EXACT_FLOAT_INTEGER for value in present if type(value) is int) else None
+    if len(types) > 1:
+        return None
+    cell_type = types.pop()
+    if cell_type is str:
+        lengths = [len(value) for value in present]
+        if max(lengths) * len(lengths) > 2 * sum(lengths) + 4096 or any(value.endswith('\0') for value in present):
+            return None  # Mostly padding, or a trailing NUL numpy would drop
+    if cell_type is datetime and any(value.tzinfo is not None for value in present):
+        return None
+    return cell_type if cell_type in CELL_DTYPES else None
+
+def decode_cells(meta, arrays):
+    """Reverse encode_cells(), returning a list of cell values"""
+    if meta['kind'] == 'json':
+        values = json.loads(bytes(arrays['json']).decode('utf-8'))
+        return [decode_value(value) for value in values] if meta['tagged'] else values
+    
+    values = arrays['cells'].tolist()
+    if not meta['masked']:
+        return values
+    mask = arrays['mask']
+    for position in np.flatnonzero(mask).tolist():
+        code = mask[position]
+        values[position] = int(values[position]) if code == INTEGER else float('nan') if code == NAN else None
+    return values
+
+def encode_column(column):
+    """A DataFrame column as (meta, arrays): plain numpy dtypes as they are, anything else through encode_cells()"""
+    if isinstance(column.dtype, np.dtype) and column.dtype.kind in 'biufcmM':
+        return {'kind': 'array'}, {'array': column.to_numpy()}
+    return encode_cells(column.tolist())
+
+def decode_column(meta, arrays):
+    """Reverse encode_column(), returning an array or a list"""
+    if meta['kind'] == 'array':
+        return arrays['array']
+    return decode_cells(meta, arrays)
+
+def add_cache_arguments(parser):
+    """Add the --sheet-cache, --cache-dir and --cache-max-mb options shared by the migration scripts"""
+    parser.add_argument("--sheet-cache", action="store_true",
+                        help="Reuse parsed sheets from the local cache when the workbook is unchanged")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help=f"Directory for the sheet cache (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_CACHE_MB,
+                        help=f"Size cap for the sheet cache; least recently used sheets are evicted "
+                             f"(default: {DEFAULT_CACHE_MB})")
+
+def cache_from_args(args):
+    """The SheetCache the options ask for, or None if --sheet-cache wasn't given"""
+    if not getattr(args, 'sheet_cache', False):
+        return None
+    return SheetCache(args.cache_dir, int(args.cache_max_mb * 1024 * 1024))
+
+class SheetCache:
+    """Parsed sheets stored column by column, one .npz file per (workbook content, sheet, reader).
+    
+    The key is the workbook's SHA-256 plus the sheet name and a variant
+    naming how it was read (header row, record fields), so an edited
+    workbook or a different reader never sees a stale entry. Each column of
+    a group of rows is a .npy array (see encode_column), and a JSON header
+    holds the column labels, dtypes and how each column was stored. Files
+    are written and loaded with allow_pickle=False, so entries are data
+    only: loading one can't run code, the way unpickling can. Anyone who
+    can write the directory can still change the values an import reads,
+    so keep it private to the user running the imports (the default is
+    under the user's cache directory).
+    
+    Each hit touches the file's mtime; when the cache grows past max_bytes
+    the entries used longest ago are deleted. Writes go through a temporary
+    file and os.replace, so worker processes can share the directory and a
+    half-written entry is never read.
+    """
+    
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+    
+    def path(self, file_hash, sheet_name, variant):
+        sheet_key = hashlib.sha1(f"{sheet_name}\0{variant}".encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.directory, f"{file_hash[:32]}_{sheet_key}{CACHE_SUFFIX}")
+    
+    def _open(self, file_hash, sheet_name, variant):
+        """(npz file, header) for a cached entry, or None on a miss"""
+        path = self.path(file_hash, sheet_name, variant)
+        try:
+            entry = np.load(path, allow_pickle=False)
+        except (OSError, ValueError, zipfile.BadZipFile):
+            self.misses += 1
+            return None
+        try:
+            header = json.loads(bytes(entry['header']).decode('utf-8'))
+            os.utime(path)  # Mark as recently used
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            entry.close()
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry, header
+    
+    def load(self, file_hash, sheet_name, variant='frame'):
+        """Return the cached DataFrame, or None if this sheet hasn't been cached"""
+        opened = self._open(file_hash, sheet_name, variant)
+        if opened is None:
+            return None
+        entry, header = opened
+        with entry:
+            groups = [
+                [decode_column(meta, _arrays(entry, f"g{number}.c{position}", meta))
+                 for position, meta in enumerate(group['columns'])]
+                for number, group in enumerate(header['groups'])
+            ]
+            index = header['index']
+            if index is None:
+                index = [value for number, group in enumerate(header['groups'])
+                         for value in decode_cells(group['index'], _arrays(entry, f"g{number}.index", group['index']))]
+            else:
+                index = pd.RangeIndex(*index)
+        
+        columns = {}
+        for position, dtype in enumerate(header['dtypes']):
+            parts = [group[position] for group in groups]
+            if all(isinstance(part, np.ndarray) for part in parts):
+                column = pd.Series(np.concatenate(parts), copy=False)
+            else:
+                column = pd.Series([value for part in parts for value in part], dtype=object)
+            columns[position] = column if str(column.dtype) == dtype else column.astype(dtype)
+        frame = pd.DataFrame(columns, index=pd.RangeIndex(sum(group['rows'] for group in header['groups'])))
+        frame.index = index
+        frame.columns = [decode_value(label) for label in header['columns']]
+        return frame
+    
+    def store(self, file_hash, sheet_name, frame, variant='frame'):
+        """Save a parsed sheet, then evict old entries if the cache is over its size cap"""
+        range_index = frame.index if isinstance(frame.index, pd.RangeIndex) else None
+        index = None if range_index is None else [range_index.start, range_index.stop, range_index.step]
+        writer = self._writer(file_hash, sheet_name, variant)
+        try:
+            header = {'columns': [encode_value(label) for label in frame.columns],
+                      'dtypes': [str(dtype) for dtype in frame.dtypes], 'index': index, 'groups': []}
+            header['groups'].append(writer.write_group(
+                0, len(frame), [frame.iloc[:, position] for position in range(len(frame.columns))],
+                None if range_index is not None else list(frame.index), encode_column
+            ))
+        except TypeError as e:
+            writer.abandon(e)
+            return
+        except BaseException:
+            writer.abandon()
+            raise
+        writer.commit(self.path(file_hash, sheet_name, variant), header)
+        self.evict()
+    
+    def load_rows(self, file_hash, sheet_name, variant):
+        """Return an iterator of (index, values) over a cached entry's rows, or None on a miss.
+        
+        Rows are decoded one group of GROUP_ROWS at a time, so replaying a
+        large sheet doesn't hold it all in memory.
+        """
+        opened = self._open(file_hash, sheet_name, variant)
+        if opened is None:
+            return None
+        return self._read_rows(*opened)
+    
+    def _read_rows(self, entry, header):
+        with entry:
+            for number, group in enumerate(header['groups']):
+                index = decode_cells(group['index'], _arrays(entry, f"g{number}.index", group['index']))
+                columns = [decode_cells(meta, _arrays(entry, f"g{number}.c{position}", meta))
+                           for position, meta in enumerate(group['columns'])]
+                for position, row_index in enumerate(index):
+                    yield row_index, [column[position] for column in columns]
+    
+    def stream_rows(self, file_hash, sheet_name, columns, dtypes, rows, variant):
+        """Pass (index, *values) rows through, writing them to the cache on the way.
+        
+        Rows are encoded column by column in groups of GROUP_ROWS, so only
+        one group is held at a time. The entry only becomes visible once
+        rows is exhausted. If the caller stops early the partial file is
+        removed; if a value can't be encoded the sheet just isn't cached and
+        the rows keep coming.
+        """
+        writer = self._writer(file_hash, sheet_name, variant)
+        header = {'columns': [], 'dtypes': dtypes, 'index': None, 'groups': []}
+        group = []
+        
+        def write_group():
+            nonlocal writer
+            try:
+                header['groups'].append(writer.write_group(
+                    len(header['groups']), len(group),
+                    [[row[position] for row in group] for position in range(1, len(columns) + 1)],
+                    [row[0] for row in group], encode_cells
+                ))
+            except TypeError as e:
+                writer = writer.abandon(e)
+            group.clear()
+        
+        try:
+            try:
+                header['columns'] = [encode_value(label) for label in columns]
+            except TypeError as e:
+                writer = writer.abandon(e)
+            for row in rows:
+                if writer is not None:
+                    group.append(row)
+                yield row
+                if len(group) >= GROUP_ROWS:
+                    write_group()
+            if writer is not None and (group or not header['groups']):
+                write_group()
+        except BaseException:
+            if writer is not None:
+                writer.abandon()
+            raise
+        if writer is not None:
+            writer.commit(self.path(file_hash, sheet_name, variant), header)
+            self.evict()
+    
+    def _writer(self, file_hash, sheet_name, variant):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        return _EntryWriter(f"{self.path(file_hash, sheet_name, variant)}.{os.getpid()}.tmp", sheet_name)
+    
+    def entries(self):
+        """(mtime, size, path) for every cached sheet, least recently used first"""
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for name in os.listdir(self.directory):
+            if not name.endswith((CACHE_SUFFIX,) + OLD_CACHE_SUFFIXES):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue  # Evicted by another process
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+    
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes; returns how many went"""
+        entries = self.entries()
+        total = sum(size for mtime, size, path in entries)
+        evicted = 0
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                evicted += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        return evicted
+    
+    def clear(self):
+        """Delete every cached sheet and return how many there were"""
+        entries = self.entries()
+        for mtime, size, path in entries:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return len(entries)
+
+class _EntryWriter:
+    """A cache entry being written to a temporary .npz file, moved into place by commit()"""
+    
+    def __init__(self, temp_path, sheet_name):
+        self.temp_path = temp_path
+        self.sheet_name = sheet_name
+        self.zip_file = zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_STORED, allowZip64=True)
+    
+    def write_array(self, name, array):
+        with self.zip_file.open(f"{name}.npy", 'w', force_zip64=True) as f:
+            np.lib.format.write_array(f, np.asanyarray(array), allow_pickle=False)
+    
+    def write_group(self, number, rows, columns, index, encode):
+        """Write one group of rows column by column and return its header entry"""
+        group = {'rows': rows, 'columns': [], 'index': None}
+        if index is not None:
+            group['index'], arrays = encode_cells(index)
+            for part, array in arrays.items():
+                self.write_array(f"g{number}.index.{part}", array)
+        for position, column in enumerate(columns):
+            meta, arrays = encode(column)
+            for part, array in arrays.items():
+                self.write_array(f"g{number}.c{position}.{part}", array)
+            group['columns'].append(meta)
+        return group
+    
+    def commit(self, path, header):
+        """Write the header and move the finished file to path"""
+        self.write_array('header', np.frombuffer(json.dumps(header).encode('utf-8'), dtype=np.uint8))
+        self.zip_file.close()
+        os.replace(self.temp_path, path)
+    
+    def abandon(self, err=None):
+        """Close and delete the partly written file, warning about err if given; returns None to stand in for it"""
+        self.zip_file.close()
+        os.remove(self.temp_path)
+        if err is not None:
+            print(f"Warning: Not caching sheet {self.sheet_name}: {err}")
+        return None
+
+def _arrays(entry, name, meta):
+    """The arrays stored for one column of a group"""
+    if meta['kind'] == 'cells':
+        parts = ['cells', 'mask'] if meta['masked'] else ['cells']
+    else:
+        parts = [meta['kind']]
+    return {part: entry[f"{name}.{part}"] for part in parts}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show or clear the parsed sheet cache")
+    parser.add_argument("command", choices=['stats', 'clear'], help="stats: show the cache size; clear: empty it")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help=f"Directory of the sheet cache (default: {DEFAULT_CACHE_DIR})")
+    args = parser.parse_args(argv)
+    
+    cache = SheetCache(args.cache_dir)
+    if args.command == 'clear':
+        print(f"Removed {cache.clear()} cached sheets from {args.cache_dir}")
+    else:
+        entries = cache.entries()
+        total = sum(size for mtime, size, path in entries)
+        print(f"{len(entries)} cached sheets, {total / (1024 * 1024):.1f} MB in {args.cache_dir}")
+
+if __name__ == "__main__":
+    main()
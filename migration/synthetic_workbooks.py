@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# synthetic_workbooks.py
+# Generate synthetic Jobs List.xlsx, ERE.xlsx, template 3.xlsx and job_sheets/*.xlsx files for benchmarking
+
+from datetime import date, timedelta
+import argparse
+import os
+import random
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+
+# Employees and vendors from the sample data in database/electrical_contractor_db.sql,
+# so generated ledger rows resolve against a freshly created schema
+EMPLOYEES = ['Erik', 'Lee', 'Carlos', 'Jake', 'Trevor', 'Ryan']
+VENDORS = ['Home Depot', 'Cooper', 'Warshauer', 'Good Friend Electric', 'Lowes']
+
+# A few vendors that are not in the sample data, so the import has some to create
+NEW_VENDORS = ['Graybar', 'CED', 'Rexel']
+
+LEDGER_STAGES = ['Demo', 'Rough', 'Service', 'Finish', 'Extra', 'Temp Service', 'Inspection']
+ESTIMATE_STAGES = ['Rough', 'Service', 'Finish', 'Extra']
+
+CITIES = [('Red Bank', '07701'), ('Holmdel', '07733'), ('Middletown', '07748'), ('Rumson', '07760')]
+STREETS = ['Main St', 'Oak Ave', 'Broad St', 'River Rd', 'Maple Ave', 'Front St']
+LAST_NAMES = ['Smith', 'Jones', 'Miller', 'Davis', 'Garcia', 'Wilson', 'Moore', 'Taylor', 'Clark', 'Lewis']
+
+ROOMS = ['Kitchen', 'Living Room', 'Dining Room', 'Master Bedroom', 'Bedroom 2', 'Bath', 'Hall', 'Garage']
+ROOM_ITEMS = [('Outlet', 18.5), ('Switch', 16.0), ('GFI', 42.0), ('3-Way Switch', 28.0),
+              ('Recessed Light', 65.0), ('Fan', 95.0), ('Smoke Detector', 55.0)]
+PERMIT_CATEGORIES = ['Receptacles', 'Switches', 'Fixtures', 'Smoke Detectors', 'Appliances', 'Service']
+
+PRICE_CATEGORIES = ['boxes', 'wire', 'receptacles', 'switches', 'lighting', 'breakers']
+
+FIRST_JOB_NUMBER = 1000
+START_DATE = date(2020, 1, 1)
+
+def job_numbers(num_jobs):
+    """Job numbers used by every generated workbook"""
+    return [FIRST_JOB_NUMBER + i for i in range(num_jobs)]
+
+def _save(workbook, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    workbook.save(path)
+    return path
+
+def write_jobs_list(path, num_jobs, rng):
+    """Write Jobs List.xlsx with one row per job; customers repeat about every other job"""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Sheet1')
+    sheet.append(['Job #', 'Customer', 'Address', 'Date'])
+    
+    num_customers = max(1, num_jobs // 2)
+    for i, job_number in enumerate(job_numbers(num_jobs)):
+        customer = f"{LAST_NAMES[i % len(LAST_NAMES)]} {rng.randrange(num_customers)}"
+        city, zip_code = rng.choice(CITIES)
+        address = f"{rng.randint(1, 999)} {rng.choice(STREETS)}, {city}, NJ {zip_code}"
+        sheet.append([job_number, customer, address, START_DATE + timedelta(days=i % 1500)])
+    
+    return _save(workbook, path)
+
+def write_ere(path, num_jobs, num_rows, rng):
+    """Write ERE.xlsx with a 'Material and Labor' sheet of num_rows ledger rows, half labor and half material"""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Material and Labor')
+    sheet.append(['Job number', 'Stage', 'Date', 'Hours', 'Employee', 'Cost',
+                  'Vendor', 'Invoice #', 'Invoice Total', 'Notes'])
+    
+    jobs = job_numbers(num_jobs)
+    vendors = VENDORS + NEW_VENDORS
+    for i in range(num_rows):
+        job_number = rng.choice(jobs)
+        stage = rng.choice(LEDGER_STAGES)
+        entry_date = START_DATE + timedelta(days=rng.randrange(1500))
+        if i % 2 == 0:
+            sheet.append([job_number, stage, entry_date, rng.choice([2, 4, 6, 8]),
+                          rng.choice(EMPLOYEES), None, None, None, None, None])
+        else:
+            cost = round(rng.uniform(5, 2500), 2)
+            sheet.append([job_number, stage, entry_date, None, None, cost, rng.choice(vendors),
+                          f"INV{i:07d}", cost, None])
+    
+    return _save(workbook, path)
+
+def write_price_list(path, num_items, num_assemblies, rng):
+    """Write template 3.xlsx with a 'Price List' sheet of materials followed by assemblies.
+    
+    The sheet serves both price list importers: price_list_migration.py reads
+    it with headers ('A', 'x', 'E', 'Name'), import_price_list_from_excel.py
+    reads it by column letter. Column D of the header row is left blank so the
+    letter-based import skips that row. Assembly formulas in column I are
+    stored as text, since openpyxl can't write the cached values a formula
+    cell would need.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Price List')
+    header = [None] * 17
+    header[0], header[2], header[4], header[16] = 'A', 'x', 'E', 'Name'
+    sheet.append(header)
+    
+    first_item_row = 2  # Excel row of the first material
+    for i in range(num_items):
+        name = f"Material {i}"
+        if i % 10 == 0:
+            name += ' per foot'
+        price = round(rng.uniform(0.1, 150), 2)
+        tax = round(price * 0.066, 2)
+        row = [None] * 17
+        row[0], row[2], row[3] = PRICE_CATEGORIES[i % len(PRICE_CATEGORIES)], f"MAT{i:05d}", name
+        row[4], row[5], row[6], row[16] = price, tax, round(price + tax, 2), name
+        sheet.append(row)
+    
+    for i in range(num_assemblies):
+        components = rng.sample(range(num_items), min(num_items, rng.randint(2, 4)))
+        terms = []
+        for position, item in enumerate(components):
+            cell = f"G{first_item_row + item}"
+            terms.append(f"({rng.randint(2, 4)}*{cell})" if position == 0 else cell)
+        formula = WriteOnlyCell(sheet, value='=' + '+'.join(terms))
+        formula.data_type = 's'
+        
+        name = f"Assembly {i}"
+        row = [None] * 17
+        row[0], row[2], row[3], row[8], row[16] = rng.choice(PRICE_CATEGORIES), f"ASM{i:04d}", name, formula, name
+        row[12], row[13], row[14], row[15] = rng.randint(10, 40), rng.randint(5, 30), 0, 0
+        sheet.append(row)
+    
+    return _save(workbook, path)
+
+def write_job_sheet(path, rng, rooms=len(ROOMS)):
+    """Write one job workbook with Estimate, Template and Permits sheets"""
+    workbook = Workbook(write_only=True)
+    
+    estimate = workbook.create_sheet('Estimate')
+    estimate.append(['Item', 'Estimated', 'Actual'])
+    estimate.append(['Square footage', rng.randrange(1200, 6000, 100), None])
+    estimate.append(['Number of floors', rng.randint(1, 3), None])
+    for stage in ESTIMATE_STAGES:
+        estimate.append([stage, rng.randint(8, 80), rng.randint(8, 80)])
+        estimate.append([f"{stage} Material", rng.randint(200, 4000), rng.randint(200, 4000)])
+    
+    template = workbook.create_sheet('Template')
+    template.append(['A', 'B', 'C', 'D', 'E'])
+    for room in ROOMS[:rooms]:
+        template.append([room, None, None, None, None])
+        for item, price in rng.sample(ROOM_ITEMS, rng.randint(3, len(ROOM_ITEMS))):
+            template.append([None, rng.randint(1, 8), item, price, None])
+    
+    permits = workbook.create_sheet('Permits')
+    permits.append(['Category', 'Qty', 'Desc'])
+    for category in PERMIT_CATEGORIES:
+        permits.append([category, rng.randint(0, 20), None])
+    
+    return _save(workbook, path)
+
+def generate_workbooks(output_dir, num_jobs=200, ledger_rows=10000, price_items=500,
+                       assemblies=50, job_sheets=None, seed=42):
+    """Write the full set of source workbooks into output_dir and return the row counts per file.
+    
+    job_sheets defaults to one workbook per job. The same seed always
+    produces the same data.
+    """
+    rng = random.Random(seed)
+    if job_sheets is None:
+        job_sheets = num_jobs
+    job_sheets = min(job_sheets, num_jobs)
+    
+    write_jobs_list(os.path.join(output_dir, 'Jobs List.xlsx'), num_jobs, rng)
+    write_ere(os.path.join(output_dir, 'ERE.xlsx'), num_jobs, ledger_rows, rng)
+    write_price_list(os.path.join(output_dir, 'template 3.xlsx'), price_items, assemblies, rng)
+    for job_number in job_numbers(num_jobs)[:job_sheets]:
+        write_job_sheet(os.path.join(output_dir, 'job_sheets', f"{job_number}.xlsx"), rng)
+    
+    return {
+        'jobs': num_jobs,
+        'ledger_rows': ledger_rows,
+        'price_items': price_items,
+        'assemblies': assemblies,
+        'job_sheets': job_sheets
+    }
+
+def add_size_arguments(parser):
+    """Add the options that control how much data is generated"""
+    parser.add_argument("--jobs", type=int, default=200, help="Rows in Jobs List.xlsx (default: 200)")
+    parser.add_argument("--ledger-rows", type=int, default=10000,
+                        help="Rows in the ERE.xlsx Material and Labor sheet (default: 10000)")
+    parser.add_argument("--price-items", type=int, default=500,
+                        help="Materials in the template 3.xlsx Price List (default: 500)")
+    parser.add_argument("--assemblies", type=int, default=50,
+                        help="Assemblies in the template 3.xlsx Price List (default: 50)")
+    parser.add_argument("--job-sheets", type=int, default=None,
+                        help="Number of job_sheets/*.xlsx workbooks (default: one per job)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic source workbooks for the migration scripts")
+    parser.add_argument("output_dir", help="Directory to write the workbooks to")
+    add_size_arguments(parser)
+    args = parser.parse_args(argv)
+    
+    print(f"Writing synthetic workbooks to {args.output_dir}...")
+    sizes = generate_workbooks(args.output_dir, args.jobs, args.ledger_rows, args.price_items,
+                               args.assemblies, args.job_sheets, args.seed)
+    for name, count in sizes.items():
+        print(f"{name.replace('_', ' ').capitalize()}: {count}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# test_assembly_costs.py
+# Assembly cost rollup: full computation, and incremental re-pricing of only the affected assemblies
+
+from decimal import Decimal
+
+import import_price_list_from_excel
+from assembly_costs import AssemblyCostRollup, ensure_rollup_tables, reprice_changed, rollup_all
+
+def stored_costs(cursor):
+    cursor.execute("SELECT assembly_id, material_cost, unpriced_components FROM AssemblyCosts")
+    return {assembly_id: (Decimal(str(cost)).quantize(Decimal('0.01')), unpriced)
+            for assembly_id, cost, unpriced in cursor.fetchall()}
+
+def expected_costs(cursor):
+    """Each assembly's cost worked out in SQL, independently of the rollup"""
+    cursor.execute("""SELECT c.assembly_id, SUM(c.quantity * m.current_price)
+                      FROM AssemblyComponents c JOIN Materials m ON m.material_id = c.material_id
+                      GROUP BY c.assembly_id""")
+    return {assembly_id: (Decimal(str(total)).quantize(Decimal('0.01')), 0) for assembly_id, total in cursor.fetchall()}
+
+def change_price(cursor, material_id, price):
+    cursor.execute("UPDATE Materials SET current_price = %s WHERE material_id = %s", (price, material_id))
+    cursor.execute("""INSERT INTO MaterialPriceHistory (material_id, price, effective_date, created_by)
+                      VALUES (%s, %s, CURDATE(), 'Test')""", (material_id, price))
+
+def test_import_rolls_up_every_assembly(workbooks, database_argv, conn):
+    import_price_list_from_excel.main(database_argv)
+    
+    cursor = conn.cursor()
+    costs = stored_costs(cursor)
+    assert len(costs) == 6
+    assert costs == expected_costs(cursor)
+
+def test_price_change_reprices_only_affected_assemblies(workbooks, database_argv, conn, monkeypatch):
+    import_price_list_from_excel.main(database_argv)
+    cursor = conn.cursor()
+    cursor.execute("SELECT assembly_id, material_id FROM AssemblyComponents ORDER BY assembly_id")
+    assembly_id, material_id = cursor.fetchone()
+    cursor.execute("SELECT DISTINCT assembly_id FROM AssemblyComponents WHERE material_id = %s", (material_id,))
+    affected = {row[0] for row in cursor.fetchall()}
+    change_price(cursor, material_id, 999.99)
+    
+    loaded = []
+    load = AssemblyCostRollup.load
+    
+    def recording_load(cursor, assembly_ids=None):
+        loaded.append(assembly_ids)
+        return load(cursor, assembly_ids)
+    
+    monkeypatch.setattr(AssemblyCostRollup, 'load', recording_load)
+    assert reprice_changed(cursor) == (1, len(affected))
+    
+    assert loaded == [affected]
+    assert stored_costs(cursor) == expected_costs(cursor)
+    assert reprice_changed(cursor) == (0, 0)  # Nothing new since the checkpoint
+
+def test_new_assembly_is_priced_and_missing_material_counted(conn):
+    cursor = conn.cursor()
+    ensure_rollup_tables(cursor)
+    cursor.execute("""INSERT INTO Materials (material_code, name, category, current_price)
+                      VALUES ('M1', 'Box', 'boxes', 2.50)""")
+    material_id = cursor.lastrowid
+    rollup_all(cursor)
+    
+    cursor.execute("""INSERT INTO AssemblyTemplates (assembly_code, name, category, is_active, created_by)
+                      VALUES ('A1', 'Outlet', 'Electrical', TRUE, 'Test')""")
+    assembly_id = cursor.lastrowid
+    cursor.execute("INSERT INTO AssemblyComponents (assembly_id, material_id, quantity) VALUES (%s, %s, 2)",
+                   (assembly_id, material_id))
+    assert reprice_changed(cursor) == (0, 1)
+    assert stored_costs(cursor) == {assembly_id: (Decimal('5.00'), 0)}
+    
+    rollup = AssemblyCostRollup({}, {assembly_id: [(material_id, Decimal('2'))]})
+    assert rollup.cost(assembly_id) == (Decimal('0.00'), 1)
+
+def test_first_reprice_needs_a_full_rollup(conn):
+    cursor = conn.cursor()
+    ensure_rollup_tables(cursor)
+    assert reprice_changed(cursor) is None
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# test_batch_writer.py
+# Batched writes: retrying a failed batch row by row without writing any row twice, replace-set swaps,
+# and bulk loads that fall back to inserts
+
+from datetime import date, datetime
+import os
+import sqlite3
+
+import pytest
+
+from batch_writer import BulkFileLoader, replace_rows, server_allows_local_infile, write_in_batches
+from db_backend import DatabaseError
+
+INSERT_SQL = "INSERT INTO Items (code, qty) VALUES (%s, %s)"
+SPEC_INSERT_SQL = "INSERT INTO Specs (job_id, item) VALUES (%s, %s)"
+NOTE_INSERT_SQL = "INSERT INTO Notes (id, body, day) VALUES (%s, %s, %s)"
+
+# Values LOAD DATA's escaping has to carry through the spool file unchanged
+AWKWARD_NOTES = [
+    (1, 'tab\there', '2024-01-02'),
+    (2, 'two\nlines\r\n', '2024-01-03'),
+    (3, 'back\\slash \\N and \\t', None),
+    (4, '\\N', '2024-01-05'),
+    (5, None, '2024-01-06'),
+    (6, 'nul\0 and ünïcode', '2024-01-07'),
+]
+
+class InfileRefused(sqlite3.OperationalError):
+    """A database error carrying a MySQL errno, as mysql.connector raises"""
+    
+    def __init__(self, errno):
+        super().__init__(f"error {errno}")
+        self.errno = errno
+
+class RefusingCursor:
+    """Cursor that fails LOAD DATA with a chosen errno and passes everything else through"""
+    
+    def __init__(self, cursor, errno):
+        self.cursor = cursor
+        self.errno = errno
+        self.load_attempts = 0
+    
+    def execute(self, sql, params=()):
+        if sql.startswith('LOAD DATA'):
+            self.load_attempts += 1
+            raise InfileRefused(self.errno)
+        return self.cursor.execute(sql, params)
+    
+    def executemany(self, sql, rows):
+        return self.cursor.executemany(sql, rows)
+
+@pytest.fixture
+def cursor(conn):
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE Items (code VARCHAR(10) NOT NULL PRIMARY KEY, qty INT NOT NULL)")
+    conn.commit()
+    return cursor
+
+@pytest.fixture
+def specs_cursor(conn):
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE Specs (job_id INT NOT NULL, item VARCHAR(20) NOT NULL)")
+    cursor.executemany(SPEC_INSERT_SQL, [(1, 'Old outlet'), (1, 'Old switch'), (2, 'Other job')])
+    conn.commit()
+    return cursor
+
+@pytest.fixture
+def notes_cursor(conn):
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE Notes (id INT NOT NULL PRIMARY KEY, body TEXT NULL, day DATE NULL)")
+    conn.commit()
+    return cursor
+
+def specs(cursor):
+    cursor.execute("SELECT job_id, item FROM Specs ORDER BY job_id, item")
+    return cursor.fetchall()
+
+def notes(cursor):
+    cursor.execute("SELECT id, body, day FROM Notes ORDER BY id")
+    return cursor.fetchall()
+
+def items(cursor):
+    cursor.execute("SELECT code, qty FROM Items ORDER BY code")
+    return cursor.fetchall()
+
+def test_failed_batch_is_retried_without_duplicates(conn, cursor):
+    rows = [('A', 1), ('B', 2), ('A', 3), ('C', 4), ('D', None), ('E', 5)]
+    failed = []
+    
+    written = write_in_batches(cursor, INSERT_SQL, rows, batch_size=4,
+                               on_row_error=lambda row, err: failed.append(row))
+    
+    assert written == 4
+    assert failed == [('A', 3), ('D', None)]
+    assert items(cursor) == [('A', 1), ('B', 2), ('C', 4), ('E', 5)]
+    conn.rollback()  # The savepoints committed nothing
+    assert items(cursor) == []
+
+def test_failed_batch_raises_without_a_handler(cursor):
+    with pytest.raises(DatabaseError):
+        write_in_batches(cursor, INSERT_SQL, [('A', 1), ('A', 2)])
+
+def test_batches_inside_an_open_transaction(conn, cursor):
+    cursor.execute(INSERT_SQL, ('Z', 9))
+    
+    write_in_batches(cursor, INSERT_SQL, [('A', 1), ('Z', 2)], on_row_error=lambda row, err: None)
+    conn.rollback()
+    
+    assert items(cursor) == []
+
+def test_replace_rows_swaps_only_the_keyed_set(conn, specs_cursor):
+    written = replace_rows(specs_cursor, 'Specs', 'job_id', 1, SPEC_INSERT_SQL,
+                           [(1, 'Fan'), (1, 'Light'), (1, 'Outlet')], batch_size=2)
+    conn.commit()
+    
+    assert written == 3
+    assert specs(specs_cursor) == [(1, 'Fan'), (1, 'Light'), (1, 'Outlet'), (2, 'Other job')]
+
+def test_failed_replace_rolls_back_to_the_old_set(conn, specs_cursor):
+    with pytest.raises(DatabaseError):
+        # The first batch is written before the second one fails
+        replace_rows(specs_cursor, 'Specs', 'job_id', 1, SPEC_INSERT_SQL, [(1, 'Fan'), (1, 'Light'), (1, None)],
+                     batch_size=2)
+    conn.rollback()
+    
+    assert specs(specs_cursor) == [(1, 'Old outlet'), (1, 'Old switch'), (2, 'Other job')]
+
+def test_bulk_load_on_sqlite_falls_back_to_inserts(notes_cursor, capsys):
+    loader = BulkFileLoader(notes_cursor, 'Notes', ['id', 'body', 'day'], NOTE_INSERT_SQL, batch_size=4)
+    try:
+        for note in AWKWARD_NOTES:
+            loader.add(note)
+        
+        assert loader.flush() == 6
+        assert notes(notes_cursor) == AWKWARD_NOTES
+        assert (loader.rows_loaded, loader.rows_inserted, loader.batches_written) == (0, 6, 2)
+        assert "LOAD DATA LOCAL INFILE is disabled" in capsys.readouterr().out
+        
+        loader.add((7, 'later', date(2024, 2, 1)))
+        assert loader.flush() == 1
+        assert notes(notes_cursor)[-1] == (7, 'later', '2024-02-01')
+        assert "disabled" not in capsys.readouterr().out  # Fell back once, not on every flush
+    finally:
+        loader.close()
+    assert not os.path.exists(loader.file.name)
+
+@pytest.mark.parametrize('errno', [1148, 2068, 3948])
+def test_refused_local_infile_falls_back_to_inserts(notes_cursor, errno):
+    cursor = RefusingCursor(notes_cursor, errno)
+    loader = BulkFileLoader(cursor, 'Notes', ['id', 'body', 'day'], NOTE_INSERT_SQL)
+    try:
+        for note in AWKWARD_NOTES[:3]:
+            loader.add(note)
+        loader.flush()
+        loader.add(AWKWARD_NOTES[3])
+        loader.flush()
+    finally:
+        loader.close()
+    
+    assert cursor.load_attempts == 1
+    assert notes(notes_cursor) == AWKWARD_NOTES[:4]
+
+def test_other_load_errors_are_raised(notes_cursor):
+    loader = BulkFileLoader(RefusingCursor(notes_cursor, 1045), 'Notes', ['id', 'body', 'day'], NOTE_INSERT_SQL)
+    loader.add(AWKWARD_NOTES[0])
+    try:
+        with pytest.raises(DatabaseError):
+            loader.flush()
+    finally:
+        loader.close()
+    
+    assert notes(notes_cursor) == []
+    assert not os.path.exists(loader.file.name)
+
+def test_spool_file_uses_load_data_escaping(notes_cursor):
+    loader = BulkFileLoader(notes_cursor, 'Notes', ['id', 'body', 'day'], NOTE_INSERT_SQL)
+    try:
+        loader.add((1, 'a\tb\\c', None))
+        loader.add((2, True, datetime(2024, 1, 2, 3, 4, 5)))
+        loader.file.flush()
+        
+        with open(loader.file.name, encoding='utf-8', newline='') as f:
+            assert f.read() == '1\ta\\tb\\\\c\t\\N\n2\t1\t2024-01-02 03:04:05\n'
+    finally:
+        loader.close()
+
+def test_sqlite_has_no_local_infile(notes_cursor):
+    assert not server_allows_local_infile(notes_cursor)
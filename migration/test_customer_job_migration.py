@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# test_customer_job_migration.py
+# Customer and job import: preloaded lookups, case-insensitive customer matching and duplicate rows
+
+from datetime import datetime
+
+from openpyxl import Workbook
+import pytest
+
+import customer_job_migration
+from db_backend import connect
+
+JOB_ROWS = [
+    ('J1', 'ACME ELECTRIC', '1 Main St, Red Bank, NJ 07701'),
+    ('J2', 'Baker Homes', '2 Oak Ave, Holmdel, NY 07733'),
+    ('J3', 'baker homes', ''),
+    ('J2', 'Baker Homes', '2 Oak Ave, Holmdel, NY 07733'),
+    ('J-OLD', 'Acme Electric', None),
+    (None, 'Nobody', None),
+    ('J4', None, '4 Elm St'),
+    ('J5', 'Cole', 'Only a street'),
+]
+
+@pytest.fixture
+def jobs_list(tmp_path, monkeypatch):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['Job #', 'Customer', 'Address', 'Date'])
+    for job_number, customer, address in JOB_ROWS:
+        sheet.append([job_number, customer, address, datetime(2024, 5, 1)])
+    workbook.save(tmp_path / 'Jobs List.xlsx')
+    monkeypatch.chdir(tmp_path)
+
+@pytest.fixture
+def existing(conn):
+    """Two customers named Acme Electric (the oldest one wins) and a job already imported"""
+    cursor = conn.cursor()
+    cursor.executemany("INSERT INTO Customers (name) VALUES (%s)", [('Acme Electric',), ('acme electric',)])
+    cursor.execute("""INSERT INTO Jobs (job_number, customer_id, job_name, status, create_date)
+                      VALUES ('J-OLD', 1, 'Acme Electric', 'Complete', '2020-01-01')""")
+    conn.commit()
+
+@pytest.fixture
+def statements(monkeypatch):
+    """SQL statements the import runs, as SQLite sees them"""
+    executed = []
+    
+    def traced_connect(*args, **kwargs):
+        connection = connect(*args, **kwargs)
+        connection.conn.set_trace_callback(executed.append)
+        return connection
+    
+    monkeypatch.setattr(customer_job_migration, 'connect', traced_connect)
+    return executed
+
+def rows(conn, sql):
+    cursor = conn.cursor()
+    cursor.execute(sql)
+    return cursor.fetchall()
+
+def test_new_customers_and_jobs_are_added_once(jobs_list, existing, database_argv, conn, capsys):
+    customer_job_migration.main(database_argv)
+    
+    assert rows(conn, "SELECT customer_id, name, address, city, state, zip FROM Customers ORDER BY customer_id") == [
+        (1, 'Acme Electric', None, None, None, None),
+        (2, 'acme electric', None, None, None, None),
+        (3, 'Baker Homes', '2 Oak Ave', 'Holmdel', 'NY', '07733'),
+        (4, 'Cole', 'Only a street', '', 'NJ', ''),
+    ]
+    assert rows(conn, "SELECT job_number, customer_id, job_name, city FROM Jobs ORDER BY job_number") == [
+        ('J-OLD', 1, 'Acme Electric', None),
+        ('J1', 1, 'ACME ELECTRIC', 'Red Bank'),
+        ('J2', 3, 'Baker Homes', 'Holmdel'),
+        ('J3', 3, 'baker homes', ''),
+        ('J5', 4, 'Cole', ''),
+    ]
+    output = capsys.readouterr().out
+    assert "Customers added: 2" in output
+    assert "Jobs added: 4" in output
+    assert output.count("Skipping row") == 2
+
+def test_rerun_adds_nothing(jobs_list, existing, database_argv, conn, capsys):
+    customer_job_migration.main(database_argv)
+    capsys.readouterr()
+    
+    customer_job_migration.main(database_argv)
+    
+    output = capsys.readouterr().out
+    assert "Customers added: 0" in output
+    assert "Jobs added: 0" in output
+    assert rows(conn, "SELECT COUNT(*) FROM Jobs") == [(5,)]
+
+def test_lookups_are_not_run_per_row(workbooks, database_argv, statements):
+    customer_job_migration.main(database_argv)
+    
+    lookups = [sql for sql in statements if sql.lstrip().upper().startswith('SELECT')]
+    # The customer map before and after the new customers are written, and the job numbers
+    assert len(lookups) == 3
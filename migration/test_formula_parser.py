@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# test_formula_parser.py
+# Assembly formulas: combined references, ranges, negative terms, skipped functions and rejected syntax
+
+import pytest
+
+from formula_parser import FormulaError, formula_components
+
+@pytest.mark.parametrize('formula, components', [
+    ('=G10+(2*G11)+G10', ((10, 2), (11, 2))),
+    ('=$G$7*3', ((7, 3),)),
+    ('=SUM(G3:G5)+G4', ((3, 1), (4, 2), (5, 1))),
+    ('=SUM(G5:G3)/2', ((3, 0.5), (4, 0.5), (5, 0.5))),
+    ('=SUM()+G2', ((2, 1),)),
+    ('=G2+F2', ((2, 1),)),
+    ('=-G3+2*G3', ((3, 1),)),
+    ('=G10-G12+2*G12', ((10, 1), (12, 1))),
+])
+def test_components(formula, components):
+    assert formula_components(formula) == (components, ())
+
+def test_negative_terms_are_left_out():
+    components, warnings = formula_components('=G10-G12')
+    
+    assert components == ((10, 1),)
+    assert warnings == ('left out G12, which has a negative quantity (-1)',)
+
+@pytest.mark.parametrize('formula, function, components', [
+    ('=ROUND(G3*2,0)+G4', 'ROUND', ((4, 1),)),
+    ('=IF(G3>0,"x",G4)+G5', 'IF', ((5, 1),)),
+    ('=SUM(G2,MAX(G3,(G4)))', 'MAX', ((2, 1),)),
+])
+def test_other_functions_are_skipped(formula, function, components):
+    assert formula_components(formula) == (components, (f"skipped unsupported function {function}()",))
+
+@pytest.mark.parametrize('formula', ['', '12', 'G3+G4', None])
+def test_values_that_are_not_formulas(formula):
+    assert formula_components(formula) == ((), ())
+
+@pytest.mark.parametrize('formula, message', [
+    ('=G3:H4', "spans columns"),
+    ('=G3*G4', "product of two cell references"),
+    ('=G3/G4', "division by a cell reference"),
+    ('=G3/0', "division by zero"),
+    ('=G2#', "unexpected character '#'"),
+    ('=(G2+G3', r"expected \) but found end of formula"),
+    ('=G2 G3', "unexpected"),
+])
+def test_unsupported_syntax_is_rejected(formula, message):
+    with pytest.raises(FormulaError, match=message):
+        formula_components(formula)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# test_import_price_list_from_excel.py
+# Check that assembly components point at the material on the row their formula references
+
+import argparse
+import random
+
+from openpyxl import load_workbook
+import pandas as pd
+
+from db_backend import DatabaseError, connect
+from formula_parser import formula_components
+from import_price_list_from_excel import import_assemblies, import_materials
+from synthetic_workbooks import write_price_list
+
+def test_components_resolve_to_referenced_rows(tmp_path):
+    excel_file = str(tmp_path / 'template 3.xlsx')
+    write_price_list(excel_file, 20, 5, random.Random(7))
+    
+    conn = connect(None, argparse.Namespace(backend='sqlite', sqlite_db=str(tmp_path / 'test.sqlite'),
+                                            create_schema=True))
+    try:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("ALTER TABLE Materials ADD COLUMN created_by VARCHAR(50) NULL")
+        except DatabaseError:
+            pass
+        
+        df = pd.read_excel(excel_file, sheet_name='Price List', header=None)
+        df.columns = [chr(65 + i) for i in range(len(df.columns))]
+        material_map = import_materials(df, cursor)
+        import_assemblies(df, cursor, material_map)
+        conn.commit()
+        
+        # What each assembly's formula references, read straight from the workbook
+        sheet = load_workbook(excel_file).worksheets[0]
+        expected = {}
+        for row in sheet.iter_rows(min_row=2):
+            formula = row[8].value
+            if isinstance(formula, str) and formula.startswith('='):
+                components, warnings = formula_components(formula)
+                expected[row[2].value] = {
+                    (sheet.cell(row=excel_row, column=3).value, quantity) for excel_row, quantity in components
+                }
+        
+        cursor.execute("""SELECT a.assembly_code, m.material_code, c.quantity
+                          FROM AssemblyComponents c
+                          JOIN AssemblyTemplates a ON a.assembly_id = c.assembly_id
+                          JOIN Materials m ON m.material_id = c.material_id""")
+        actual = {assembly_code: set() for assembly_code in expected}
+        for assembly_code, material_code, quantity in cursor.fetchall():
+            actual[assembly_code].add((material_code, quantity))
+        
+        assert len(expected) == 5
+        assert actual == expected
+    finally:
+        conn.close()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# test_job_sheet_migration.py
+# Job sheet parsing, checked against the original row-by-row loops, stage label files, and the skip-unchanged manifest
+
+import glob
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+import customer_job_migration
+import job_sheet_migration
+from job_sheet_migration import load_stage_labels, parse_estimate, parse_job_sheet, parse_room_specs
+
+def baseline_room_specs(template_df):
+    """The original Template loop, kept as the reference for parse_room_specs"""
+    room_specs = []
+    current_room = None
+    for index, row in template_df.iterrows():
+        if all(pd.isna(val) for val in row):
+            continue
+        
+        first_col = row.iloc[0] if pd.notna(row.iloc[0]) else ""
+        if isinstance(first_col, str) and first_col.strip() and not first_col.startswith('  '):
+            current_room = first_col.strip()
+            continue
+        
+        if current_room and pd.notna(row.iloc[1]) and pd.notna(row.iloc[2]):
+            try:
+                quantity = int(row.iloc[1]) if pd.notna(row.iloc[1]) else 1
+            except (ValueError, TypeError):
+                quantity = 1
+            item_description = str(row.iloc[2]) if pd.notna(row.iloc[2]) else ""
+            unit_price = 0
+            for col_idx in range(3, min(8, len(row))):
+                if pd.notna(row.iloc[col_idx]) and isinstance(row.iloc[col_idx], (int, float)):
+                    unit_price = float(row.iloc[col_idx])
+                    break
+            if item_description:
+                room_specs.append((current_room, item_description, quantity, None, unit_price, quantity * unit_price))
+    return room_specs
+
+def baseline_estimate(estimate_df):
+    """The original Estimate loops, kept as the reference for parse_estimate"""
+    def first_number(label, case=True):
+        rows = estimate_df[estimate_df.iloc[:, 0].str.contains(label, na=False, case=case)]
+        if rows.empty:
+            return None
+        row = rows.iloc[0]
+        # The original checked isinstance(value, (int, float)), which skipped numpy integers;
+        # parse_estimate reads them on purpose
+        return next((int(row[col]) for col in row.index
+                     if pd.notna(row[col]) and isinstance(row[col], (int, float, np.number))), None)
+    
+    def figures(row):
+        return tuple(float(row[column]) if column in row and pd.notna(row[column]) else 0
+                     for column in ('Estimated', 'Actual'))
+    
+    stages = []
+    for stage in ['Demo', 'Inspection', 'Temp Service', 'Rough', 'Service', 'Finish', 'Extra']:
+        stage_rows = estimate_df[estimate_df.iloc[:, 0].str.contains(f'^{stage}$', na=False, regex=True)]
+        if stage_rows.empty:
+            continue
+        material_rows = estimate_df[estimate_df.iloc[:, 0].str.contains(f'^{stage} Material$', na=False, regex=True)]
+        material = figures(material_rows.iloc[0]) if not material_rows.empty else (0, 0)
+        stages.append((stage,) + figures(stage_rows.iloc[0]) + material)
+    return first_number('Square footage'), first_number('floors', case=False), stages
+
+def write_labels(tmp_path, text):
+    path = tmp_path / 'stages.json'
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+def drop_sheet(path, sheet_name):
+    workbook = load_workbook(path)
+    del workbook[sheet_name]
+    workbook.save(path)
+
+@pytest.fixture
+def job_sheet_paths(workbooks):
+    return sorted(glob.glob(str(workbooks / 'job_sheets' / '*.xlsx')))
+
+def test_room_specs_match_baseline_on_job_sheets(job_sheet_paths):
+    for path in job_sheet_paths:
+        template_df = pd.read_excel(path, sheet_name='Template')
+        
+        room_specs = parse_room_specs(template_df)
+        
+        assert room_specs
+        assert room_specs == baseline_room_specs(template_df)
+
+def test_room_specs_match_baseline_on_irregular_rows():
+    template_df = pd.DataFrame([
+        [None, 2, 'Before any room', 5.0, None, None],
+        ['Kitchen ', None, None, None, None, None],
+        [None, ' 3', 'Outlet', 'n/a', 12.5, None],
+        [None, 2.7, 'Switch', None, None, 8],
+        [None, 'abc', 'GFCI', 20, None, None],
+        [None, None, None, None, None, None],
+        ['  indented note', 4, 'Light', None, None, None],
+        [None, 1, '', 9.0, None, None],
+        [None, 1, None, 9.0, None, None],
+        ['Bath', None, None, None, None, None],
+        [None, -2, 'Fan', np.nan, 'call', 40.0],
+        [None, 5, 42, 1.25, None, None],
+    ], columns=list('ABCDEF'), dtype=object)
+    
+    room_specs = parse_room_specs(template_df)
+    
+    assert room_specs == baseline_room_specs(template_df)
+    assert [(room, item, quantity) for room, item, quantity, *_ in room_specs] == [
+        ('Kitchen', 'Outlet', 3), ('Kitchen', 'Switch', 2), ('Kitchen', 'GFCI', 1),
+        ('Kitchen', 'Light', 4), ('Bath', 'Fan', -2), ('Bath', '42', 5),
+    ]
+
+def test_room_specs_of_a_narrow_or_empty_sheet():
+    assert parse_room_specs(pd.DataFrame(columns=['A', 'B', 'C'])) == []
+    assert parse_room_specs(pd.DataFrame([['Kitchen', 1]], columns=['A', 'B'])) == []
+    assert parse_room_specs(pd.DataFrame([['Kitchen', None, None], [None, 2, 'Outlet']], columns=list('ABC'))) == [
+        ('Kitchen', 'Outlet', 2, None, 0.0, 0.0)
+    ]
+
+def test_estimate_matches_baseline_on_job_sheets(job_sheet_paths):
+    for path in job_sheet_paths:
+        estimate_df = pd.read_excel(path, sheet_name='Estimate')
+        
+        square_footage, num_floors, stages, problems = parse_estimate(estimate_df)
+        
+        assert problems == []
+        assert [stage for stage, *_ in stages] == ['Rough', 'Service', 'Finish', 'Extra']
+        assert (square_footage, num_floors, stages) == baseline_estimate(estimate_df)
+
+def test_estimate_matches_baseline_on_irregular_rows():
+    estimate_df = pd.DataFrame([
+        ['Square footage (heated)', 'n/a', 2450.0],
+        ['Square footage', 1800, None],
+        ['Number of Floors', None, 2],
+        ['Rough Material', 300, 310],
+        ['Rough', 40, None],
+        ['Rough', 99, 99],
+        [' Service', 10, 12],
+        ['Finish', 16.5, 18],
+        [None, 1, 1],
+        [7, 'Finish', None],
+        ['Demo', None, None],
+    ], columns=['Item', 'Estimated', 'Actual'])
+    
+    square_footage, num_floors, stages, problems = parse_estimate(estimate_df)
+    
+    assert (square_footage, num_floors, stages) == baseline_estimate(estimate_df)
+    assert (square_footage, num_floors) == (2450, 2)
+    assert stages == [('Demo', 0, 0, 0, 0), ('Rough', 40.0, 0, 300.0, 310.0), ('Finish', 16.5, 18.0, 0, 0)]
+
+def test_unreadable_stage_figures_are_reported():
+    estimate_df = pd.DataFrame([['Rough', 'forty', 2], ['Finish', 8, 9]], columns=['Item', 'Estimated', 'Actual'])
+    
+    square_footage, num_floors, stages, problems = parse_estimate(estimate_df)
+    
+    assert stages == [('Finish', 8.0, 9.0, 0, 0)]
+    assert [stage for stage, error in problems] == ['Rough']
+
+def test_stage_labels_from_a_file_drive_the_estimate(tmp_path):
+    labels = load_stage_labels(write_labels(tmp_path, json.dumps(
+        {"Rough": ["Rough", "Rough Material"], "Finish": ["Trim Out", "Trim Material"]})))
+    estimate_df = pd.DataFrame([['Trim Out', 12, 14], ['Trim Material', 500, 450], ['Rough', 30, 28], ['Service', 5, 5]],
+                               columns=['Item', 'Estimated', 'Actual'])
+    
+    square_footage, num_floors, stages, problems = parse_estimate(estimate_df, labels)
+    
+    assert labels['Trim Out'] == ('Finish', 'hours')
+    assert stages == [('Rough', 30.0, 28.0, 0, 0), ('Finish', 12.0, 14.0, 500.0, 450.0)]
+
+@pytest.mark.parametrize('text, message', [
+    ('{"Trim": ["Trim", "Trim Material"]}', "unknown stage 'Trim'"),
+    ('{"Rough": ["Rough", "Rough Material"], "Rough": ["R", "RM"]}', "stage Rough is listed twice"),
+    ('{"Rough": ["Rough", "Material"], "Finish": ["Finish", "Material"]}', "label 'Material' is listed twice"),
+    ('{"Rough": ["Rough"]}', "stage Rough needs [hours label, material label]"),
+    ('{"Rough": ["Rough", 5]}', "stage Rough needs [hours label, material label]"),
+    ('["Rough", "Rough Material"]', "should hold a JSON object"),
+])
+def test_invalid_stage_label_files_are_rejected(tmp_path, text, message):
+    with pytest.raises(ValueError) as excinfo:
+        load_stage_labels(write_labels(tmp_path, text))
+    assert message in str(excinfo.value)
+
+def test_missing_sheet_is_a_warning(workbooks):
+    path = str(workbooks / 'job_sheets' / '1000.xlsx')
+    drop_sheet(path, 'Permits')
+    
+    parsed = parse_job_sheet(path)
+    
+    assert parsed['errors'] == 0
+    assert parsed['permit_items'] is None
+    assert any('Permits' in message and message.startswith('Warning') for message in parsed['messages'])
+
+def test_unreadable_sheet_is_an_error(workbooks):
+    path = str(workbooks / 'job_sheets' / '1000.xlsx')
+    with open(path, 'wb') as f:
+        f.write(b'not a workbook')
+    
+    parsed = parse_job_sheet(path)
+    
+    assert parsed['errors'] == len(job_sheet_migration.JOB_SHEETS)
+
+def test_workbook_without_a_sheet_enters_manifest(workbooks, database_argv, capsys):
+    drop_sheet(str(workbooks / 'job_sheets' / '1001.xlsx'), 'Template')
+    customer_job_migration.main(database_argv)
+    
+    job_sheet_migration.main(database_argv)
+    with open('job_sheet_manifest.json', encoding='utf-8') as f:
+        manifest = json.load(f)
+    assert sorted(manifest) == [f"{job_number}.xlsx" for job_number in range(1000, 1005)]
+    
+    capsys.readouterr()
+    job_sheet_migration.main(database_argv)
+    assert "Skipping 5 job sheets unchanged" in capsys.readouterr().out
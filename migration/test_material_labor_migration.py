@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# test_material_labor_migration.py
+# Material and labor import: resuming an interrupted import from its checkpoint, and the staging-table
+# import checked against the row-by-row one
+
+import argparse
+from datetime import datetime
+
+from openpyxl import load_workbook
+import pytest
+
+import customer_job_migration
+import material_labor_migration
+from benchmark_migrations import prepare_database
+from db_backend import connect
+from import_state import load_checkpoint
+from synthetic_workbooks import FIRST_JOB_NUMBER
+
+# Rows the synthetic ledger lacks: each takes a different branch of the import
+IRREGULAR_ROWS = [
+    [None, 'Rough', datetime(2024, 1, 2), 4, 'Erik', None, None, None, None, None],
+    [99999, 'Rough', datetime(2024, 1, 2), 4, 'Erik', None, None, None, None, None],
+    [FIRST_JOB_NUMBER, 'Rough', datetime(2024, 1, 3), 6, 'Nobody', 120.5, 'Lowes', 'INV-A', 120.5, None],
+    [FIRST_JOB_NUMBER, 'Rough', datetime(2024, 1, 4), 3, None, 80, 'Graybar', 'INV-B', 80, 'no employee'],
+    [FIRST_JOB_NUMBER, 'Trim', datetime(2024, 1, 5), 2, 'Lee', None, None, None, None, None],
+    [FIRST_JOB_NUMBER + 1, None, datetime(2024, 1, 6), 5, 'carlos ', 45.25, None, 'INV-C', None, 'no vendor'],
+    [FIRST_JOB_NUMBER + 1, 'Finish', datetime(2024, 1, 7), None, None, 60, 'home depot', 'INV-D', 75, None],
+    [FIRST_JOB_NUMBER + 1, 'Finish', datetime(2024, 1, 8), None, None, 30, 'New Supply Co', 'INV-E', 30, 'new'],
+    [FIRST_JOB_NUMBER + 1, 'Finish', datetime(2024, 1, 9), None, None, 0, 'Zero Vendor', 'INV-F', 0, None],
+    [FIRST_JOB_NUMBER + 2, 'Demo', datetime(2024, 1, 10), 8, 'JAKE', 12, 'CED', 'INV-G', 12, 'both'],
+    [FIRST_JOB_NUMBER + 2, 'Demo', datetime(2024, 1, 11), None, None, 'n/a', 'CED', None, None, None],
+]
+
+def ledger(argv):
+    """Every entry, stage and vendor by natural key, so two databases can be compared.
+    
+    Dates are compared as DATE() since SQLite keeps whatever a DATE column was
+    given, a date from one import and a datetime from the other.
+    """
+    conn = connect(None, argparse.Namespace(backend='sqlite', sqlite_db=argv[-1]))
+    try:
+        cursor = conn.cursor()
+        tables = {}
+        for table, sql in [
+            ('labor', """SELECT j.job_number, s.stage_name, e.name, DATE(l.date), l.hours FROM LaborEntries l
+                         JOIN Jobs j ON j.job_id = l.job_id JOIN JobStages s ON s.stage_id = l.stage_id
+                         JOIN Employees e ON e.employee_id = l.employee_id"""),
+            ('material', """SELECT j.job_number, s.stage_name, v.name, DATE(m.date), m.cost, m.invoice_number,
+                                   m.invoice_total, m.notes FROM MaterialEntries m
+                            JOIN Jobs j ON j.job_id = m.job_id JOIN JobStages s ON s.stage_id = m.stage_id
+                            JOIN Vendors v ON v.vendor_id = m.vendor_id"""),
+            ('stages', "SELECT j.job_number, s.stage_name FROM JobStages s JOIN Jobs j ON j.job_id = s.job_id"),
+            ('vendors', "SELECT name FROM Vendors"),
+        ]:
+            cursor.execute(sql)
+            tables[table] = sorted(cursor.fetchall(), key=repr)
+        return tables
+    finally:
+        conn.close()
+
+@pytest.fixture
+def irregular_rows(workbooks):
+    workbook = load_workbook('ERE.xlsx')
+    for row in IRREGULAR_ROWS:
+        workbook['Material and Labor'].append(row)
+    workbook.save('ERE.xlsx')
+
+@pytest.fixture
+def reference_ledger(workbooks, tmp_path):
+    """The tables a single uninterrupted import writes"""
+    args = argparse.Namespace(backend='sqlite', sqlite_db=str(tmp_path / 'reference.sqlite'))
+    prepare_database(args)
+    argv = ['--backend', 'sqlite', '--sqlite-db', args.sqlite_db]
+    customer_job_migration.main(argv)
+    material_labor_migration.main(argv)
+    return ledger(argv)
+
+def crashing_at(crash_index):
+    """A parse_ledger_records that makes the import fail when it reaches a source row"""
+    parse_ledger_records = material_labor_migration.parse_ledger_records
+    
+    def crashing(records):
+        for index, entry, error in parse_ledger_records(records):
+            if index == crash_index:
+                raise RuntimeError("simulated crash")
+            yield index, entry, error
+    return crashing
+
+def test_resume_after_a_crash_matches_a_full_import(reference_ledger, database_argv, conn, monkeypatch, capsys):
+    customer_job_migration.main(database_argv)
+    
+    with monkeypatch.context() as patch:
+        patch.setattr(material_labor_migration, 'parse_ledger_records', crashing_at(170))
+        with pytest.raises(SystemExit):
+            material_labor_migration.main(database_argv + ['--checkpoint-every', '50'])
+    checkpoint = load_checkpoint(conn.cursor(), material_labor_migration.MIGRATION_NAME)
+    assert (checkpoint['last_row'], checkpoint['batch_number'], checkpoint['is_complete']) == (149, 3, False)
+    partial = ledger(database_argv)
+    assert 0 < len(partial['labor']) < len(reference_ledger['labor'])
+    
+    material_labor_migration.main(database_argv + ['--resume', '--checkpoint-every', '50'])
+    
+    assert "Resuming after row 149 (checkpoint batch 3)" in capsys.readouterr().out
+    assert ledger(database_argv) == reference_ledger
+    checkpoint = load_checkpoint(conn.cursor(), material_labor_migration.MIGRATION_NAME)
+    assert (checkpoint['last_row'], checkpoint['is_complete']) == (299, True)
+
+def interrupt(database_argv, monkeypatch):
+    customer_job_migration.main(database_argv)
+    with monkeypatch.context() as patch:
+        patch.setattr(material_labor_migration, 'parse_ledger_records', crashing_at(120))
+        with pytest.raises(SystemExit):
+            material_labor_migration.main(database_argv + ['--checkpoint-every', '50'])
+
+def test_resume_refuses_a_changed_file(workbooks, database_argv, monkeypatch, capsys):
+    interrupt(database_argv, monkeypatch)
+    with open('ERE.xlsx', 'ab') as f:
+        f.write(b'\0')
+    
+    with pytest.raises(SystemExit) as excinfo:
+        material_labor_migration.main(database_argv + ['--resume'])
+    
+    assert excinfo.value.code == 1
+    assert "has changed since the checkpoint was written" in capsys.readouterr().out
+
+def test_rerun_without_resume_warns(workbooks, database_argv, monkeypatch, capsys):
+    interrupt(database_argv, monkeypatch)
+    capsys.readouterr()
+    
+    material_labor_migration.main(database_argv)
+    
+    assert "committed rows through 99; use --resume" in capsys.readouterr().out
+
+def test_nothing_to_resume_after_a_complete_import(workbooks, database_argv, capsys):
+    customer_job_migration.main(database_argv)
+    material_labor_migration.main(database_argv)
+    
+    with pytest.raises(SystemExit) as excinfo:
+        material_labor_migration.main(database_argv + ['--resume'])
+    
+    assert excinfo.value.code == 0
+    assert "nothing to resume" in capsys.readouterr().out
+
+@pytest.mark.parametrize('options', [['--staging'], ['--staging', '--pipeline', '--batch-size', '64'],
+                                     ['--staging', '--bulk-load']])
+def test_staging_import_matches_row_by_row(irregular_rows, reference_ledger, database_argv, options):
+    customer_job_migration.main(database_argv)
+    
+    material_labor_migration.main(database_argv + options)
+    
+    assert ('New Supply Co',) in reference_ledger['vendors']  # The irregular rows were imported
+    assert ledger(database_argv) == reference_ledger
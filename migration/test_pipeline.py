@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# test_pipeline.py
+# Bounded producer-consumer pipeline: ordering, error propagation, backpressure and shutdown
+
+import glob
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import job_sheet_migration
+from pipeline import Pipeline
+
+def counting_source(count, produced, closed=None):
+    try:
+        for number in range(count):
+            produced.append(number)
+            yield number
+    finally:
+        if closed is not None:
+            closed.append(threading.current_thread().name)
+
+def test_records_arrive_in_order():
+    pipeline = Pipeline(range(1234), chunk_size=100, max_chunks=2)
+    
+    assert list(pipeline) == list(range(1234))
+    assert not pipeline.thread.is_alive()
+
+def test_source_error_is_raised_after_earlier_records():
+    def failing_source():
+        yield from range(5)
+        raise ValueError("bad row")
+    
+    received = []
+    with pytest.raises(ValueError, match="bad row"):
+        for record in Pipeline(failing_source(), chunk_size=2):
+            received.append(record)
+    
+    assert received == [0, 1, 2, 3, 4]
+
+def test_slow_writer_holds_the_parser_back():
+    produced = []
+    pipeline = Pipeline(counting_source(1000, produced), chunk_size=10, max_chunks=2)
+    
+    records = iter(pipeline)
+    assert next(records) == 0
+    time.sleep(0.3)  # A writer busy with the first record
+    
+    # Two chunks queued, the one being read, and the one waiting to go on the queue
+    assert len(produced) <= 40
+    assert pipeline.parser_waits >= 1
+    assert sum(1 for record in records) == 999
+
+def test_leaving_the_loop_closes_the_source():
+    produced = []
+    closed = []
+    pipeline = Pipeline(counting_source(10000, produced, closed), chunk_size=10, max_chunks=1, name='test-parser')
+    
+    for record in pipeline:
+        if record == 5:
+            break
+    
+    assert not pipeline.thread.is_alive()
+    assert closed == ['test-parser']  # Closed on the parser thread, as soon as it stopped
+    assert len(produced) < 10000
+
+def test_pipeline_is_iterated_once():
+    pipeline = Pipeline([1, 2])
+    assert list(pipeline) == [1, 2]
+    
+    with pytest.raises(RuntimeError):
+        list(pipeline)
+
+class RecordingExecutor(ProcessPoolExecutor):
+    """ProcessPoolExecutor that remembers being shut down"""
+    
+    instances = []
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.shut_down = False
+        self.instances.append(self)
+    
+    def shutdown(self, *args, **kwargs):
+        super().shutdown(*args, **kwargs)
+        self.shut_down = True
+
+def test_stopping_early_shuts_down_the_worker_pool(workbooks, monkeypatch):
+    monkeypatch.setattr(job_sheet_migration, 'ProcessPoolExecutor', RecordingExecutor)
+    RecordingExecutor.instances.clear()
+    job_files = sorted(glob.glob(str(workbooks / 'job_sheets' / '*.xlsx')))
+    pipeline = Pipeline(job_sheet_migration.iter_parsed_job_sheets(job_files, workers=2, max_pending=2),
+                        chunk_size=1, max_chunks=1)
+    
+    for file_path, parsed, error in pipeline:
+        assert error is None
+        break
+    
+    executor, = RecordingExecutor.instances
+    assert executor.shut_down
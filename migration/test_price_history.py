@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# test_price_history.py
+# Price history: initial prices for new materials, rows only for changed prices, and case-insensitive codes
+
+from decimal import Decimal
+
+import pytest
+
+import import_price_list_from_excel
+from price_history import PriceHistoryWriter
+
+MATERIAL_INSERT_SQL = """INSERT INTO Materials (material_code, name, category, current_price)
+                         VALUES (%s, %s, 'Test', %s)"""
+
+@pytest.fixture
+def cursor(conn):
+    cursor = conn.cursor()
+    cursor.executemany(MATERIAL_INSERT_SQL, [('BOX-1', 'Box', 1.25), ('WIRE-2', 'Wire', 40), ('FAN-3', 'Fan', 89.99)])
+    conn.commit()
+    return cursor
+
+def write_material(cursor, material_code, price):
+    """Stand-in for the import's upsert"""
+    cursor.execute("UPDATE Materials SET current_price = %s WHERE material_code = %s", (price, material_code))
+    if not cursor.rowcount:
+        cursor.execute(MATERIAL_INSERT_SQL, (material_code, material_code, price))
+
+def history(cursor):
+    cursor.execute("""SELECT m.material_code, h.price, h.notes FROM MaterialPriceHistory h
+                      JOIN Materials m ON m.material_id = h.material_id ORDER BY m.material_code""")
+    return [(material_code, Decimal(str(price)).quantize(Decimal('0.01')), notes)
+            for material_code, price, notes in cursor.fetchall()]
+
+def test_only_new_and_changed_prices_are_recorded(cursor):
+    writer = PriceHistoryWriter(cursor, 'Test', 'test sheet')
+    assert writer.load_snapshot() == 3
+    
+    for material_code, price in [('BOX-1', 1.25), ('WIRE-2', '40.00'), ('FAN-3', 95), ('PLUG-4', 3.5)]:
+        write_material(cursor, material_code, price)
+        writer.record(material_code, price)
+    
+    assert writer.flush() == 2
+    assert (writer.initial_prices, writer.price_changes) == (1, 1)
+    assert history(cursor) == [
+        ('FAN-3', Decimal('95.00'), "Price changed from 89.99 (test sheet)"),
+        ('PLUG-4', Decimal('3.50'), "Initial price from test sheet"),
+    ]
+
+def test_codes_compare_case_insensitively(cursor):
+    writer = PriceHistoryWriter(cursor, 'Test', 'test sheet')
+    writer.load_snapshot()
+    
+    writer.record(' box-1 ', 1.25)
+    writer.record('wire-2', 41)
+    
+    assert writer.flush() == 1
+    assert [material_code for material_code, price, notes in history(cursor)] == ['WIRE-2']
+
+def test_last_recorded_price_wins(cursor):
+    writer = PriceHistoryWriter(cursor, 'Test', 'test sheet')
+    writer.load_snapshot()
+    
+    writer.record('BOX-1', 2)
+    writer.record('BOX-1', 1.25)  # Back to the snapshot price
+    writer.record('FAN-3', 80)
+    writer.record('FAN-3', 'n/a')  # Unreadable prices are ignored
+    
+    assert writer.flush() == 1
+    assert history(cursor) == [('FAN-3', Decimal('80.00'), "Price changed from 89.99 (test sheet)")]
+
+def test_material_that_was_never_written_gets_no_history(cursor):
+    writer = PriceHistoryWriter(cursor, 'Test', 'test sheet')
+    writer.load_snapshot()
+    
+    writer.record('MISSING-9', 12)
+    
+    assert writer.flush() == 0
+    assert history(cursor) == []
+
+def test_reimport_records_only_changes(workbooks, database_argv, conn):
+    import_price_list_from_excel.main(database_argv)
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*), COUNT(DISTINCT notes) FROM MaterialPriceHistory")
+    assert cursor.fetchone() == (40, 1)
+    
+    import_price_list_from_excel.main(database_argv)
+    cursor.execute("SELECT COUNT(*) FROM MaterialPriceHistory")
+    assert cursor.fetchone() == (40,)
+    
+    cursor.execute("UPDATE Materials SET current_price = 0.01 WHERE material_code = 'MAT00003'")
+    conn.commit()
+    import_price_list_from_excel.main(database_argv)
+    cursor.execute("""SELECT m.material_code, h.notes FROM MaterialPriceHistory h
+                      JOIN Materials m ON m.material_id = h.material_id WHERE h.notes LIKE 'Price changed%'""")
+    assert cursor.fetchall() == [('MAT00003', "Price changed from 0.01 (Excel price list)")]
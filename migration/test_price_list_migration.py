@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# test_price_list_migration.py
+# Price list import: batched upserts, and which items --sync may deactivate
+
+import shutil
+
+import price_list_migration
+
+def active_items(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT item_code, is_active FROM PriceList")
+    return dict(cursor.fetchall())
+
+def add_item(conn, item_code, imported):
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO PriceList (category, item_code, name, base_cost) VALUES ('Test', %s, %s, 1)",
+                   (item_code, item_code))
+    if imported:
+        cursor.execute("INSERT INTO PriceListImports (item_code, imported_date) VALUES (%s, NOW())", (item_code,))
+    conn.commit()
+
+def test_import_writes_every_sheet_item(workbooks, database_argv, conn):
+    price_list_migration.main(database_argv)
+    
+    items = active_items(conn)
+    assert len(items) == 46  # 40 materials and 6 assemblies
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM PriceListImports")
+    assert cursor.fetchone()[0] == 46
+
+def test_sync_deactivates_only_items_it_imported(workbooks, database_argv, conn):
+    price_list_migration.main(database_argv)
+    add_item(conn, 'GONE', imported=True)  # Imported earlier, since removed from the sheet
+    add_item(conn, 'APP', imported=False)  # Entered in the app
+    
+    price_list_migration.main(database_argv + ['--sync'])
+    
+    items = active_items(conn)
+    assert items['GONE'] == 0
+    assert items['APP'] == 1
+    assert sum(items.values()) == 47
+
+def test_ownership_moves_with_the_database(workbooks, database_argv, conn, tmp_path, capsys):
+    price_list_migration.main(database_argv)
+    add_item(conn, 'GONE', imported=True)
+    copy = str(tmp_path / 'copy.sqlite')
+    shutil.copy(database_argv[-1], copy)
+    
+    capsys.readouterr()
+    price_list_migration.main(database_argv[:-1] + [copy, '--plan'])
+    
+    output = capsys.readouterr().out
+    assert "Sync plan: 0 to add, 0 to update, 1 to deactivate, 46 unchanged" in output
+    assert "already exists" not in output and "Processed:" not in output
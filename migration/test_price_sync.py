@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# test_price_sync.py
+# plan_sync: row hashing, case-insensitive keys and which rows may be deactivated
+
+from price_sync import normalize, plan_sync, row_hash
+
+COLUMNS = [('name', None), ('price', 2)]
+
+def test_normalize_rounds_to_the_table_scale():
+    assert normalize(1.005, 2) == normalize('1.00', 2) == '1.00'
+    assert normalize(None) == normalize(float('nan')) == ''
+    assert normalize('  Box ') == 'Box'
+    assert row_hash(('Box', 1.5), COLUMNS) == row_hash((' Box', '1.50'), COLUMNS)
+
+def test_plan_inserts_updates_and_leaves_unchanged_rows():
+    current = {'A': (('Box', 1.5), True), 'B': (('Wire', 2.0), True), 'C': (('Cap', 3.0), False)}
+    source = {'A': ('Box', '1.50'), 'B': ('Wire', 2.25), 'C': ('Cap', 3.0), 'D': ('Tape', 1.0)}
+    
+    plan = plan_sync(source, current, COLUMNS)
+    
+    assert plan.inserts == ['D']
+    assert plan.updates == [('B', [('price', '2.00', '2.25')]), ('C', [])]  # C is inactive: a reactivation
+    assert plan.deactivations == []
+    assert plan.unchanged == 1
+
+def test_keys_match_case_insensitively():
+    current = {'ABC': (('Box', 1.5), True)}
+    
+    plan = plan_sync({' abc': ('Box', 2.0)}, current, COLUMNS)
+    
+    assert plan.inserts == [] and plan.deactivations == []
+    assert plan.updates == [(' abc', [('price', '1.50', '2.00')])]
+    assert plan.table_key(' abc') == 'ABC'
+
+def test_only_owned_rows_are_deactivated():
+    current = {'OWNED': (('Box', 1.0), True), 'APP': (('Wire', 1.0), True), 'KEEP': (('Cap', 1.0), True)}
+    
+    plan = plan_sync({'KEEP': ('Cap', 1.0)}, current, COLUMNS, deactivatable={'owned', 'keep'})
+    
+    assert plan.deactivations == ['OWNED']
+
+def test_empty_source_deactivates_nothing():
+    plan = plan_sync({}, {'A': (('Box', 1.0), True)}, COLUMNS)
+    
+    assert not plan.has_changes()
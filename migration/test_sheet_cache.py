@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# test_sheet_cache.py
+# Sheet cache: exact round trips of frames and streamed rows, no pickle, and eviction
+
+from datetime import date, datetime, time
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import sheet_cache
+from excel_readers import iter_sheet_records, read_sheets
+from material_labor_migration import LEDGER_COLUMNS, LedgerRow
+from sheet_cache import SheetCache
+
+FILE_HASH = 'ab' * 32
+
+@pytest.fixture
+def cache(tmp_path):
+    return SheetCache(str(tmp_path / 'cache'))
+
+def stream(cache, rows, sheet_name='Sheet', columns=('a', 'b')):
+    return list(cache.stream_rows(FILE_HASH, sheet_name, list(columns), ['object'] * len(columns), iter(rows), 'rows'))
+
+def replay(cache, sheet_name='Sheet'):
+    return [(index,) + tuple(values) for index, values in cache.load_rows(FILE_HASH, sheet_name, 'rows')]
+
+def exact(values):
+    """Values with their types, so 1 and 1.0 or a date and a datetime compare different"""
+    return [(type(value), 'nan' if value != value else value) for value in values]
+
+def test_frame_round_trip_keeps_dtypes_and_labels(cache):
+    frame = pd.DataFrame({
+        'count': [1, 2, 3],
+        'price': [1.5, np.nan, 2.25],
+        'name': pd.Series(['Box', None, 'Wire'], dtype='str'),
+        'when': pd.to_datetime(['2024-01-02', None, '2024-03-04']),
+        'flag': [True, False, True],
+        'mixed': ['A1', 7, None],
+    })
+    frame.columns = ['count', 'price', 'name', 'when', 'flag', 'count']  # Duplicate labels, as a sheet can have
+    
+    cache.store(FILE_HASH, 'Sheet', frame)
+    loaded = cache.load(FILE_HASH, 'Sheet')
+    
+    pd.testing.assert_frame_equal(loaded, frame)
+    assert exact(loaded.iloc[:, 5]) == exact(['A1', 7, None])
+
+def test_frame_with_numbered_columns_and_index(cache):
+    frame = pd.DataFrame([[1, 'x'], [2, 'y']], index=[10, 12])  # As read with header=None
+    
+    cache.store(FILE_HASH, 'Sheet', frame, 'frame:header=None')
+    
+    pd.testing.assert_frame_equal(cache.load(FILE_HASH, 'Sheet', 'frame:header=None'), frame)
+    assert cache.load(FILE_HASH, 'Sheet') is None  # Another variant is another entry
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_streamed_rows_round_trip_exactly(cache, monkeypatch):
+    monkeypatch.setattr(sheet_cache, 'GROUP_ROWS', 3)
+    rows = [
+        (0, 1, 'text'), (1, 2.5, None), (2, None, 'nul\0'),
+        (3, float('nan'), 'x' * 5000), (5, 2 ** 70, date(2024, 1, 2)),
+        (6, datetime(2024, 1, 2, 3, 4, 5), time(8, 30)), (7, True, 12),
+    ]
+    
+    assert stream(cache, rows) == rows
+    replayed = replay(cache)
+    
+    assert [exact(row) for row in replayed] == [exact(row) for row in rows]
+
+def test_typed_columns_are_stored_as_arrays(cache):
+    rows = [(index, datetime(2024, 1, 1 + index % 28), 'INV%04d' % index if index % 2 else None, index / 2)
+            for index in range(100)]
+    
+    stream(cache, rows, columns=('date', 'invoice', 'amount'))
+    
+    with np.load(cache.path(FILE_HASH, 'Sheet', 'rows'), allow_pickle=False) as entry:
+        assert entry['g0.c0.cells'].dtype == np.dtype('datetime64[us]')
+        assert entry['g0.c1.cells'].dtype.kind == 'U'
+        assert entry['g0.c2.cells'].dtype == np.float64  # Ints and floats together, the ints marked in the mask
+    assert [exact(row) for row in replay(cache)] == [exact(row) for row in rows]
+
+def test_entries_hold_no_pickled_objects(cache):
+    cache.store(FILE_HASH, 'Sheet', pd.DataFrame({'a': ['x', 1, None], 'b': [date(2024, 1, 1), None, 2.5]}))
+    
+    path = cache.path(FILE_HASH, 'Sheet', 'frame')
+    with zipfile.ZipFile(path) as zip_file:
+        assert all(name.endswith('.npy') for name in zip_file.namelist())
+    with np.load(path, allow_pickle=False) as entry:
+        assert all(entry[name].dtype != object for name in entry.files)
+
+def test_corrupt_entry_is_a_miss(cache):
+    cache.store(FILE_HASH, 'Sheet', pd.DataFrame({'a': [1]}))
+    with open(cache.path(FILE_HASH, 'Sheet', 'frame'), 'wb') as f:
+        f.write(b'not a zip file')
+    
+    assert cache.load(FILE_HASH, 'Sheet') is None
+    assert cache.misses == 1
+
+def test_stopping_early_leaves_no_entry(cache):
+    rows = cache.stream_rows(FILE_HASH, 'Sheet', ['a'], ['object'], iter([(0, 1), (1, 2)]), 'rows')
+    assert next(rows) == (0, 1)
+    rows.close()
+    
+    assert cache.load_rows(FILE_HASH, 'Sheet', 'rows') is None
+    assert os.listdir(cache.directory) == []
+
+def test_value_that_cannot_be_cached_still_streams(cache, capsys):
+    rows = [(0, 1), (1, object())]
+    
+    assert stream(cache, rows, columns=('a',)) == rows
+    
+    assert "Not caching sheet Sheet" in capsys.readouterr().out
+    assert cache.load_rows(FILE_HASH, 'Sheet', 'rows') is None
+    assert os.listdir(cache.directory) == []
+
+def test_least_recently_used_entries_are_evicted(cache):
+    frame = pd.DataFrame({'a': range(1000)})
+    for number, sheet_name in enumerate(['old', 'used', 'new']):
+        cache.store(FILE_HASH, sheet_name, frame)
+        os.utime(cache.path(FILE_HASH, sheet_name, 'frame'), (number, number))
+    assert cache.load(FILE_HASH, 'used') is not None  # Now the most recently used
+    cache.max_bytes = 2 * os.path.getsize(cache.path(FILE_HASH, 'new', 'frame'))
+    
+    assert cache.evict() == 1
+    
+    assert cache.load(FILE_HASH, 'old') is None
+    assert cache.load(FILE_HASH, 'used') is not None and cache.load(FILE_HASH, 'new') is not None
+
+def test_clear_removes_current_and_old_entries(cache):
+    cache.store(FILE_HASH, 'Sheet', pd.DataFrame({'a': [1]}))
+    for suffix in sheet_cache.OLD_CACHE_SUFFIXES:
+        open(os.path.join(cache.directory, f"old{suffix}"), 'w').close()
+    
+    assert cache.clear() == 1 + len(sheet_cache.OLD_CACHE_SUFFIXES)
+    assert os.listdir(cache.directory) == []
+
+def test_workbook_reads_hit_the_cache(workbooks, cache):
+    ere = str(workbooks / 'ERE.xlsx')
+    records = list(iter_sheet_records(ere, LedgerRow, LEDGER_COLUMNS, 'Material and Labor'))
+    job_sheet = str(workbooks / 'job_sheets' / '1000.xlsx')
+    frames, errors = read_sheets(job_sheet, ['Estimate', 'Template', 'Permits'])
+    
+    for attempt in range(2):
+        assert list(iter_sheet_records(ere, LedgerRow, LEDGER_COLUMNS, 'Material and Labor', cache)) == records
+        cached_frames, cached_errors = read_sheets(job_sheet, ['Estimate', 'Template', 'Permits'], cache)
+        for sheet_name, frame in frames.items():
+            pd.testing.assert_frame_equal(cached_frames[sheet_name], frame)
+    
+    assert (cache.hits, cache.misses) == (4, 4)